@@ -0,0 +1,205 @@
+# synthetic instances and scaling benchmarks of run and run_isochrone
+
+import numpy as np
+import pandas as pd
+import logging
+import platform
+import time
+from importlib.metadata import version, PackageNotFoundError
+import efl.optimize as optimize
+import efl.distance as distance
+import efl.profiling as profiling
+
+# (origins, destinations) from the size of the test data up to the sizes
+# that break full runs
+SIZES = [(1000, 100), (5000, 250), (20000, 1000), (50000, 2000), (200000, 5000)]
+
+def generate_instance(num_origs, num_dests, *, seed=0, num_clusters=10, cluster_share=0.8,
+                      open_share=0, percent_share=0, capacity_factor=None, num_nearest=None,
+                      size=10000, max_chunk_size=10**7):
+    """Random instance on a size x size square: cluster_share of the origins
+    and destinations are spread around num_clusters centers (towns) and the
+    rest uniformly, and clustered origins have larger (lognormal)
+    populations. Distances are euclidean (see distance.get_distance_df),
+    rounded to 0.1.
+
+    Returns (orig_df, dest_df, dist_lookup_df), with ids orig<i> and
+    dest<j> and coordinates x, y, as optimize.run takes them
+
+    Keyword arguments:
+    seed -- random seed; the same arguments give the same instance (default: 0)
+    num_clusters -- (default: 10)
+    cluster_share -- share of clustered origins and destinations (default: 0.8)
+    open_share -- share of destinations with open='yes' (default: 0)
+    percent_share -- share of destinations with open='percent' (default: 0)
+    capacity_factor -- give destinations capacities of about capacity_factor
+    x total population / num_dests (default: None, no capacities)
+    num_nearest -- keep only each origin's num_nearest nearest destinations
+    (run with sparse=True); needed for large instances (default: None, all pairs)
+    size -- side of the square (default: 10000)
+    max_chunk_size -- (without scipy) max origins x destinations distances
+    computed at once (default: 10**7)
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0, size, (num_clusters, 2))
+    orig_xy, orig_clustered = _get_points(rng, num_origs, centers, cluster_share, size)
+    dest_xy, _ = _get_points(rng, num_dests, centers, cluster_share, size)
+    population = np.round(rng.lognormal(np.log(50), 1, num_origs)*np.where(orig_clustered, 4, 1)) + 1
+
+    orig_df = pd.DataFrame({'id':[f'orig{i}' for i in range(1, num_origs+1)],
+                            'population':population.astype(np.int64),
+                            'x':orig_xy[:,0], 'y':orig_xy[:,1]})
+    dest_df = pd.DataFrame({'id':[f'dest{j}' for j in range(1, num_dests+1)],
+                            'x':dest_xy[:,0], 'y':dest_xy[:,1]})
+    if open_share>0 or percent_share>0:
+        draw = rng.random(num_dests)
+        dest_df['open'] = np.where(draw<open_share, 'yes',
+                                   np.where(draw<open_share+percent_share, 'percent', None))
+    if capacity_factor is not None:
+        mean_capacity = capacity_factor*population.sum()/num_dests
+        dest_df['capacity'] = np.round(mean_capacity*rng.uniform(0.5, 1.5, num_dests))
+
+    dist_lookup_df = distance.get_distance_df(orig_df, dest_df, k_nearest=num_nearest, 
+                                              max_chunk_size=max_chunk_size)
+    dist_lookup_df['distance'] = dist_lookup_df['distance'].round(1)
+    return orig_df, dest_df, dist_lookup_df
+
+def _get_points(rng, num_points, centers, cluster_share, size):
+    # (points x 2 coordinates, clustered mask)
+    clustered = rng.random(num_points)<cluster_share
+    near = centers[rng.integers(len(centers), size=num_points)] + rng.normal(0, size/40, (num_points, 2))
+    xy = np.where(clustered[:,None], near, rng.uniform(0, size, (num_points, 2)))
+    return np.clip(xy, 0, size), clustered
+
+def run_benchmark(out_file=None, *, sizes=SIZES, seeds=(0,), models=('run', 'isochrone'),
+                  num_nearest=25, num_locations=None, iso_radius=None, min_percent=0,
+                  solver='scip', isochrone_solver='scip', time_limit=600, **instance_options):
+    """Generate an instance of each size (and seed) and time optimize.run
+    (minimize='ede') and optimize.run_isochrone (minimize='uncovered') on
+    it. Each run records the seconds of its phases (Results.timings), the
+    size of its model (Results.model_stats), the peak RSS of each phase
+    (profiling.Profiler without tracing), the objective values and the
+    versions of python, numpy and pandas. A run that fails records its
+    error and the benchmark goes on.
+
+    Returns dataframe, one row per instance and model, also written to
+    out_file (csv, rewritten after each run, so an interrupted benchmark
+    keeps its rows); compare two of them with compare_benchmarks
+
+    Keyword arguments:
+    out_file -- path to csv for results (default: None)
+    sizes -- list of (number of origins, number of destinations) (default: SIZES)
+    seeds -- instances of each size (default: (0,))
+    models -- 'run' and/or 'isochrone' (default: both)
+    num_nearest -- pairs per origin (see generate_instance) (default: 25)
+    num_locations -- (default: a tenth of the destinations plus those that
+    must open)
+    iso_radius -- (default: twice the median distance of an origin to
+    its nearest destination)
+    min_percent -- min % of open='percent' destinations to open (default: 0)
+    solver -- solver of run, e.g. 'heuristic' for large sizes (default: 'scip')
+    isochrone_solver -- solver of run_isochrone (default: 'scip')
+    time_limit -- solver time limit in seconds per run (default: 600)
+    instance_options -- passed to generate_instance, e.g. open_share
+    """
+    rows = []
+    for num_origs, num_dests in sizes:
+        for seed in seeds:
+            start_time = time.time()
+            orig_df, dest_df, dist_lookup_df = generate_instance(num_origs, num_dests, seed=seed,
+                                                    num_nearest=num_nearest, **instance_options)
+            instance_time = time.time() - start_time
+            k = num_locations
+            if k is None: # a tenth of the destinations, besides those that must open
+                k = max(1, num_dests//10) + _get_num_required(dest_df, min_percent)
+            radius = iso_radius
+            if radius is None:
+                radius = 2*dist_lookup_df.groupby('origin')['distance'].min().median()
+            for model in models:
+                row = {'model':model, 'num_origins':num_origs, 'num_destinations':num_dests,
+                       'seed':seed, 'num_locations':k,
+                       'iso_radius':radius if model=='isochrone' else None,
+                       'solver':solver if model=='run' else isochrone_solver,
+                       'time_instance':instance_time}
+                row.update(_run_model(model, orig_df, dest_df, dist_lookup_df, k, radius,
+                                      sparse=num_nearest is not None, min_percent=min_percent,
+                                      solver=row['solver'], time_limit=time_limit))
+                logging.info(f"benchmark {model} {num_origs} x {num_dests}: {row['status']}")
+                rows.append(dict(_get_versions(), **row))
+                if out_file is not None:
+                    pd.DataFrame(rows).to_csv(out_file, index=False)
+    return pd.DataFrame(rows)
+
+def _get_num_required(dest_df, min_percent):
+    # destinations that must open (open='yes' and min_percent of 'percent')
+    if 'open' not in dest_df.columns:
+        return 0
+    return int((dest_df['open']=='yes').sum() + np.ceil((dest_df['open']=='percent').sum()*min_percent))
+
+def _run_model(model, orig_df, dest_df, dist_lookup_df, num_locations, iso_radius, *,
+               sparse, min_percent, solver, time_limit):
+    # benchmark row of one run: status, error, wall_time, peak_rss,
+    # peak_rss_<phase>, time_<phase>, model stats and objective values
+    start_time = time.time()
+    try:
+        with profiling.Profiler(trace=False) as profiler:
+            if model=='run':
+                results = optimize.run(orig_df, dest_df, dist_lookup_df, num_locations=num_locations,
+                                       min_percent=min_percent, sparse=sparse, solver=solver,
+                                       time_limit=time_limit)
+            elif model=='isochrone':
+                results = optimize.run_isochrone(orig_df, dest_df, dist_lookup_df, iso_radius,
+                                                 num_locations=num_locations, min_percent=min_percent,
+                                                 sparse=sparse, solver=solver, time_limit=time_limit)
+            else:
+                raise ValueError(f"unknown model '{model}' (use 'run' or 'isochrone')")
+    except Exception as e: # one failed run doesn't stop the benchmark
+        logging.error(f'benchmark {model}: {e}')
+        return {'status':'error', 'error':str(e)}
+    if isinstance(results, int): # run returns 1 for data and model errors
+        return {'status':'error', 'error':'run failed (see logs)'}
+
+    phases_df = profiler.get_phases_df()
+    row = {'status':'ok', 'error':None, 'wall_time':time.time()-start_time,
+           'peak_rss':phases_df['peak_rss'].max()}
+    row.update({f'peak_rss_{phase}':peak for phase, peak in zip(phases_df['phase'], phases_df['peak_rss'])})
+    row.update(results.stats_out())
+    row['solver_mip_gap'] = results.solver_mip_gap
+    row['num_locations_out'] = results.num_locations_out()
+    row['mean_distance_out'] = results.mean_distance_out()
+    if model=='run':
+        row['ede_out'] = results.ede_out()
+    else:
+        row['percent_covered_out'] = results.percent_covered_out(iso_radius)
+    return row
+
+def _get_versions():
+    versions = {'timestamp':pd.Timestamp.now().isoformat(timespec='seconds'),
+                'python':platform.python_version(), 'numpy':np.__version__,
+                'pandas':pd.__version__}
+    try:
+        versions['efl'] = version('efl')
+    except PackageNotFoundError: # not installed
+        versions['efl'] = None
+    return versions
+
+def compare_benchmarks(base_file, new_file, *, columns=('wall_time', 'peak_rss', 'time_solve')):
+    """Compare two run_benchmark files (e.g. of two versions): for each
+    instance and model in both, the ratio new/base of each column (> 1:
+    slower or larger) and the change of the objective values.
+
+    Returns dataframe indexed by model, num_origins, num_destinations, seed
+    """
+    keys = ['model', 'num_origins', 'num_destinations', 'seed']
+    base_df = pd.read_csv(base_file).set_index(keys)
+    new_df = pd.read_csv(new_file).set_index(keys)
+    both = base_df.index.intersection(new_df.index)
+    base_df, new_df = base_df.loc[both], new_df.loc[both]
+    compare_df = pd.DataFrame(index=both)
+    for column in columns:
+        if column in base_df.columns and column in new_df.columns:
+            compare_df[f'{column}_ratio'] = new_df[column]/base_df[column]
+    for column in ['ede_out', 'percent_covered_out', 'mean_distance_out']:
+        if column in base_df.columns and column in new_df.columns:
+            compare_df[f'{column}_change'] = new_df[column] - base_df[column]
+    return compare_df
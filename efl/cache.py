@@ -0,0 +1,130 @@
+# content-addressed on-disk cache of optimization results
+
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+import efl.model as model
+
+_CACHE_VERSION = 1 # change when the stored format or the models change
+
+class ResultCache:
+    """Directory of pickled results keyed by a hash of the validated input
+    dataframes and the normalized parameters. Least recently used entries
+    are evicted when the directory grows beyond max_bytes.
+
+    Keyword arguments:
+    directory -- cache directory (created if missing)
+    max_bytes -- size limit of the cache (default: 1 GB; None: no limit)
+    """
+    def __init__(self, directory, *, max_bytes=2**30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def get_key(self, dfs, parameters):
+        """hex digest of the dataframes (values, columns and dtypes) and
+        the parameters (a dict of json serializable values)"""
+        digest = hashlib.sha256(f'efl cache {_CACHE_VERSION}'.encode())
+        for df in dfs:
+            digest.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode())
+            digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        digest.update(json.dumps(parameters, sort_keys=True, default=_to_json).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        # Results for key (and mark it as recently used) or None
+        path = self._get_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            stored = pd.read_pickle(path)
+            os.utime(path)
+        except FileNotFoundError: # evicted by another process
+            return None
+        except Exception:
+            logging.warning(f'removing unreadable cache entry {path}')
+            self.invalidate(key)
+            return None
+        logging.info(f'cache hit {key}')
+        results = model.Results(stored['assignment_df'], stored['parameters_dict'],
+                                stored['solver_mip_gap'], stored['solver_wall_time'])
+        results.timings = dict(stored.get('timings', {})) # of the original run
+        results.model_stats = dict(stored.get('model_stats', {}))
+        return results
+
+    def put(self, key, results):
+        # store results under key, then evict least recently used entries
+        stored = {'assignment_df':results.assignment_df,
+                  'parameters_dict':results.parameters_dict,
+                  'solver_mip_gap':results.solver_mip_gap,
+                  'solver_wall_time':results.solver_wall_time,
+                  'timings':results.timings,
+                  'model_stats':results.model_stats}
+        path = self._get_path(key)
+        temp_path = f'{path}.{os.getpid()}.tmp' # concurrent writers (e.g. batch workers)
+        pd.to_pickle(stored, temp_path)
+        os.replace(temp_path, path)
+        self._evict()
+
+    def invalidate(self, key):
+        # remove one entry (no error if missing)
+        try:
+            os.remove(self._get_path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        # remove every entry
+        for path, _, _ in self._get_entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, key+'.pkl')
+
+    def _get_entries(self):
+        # (path, size, last used), least recently used first
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError: # removed by another process
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        entries = self._get_entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries[:-1]: # always keep the newest entry
+            if total<=self.max_bytes:
+                break
+            logging.info(f'evicting cache entry {path}')
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+def get_cache(cache):
+    # ResultCache from a ResultCache or a directory path
+    if cache is None or isinstance(cache, ResultCache):
+        return cache
+    return ResultCache(cache)
+
+def _to_json(value):
+    # numpy values and collections of ids in parameters
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, frozenset, np.ndarray, pd.Series, pd.Index)):
+        return sorted(str(v) for v in value)
+    return str(value)
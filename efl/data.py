@@ -3,6 +3,17 @@ from itertools import product
 import numpy as np
 from dataclasses import dataclass, field
 import logging
+import os
+import json
+import hashlib
+import zipfile
+import struct
+try: # optional: parquet and feather/arrow ipc distance files
+    import pyarrow as pa
+    import pyarrow.dataset as pa_dataset
+    import pyarrow.compute as pa_compute
+except ImportError:
+    pa = None
 
 @dataclass
 class Column:
@@ -18,6 +29,10 @@ class FileInfo:
     required_cols: list[Column] #required, so no default value
     optional_cols: list[Column]=field(default_factory=list)
 
+# coordinates to compute distances from (see distance.get_distance_df)
+def _get_coordinate_cols():
+    return [Column(name, numeric=True) for name in ['x','y','lon','lat']]
+
 def validate_destination_df(df, capacity=None):
     file_info = FileInfo(
         'destination file',
@@ -28,7 +43,7 @@ def validate_destination_df(df, capacity=None):
             Column('open', valid_values=['yes','percent']),
             Column('preference', valid_values=[-3,-2,-1,0,1,2,3]),
             Column('capacity', numeric=True)
-        ]
+        ] + _get_coordinate_cols()
     )
     df = _validate_data(df, file_info)
     df = _include_capacity(df, capacity)
@@ -52,7 +67,10 @@ def _include_capacity(df, capacity):
     return df
 
 def validate_distance_df(df):
-    file_info = FileInfo(
+    return _validate_data(df, _get_distance_file_info())
+
+def _get_distance_file_info():
+    return FileInfo(
         'distances file',
         required_cols=[
             Column('origin', nullable=False),
@@ -60,7 +78,6 @@ def validate_distance_df(df):
             Column('distance', numeric=True, nullable=False)
         ]
     )
-    return _validate_data(df, file_info)
 
 def validate_origin_df(df):
     file_info = FileInfo(
@@ -68,86 +85,145 @@ def validate_origin_df(df):
         required_cols=[
             Column('id', unique=True, nullable=False),
             Column('population', numeric=True, nullable=False)
-        ]
+        ],
+        optional_cols=_get_coordinate_cols()
     )
     df = _validate_data(df, file_info)
     df = _clean_origins(df)
     return df
 
+_MAX_REPORTED_ROWS = 10 # offending rows logged per column and problem
+
 # check if data file has the correct attributes
 def _validate_data(df, file_info):
     """Validates data and returns dataframe or None if data is invalid
     """
-    has_error = False
-    col_names = set(df.columns.values)
-
-    # test if data has required columns
-    required = {col.name for col in file_info.required_cols}
-    missing_cols = required - col_names
-    if len(missing_cols)>0:
-        logging.error(f'Missing required columns: {missing_cols}')
-        has_error = True
-    
-    # test if there are unrecognized columns
-    optional = {col.name for col in file_info.optional_cols}
-    extra_cols = col_names - (optional | required)
-    if len(extra_cols)>0:
-        logging.error(f'Unrecognized columns: {extra_cols}')
-        has_error = True
-
-
-    # loop over required columns and ensure they contain expected information
-    missing_data = []
-    no_data = []
-    duplicate_data = []
-    not_numeric = []
-    for col in (file_info.required_cols + file_info.optional_cols):
-        if col.name in col_names:
+    checks = _DataChecks(file_info)
+    checks.update(df)
+    has_error, no_data = checks.report()
+    if len(no_data)>0:
+        df = df.drop(columns=no_data)
+
+    return None if has_error else df
+
+class _DataChecks:
+    # results of the _validate_data checks, updated one chunk of rows at a
+    # time so that large files can be validated without loading them whole.
+    # Each check is one vectorized pass over a column; the first max_rows
+    # offending rows (0-based positions in the data) are kept for the log
+    def __init__(self, file_info, *, max_rows=_MAX_REPORTED_ROWS):
+        self.file_info = file_info
+        self.max_rows = max_rows
+        self.col_names = None
+        self.num_rows = 0 # rows checked so far
+        self.missing_data = []
+        self.has_data = {}
+        self.duplicate_data = []
+        self.not_numeric = []
+        self.unique_values = {} # values of unique columns (checked by report)
+        self.invalid_values = {}
+        self.rows = {} # (problem, column): offending rows
+
+    def _add(self, problems, name):
+        if name not in problems:
+            problems.append(name)
+
+    def _add_rows(self, problem, name, mask, offset):
+        rows = self.rows.setdefault((problem, name), [])
+        if len(rows)<self.max_rows:
+            rows.extend((np.flatnonzero(mask)[:self.max_rows-len(rows)] + offset).tolist())
+
+    def update(self, df):
+        if self.col_names is None:
+            self.col_names = set(df.columns.values)
+        # loop over columns and ensure they contain expected information
+        for col in (self.file_info.required_cols + self.file_info.optional_cols):
+            if col.name not in self.col_names:
+                continue
+            values = df[col.name]
             # test for missing data
             if not col.nullable:
-                if df[col.name].dropna().shape[0]<df[col.name].shape[0]:
-                    missing_data.append(col.name)
+                missing = values.isna().to_numpy()
+                if missing.any():
+                    self._add(self.missing_data, col.name)
+                    self._add_rows('missing data', col.name, missing, self.num_rows)
             else:
                 # these are nullable, so they are optional
-                if df[col.name].dropna().shape[0]==0:
-                    no_data.append(col.name)
-            # test for unique values
+                self.has_data[col.name] = self.has_data.get(col.name, False) or values.notna().any()
+            # keep values to test for unique values (also across chunks)
             if col.unique:
-                if len(set(df[col.name]))<df[col.name].shape[0]:
-                    duplicate_data.append(col.name)
-            # verify values are numeric
-            if col.numeric:
-                try:
-                    pd.to_numeric(df[col.name], errors='raise')
-                except Exception:
-                    not_numeric.append(col.name)
-    if len(missing_data)>0:
-        logging.error(f'Columns with missing data: {missing_data}')
-        has_error = True
-    if len(no_data)>0:
-        df = df.drop(columns=no_data)
-        logging.warning(f'Columns with no data: {no_data}')
-    if len(duplicate_data)>0:
-        logging.error(f'Columns with duplicate entries: {duplicate_data}')
-        has_error = True
-    if len(not_numeric)>0:
-        logging.error(f'Columns with non-numeric data: {not_numeric}')
-        has_error = True
-
-    invalid_values = []
-    for col in (file_info.required_cols + file_info.optional_cols):
-        if col.name in col_names:
+                self.unique_values.setdefault(col.name, []).append(values)
+            # verify values are numeric (numeric dtypes need no check)
+            if col.numeric and not pd.api.types.is_numeric_dtype(values.dtype):
+                not_numeric = (pd.to_numeric(values, errors='coerce').isna() & values.notna()).to_numpy()
+                if not_numeric.any():
+                    self._add(self.not_numeric, col.name)
+                    self._add_rows('non-numeric data', col.name, not_numeric, self.num_rows)
             # check that values match defined valid values
             if col.valid_values:
-                values_in_col = list(df[col.name].dropna())
-                # convert values to numbers to do the comparison
-                values_in_col_as_num = [_convert_to_number(x) for x in values_in_col]
-                invalid_values = set(values_in_col_as_num) - set(col.valid_values)
-                if len(invalid_values)>0:
-                    logging.error(f"Invalid values in column \'{col.name}\': {invalid_values} not among {col.valid_values}")
-                    has_error = True
+                # convert distinct values to numbers to do the comparison
+                invalid = [x for x in values.dropna().unique() 
+                           if _convert_to_number(x) not in col.valid_values]
+                if len(invalid)>0:
+                    self.invalid_values.setdefault(col.name, set()).update(
+                        _convert_to_number(x) for x in invalid)
+                    self._add_rows('invalid values', col.name, 
+                                   values.isin(invalid).to_numpy(), self.num_rows)
+        self.num_rows += df.shape[0]
 
-    return None if has_error else df
+    def _check_unique(self):
+        # one pass over all the values of each unique column
+        for name, chunks in self.unique_values.items():
+            values = pd.concat(chunks, ignore_index=True) if len(chunks)>1 else chunks[0]
+            duplicated = values.duplicated().to_numpy()
+            if duplicated.any():
+                self._add(self.duplicate_data, name)
+                self._add_rows('duplicate entries', name, duplicated, 0)
+        self.unique_values = {}
+
+    def report(self):
+        # log the problems found; return (has_error, columns with no data)
+        has_error = False
+        col_names = self.col_names or set()
+        self._check_unique()
+
+        # test if data has required columns
+        required = {col.name for col in self.file_info.required_cols}
+        missing_cols = required - col_names
+        if len(missing_cols)>0:
+            logging.error(f'Missing required columns: {missing_cols}')
+            has_error = True
+        
+        # test if there are unrecognized columns
+        optional = {col.name for col in self.file_info.optional_cols}
+        extra_cols = col_names - (optional | required)
+        if len(extra_cols)>0:
+            logging.error(f'Unrecognized columns: {extra_cols}')
+            has_error = True
+
+        no_data = [name for name, has_data in self.has_data.items() if not has_data]
+        if len(self.missing_data)>0:
+            logging.error(f'Columns with missing data: {self.missing_data}')
+            has_error = True
+        if len(no_data)>0:
+            logging.warning(f'Columns with no data: {no_data}')
+        if len(self.duplicate_data)>0:
+            logging.error(f'Columns with duplicate entries: {self.duplicate_data}')
+            has_error = True
+        if len(self.not_numeric)>0:
+            logging.error(f'Columns with non-numeric data: {self.not_numeric}')
+            has_error = True
+
+        for col in (self.file_info.required_cols + self.file_info.optional_cols):
+            invalid_values = self.invalid_values.get(col.name, set())
+            if len(invalid_values)>0:
+                logging.error(f"Invalid values in column \'{col.name}\': {invalid_values} not among {col.valid_values}")
+                has_error = True
+
+        for (problem, name), rows in self.rows.items():
+            logging.error(f"{problem} in column '{name}', first rows (0-based): {rows}")
+
+        return has_error, no_data
 
 def _convert_to_number(string):
     try:
@@ -178,11 +254,20 @@ def _clean_origins(df):
     return df
 
 
-def build_dist_df(orig_df, dest_df, dist_lookup_df):
+def build_dist_df(orig_df, dest_df, dist_lookup_df, *, sparse=False, radius=None, k_nearest=None):
     '''return dataframe with: origin, destination, distance, population
     for the needed pairs (distances are read from the provided 
     distance csv file, which may have extra distances)
+
+    Keyword arguments:
+    sparse -- join only the lookup rows that exist instead of building the
+    full origin x destination product; missing pairs are allowed (default: False)
+    radius -- (sparse only) drop pairs more than radius apart while joining
+    k_nearest -- (sparse only) keep each origin's k nearest destinations (ties kept)
     '''
+    if sparse:
+        return _build_sparse_dist_df(orig_df, dest_df, dist_lookup_df, radius, k_nearest)
+
     dist_df = (
         orig_df
         .merge(dest_df, how='cross')
@@ -195,4 +280,288 @@ def build_dist_df(orig_df, dest_df, dist_lookup_df):
         logging.error(f'No distance data for {missing_distances}')
         return None
     
-    return dist_df
\ No newline at end of file
+    return dist_df
+
+def _build_sparse_dist_df(orig_df, dest_df, dist_lookup_df, radius, k_nearest):
+    # only rows of the lookup table are ever joined, so memory is
+    # proportional to the number of pairs kept (never origins x destinations)
+    lookup_df = dist_lookup_df[['origin','destination','distance']]
+    lookup_df = lookup_df[
+        lookup_df['origin'].isin(set(orig_df['id'])) 
+        & lookup_df['destination'].isin(set(dest_df['id']))
+    ]
+    num_duplicates = lookup_df.duplicated(['origin','destination']).sum()
+    if num_duplicates>0:
+        logging.warning(f'{num_duplicates} duplicate (origin, destination) rows ignored')
+        lookup_df = lookup_df.drop_duplicates(['origin','destination'])
+    in_lookup = lookup_df['origin'].value_counts()
+
+    if radius is not None:
+        lookup_df = lookup_df[lookup_df['distance'] <= radius]
+    if k_nearest is not None:
+        rank = lookup_df.groupby('origin')['distance'].rank(method='min')
+        lookup_df = lookup_df[rank <= k_nearest]
+
+    dist_df = (
+        lookup_df
+        .merge(orig_df[['id','population']].rename(columns={'id':'origin'}), on='origin')
+        [['origin','destination','population','distance']]
+        .reset_index(drop=True)
+    )
+
+    gaps_df = get_coverage_gaps(orig_df, dest_df, dist_df, in_lookup=in_lookup)
+    num_incomplete = (gaps_df['missing']>0).sum()
+    if num_incomplete>0:
+        logging.info(f'{num_incomplete} origins have no distance data for some destinations')
+    uncovered = list(gaps_df.query('kept==0')['origin'])
+    if len(uncovered)>0:
+        logging.error(f'No usable distance data for {len(uncovered)} origins: {uncovered[:10]}')
+        return None
+
+    return dist_df
+
+def get_coverage_gaps(orig_df, dest_df, dist_df, *, in_lookup=None):
+    '''return dataframe with one row per origin: origin, 
+    in_lookup (pairs found in the lookup table), kept (pairs in dist_df), 
+    missing (destinations with no distance data for the origin)
+
+    in_lookup -- series of lookup pair counts indexed by origin
+    (default: count the pairs in dist_df)
+    '''
+    kept = dist_df['origin'].value_counts()
+    if in_lookup is None:
+        in_lookup = kept
+    gaps_df = pd.DataFrame({'origin': orig_df['id']})
+    gaps_df['in_lookup'] = gaps_df['origin'].map(in_lookup).fillna(0).astype(int)
+    gaps_df['kept'] = gaps_df['origin'].map(kept).fillna(0).astype(int)
+    gaps_df['missing'] = dest_df.shape[0] - gaps_df['in_lookup']
+    
+    return gaps_df
+
+
+# distance lookup files: csv, parquet, feather/arrow ipc or npz matrix
+_DISTANCE_COLUMNS = ['origin','destination','distance']
+_ARROW_FORMATS = {'.parquet':'parquet', '.pq':'parquet', 
+                  '.feather':'feather', '.arrow':'feather', '.ipc':'feather'}
+
+def read_distance_file(path, *, origins=None, destinations=None, radius=None, 
+                       chunksize=1000000, trusted_dir=None):
+    '''return validated distance lookup dataframe (origin, destination, 
+    distance) read from a csv, parquet, feather/arrow ipc or npz file (by 
+    extension), keeping only the rows that are needed, or None if the data 
+    has errors (see logs). Csv files are read and validated chunksize rows 
+    at a time, so memory is proportional to the rows kept rather than to 
+    the file. Parquet files are filtered while reading, feather/arrow and npz 
+    files are memory-mapped, and only the origin, destination and distance 
+    columns of columnar files are read.
+
+    Keyword arguments:
+    origins -- keep only these origin ids (default: all)
+    destinations -- keep only these destination ids (default: all)
+    radius -- keep only distances <= radius (default: all); only for sparse
+    builds, since the dense build_dist_df needs every pair
+    chunksize -- rows per csv chunk (default: 1000000)
+    trusted_dir -- trusted input: directory of validation records; a file 
+    that passed validation and has not changed since (same size and 
+    modification time) is not checked again (default: always validate)
+    '''
+    file_info = _get_distance_file_info()
+    stamp = _get_file_stamp(path)
+    no_data = _get_trusted_no_data(trusted_dir, path, file_info, stamp)
+    checks = _DataChecks(file_info) if no_data is None else None
+    suffix = os.path.splitext(str(path))[1].lower()
+    whole_file = True # every row was checked
+    if suffix in _ARROW_FORMATS:
+        df = _read_arrow(path, _ARROW_FORMATS[suffix], origins, destinations, radius)
+        whole_file = origins is None and destinations is None and radius is None
+    elif suffix=='.npz':
+        df = _read_npz(path, origins, destinations, radius)
+        whole_file = origins is None and destinations is None and radius is None
+    else:
+        df = _read_distance_csv(path, origins, destinations, radius, chunksize, checks)
+
+    if checks is None:
+        logging.info(f'trusted input: skipped validation of unchanged {path}')
+    else:
+        if suffix in _ARROW_FORMATS or suffix=='.npz':
+            checks.update(df)
+        has_error, no_data = checks.report()
+        if has_error:
+            return None
+        if whole_file:
+            _set_trusted_no_data(trusted_dir, path, file_info, stamp, no_data)
+    return df.drop(columns=no_data)
+
+def _read_distance_csv(path, origins, destinations, radius, chunksize, checks):
+    # every row is validated (unless checks is None), only the needed rows are kept
+    origins = None if origins is None else pd.Index(pd.unique(pd.Series(list(origins))))
+    destinations = None if destinations is None else pd.Index(pd.unique(pd.Series(list(destinations))))
+    kept = []
+    has_rows = False
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        has_rows = True
+        if checks is not None:
+            checks.update(chunk)
+        if set(_DISTANCE_COLUMNS) <= set(chunk.columns.values):
+            kept.append(_filter_lookup(chunk, origins, destinations, radius))
+    if not has_rows:
+        header_df = pd.read_csv(path, nrows=0)
+        if checks is not None:
+            checks.update(header_df)
+        kept.append(header_df)
+    if len(kept)==0: # missing columns, reported by checks
+        return None
+    df = pd.concat(kept, ignore_index=True) if len(kept)>1 else kept[0]
+    logging.info(f'kept {df.shape[0]} rows of {path}')
+    return df
+
+# validation records of trusted input files
+_TRUSTED_VERSION = 1 # change when the checks change
+
+def _get_file_stamp(path):
+    # taken before reading, so a file changed while it is read is checked again
+    stat = os.stat(path)
+    return {'version':_TRUSTED_VERSION, 'size':stat.st_size, 'mtime_ns':stat.st_mtime_ns}
+
+def _get_trusted_path(trusted_dir, path, file_info):
+    key = hashlib.sha256(f'{os.path.abspath(path)}\n{file_info!r}'.encode()).hexdigest()
+    return os.path.join(trusted_dir, key+'.json')
+
+def _get_trusted_no_data(trusted_dir, path, file_info, stamp):
+    # columns with no data of a trusted file, or None if it must be checked
+    if trusted_dir is None:
+        return None
+    try:
+        with open(_get_trusted_path(trusted_dir, path, file_info)) as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if record.get('stamp')!=stamp:
+        return None
+    return record['no_data']
+
+def _set_trusted_no_data(trusted_dir, path, file_info, stamp, no_data):
+    if trusted_dir is None:
+        return
+    os.makedirs(trusted_dir, exist_ok=True)
+    record_path = _get_trusted_path(trusted_dir, path, file_info)
+    temp_path = f'{record_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump({'path':os.path.abspath(path), 'stamp':stamp, 'no_data':no_data}, f)
+    os.replace(temp_path, record_path)
+
+def _filter_lookup(df, origins, destinations, radius):
+    keep = np.ones(df.shape[0], dtype=bool)
+    if origins is not None:
+        keep &= df['origin'].isin(origins).to_numpy()
+    if destinations is not None:
+        keep &= df['destination'].isin(destinations).to_numpy()
+    if radius is not None:
+        keep &= (pd.to_numeric(df['distance'], errors='coerce') <= radius).to_numpy()
+    return df if keep.all() else df[keep].reset_index(drop=True)
+
+def _read_arrow(path, file_format, origins, destinations, radius):
+    if pa is None:
+        raise ImportError(f'reading {file_format} distance files requires pyarrow')
+    if file_format=='parquet':
+        dataset = pa_dataset.dataset(path, format='parquet')
+    else: # memory-mapped arrow ipc file
+        with pa.memory_map(str(path)) as source:
+            dataset = pa_dataset.dataset(pa.ipc.open_file(source).read_all())
+    names = dataset.schema.names
+    columns = [col for col in _DISTANCE_COLUMNS if col in names]
+    if len(columns)<len(_DISTANCE_COLUMNS): # let validate_distance_df report the problem
+        return dataset.to_table(columns=columns).to_pandas()
+
+    condition = None
+    for col, values in [('origin', origins), ('destination', destinations)]:
+        if values is not None:
+            value_set = pa.array(list(values)).cast(dataset.schema.field(col).type)
+            condition = _and(condition, pa_dataset.field(col).isin(value_set))
+    if radius is not None:
+        condition = _and(condition, pa_dataset.field('distance') <= radius)
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+def _and(condition, other):
+    return other if condition is None else condition & other
+
+def _read_npz(path, origins, destinations, radius):
+    # matrix format: origin (ids), destination (ids), 
+    # distance (origins x destinations, nan where there is no distance)
+    with np.load(path, allow_pickle=False) as npz:
+        orig_ids = npz['origin']
+        dest_ids = npz['destination']
+    distance = _load_npz_array(path, 'distance')
+    rows = np.arange(len(orig_ids))
+    if origins is not None:
+        rows = np.flatnonzero(pd.Index(orig_ids).isin(list(origins)))
+    cols = np.arange(len(dest_ids))
+    if destinations is not None:
+        cols = np.flatnonzero(pd.Index(dest_ids).isin(list(destinations)))
+    block = np.asarray(distance[rows][:, cols]) # reads only the needed rows
+    keep = ~np.isnan(block)
+    if radius is not None:
+        keep &= block <= radius
+    r, c = np.nonzero(keep)
+    return pd.DataFrame({'origin':orig_ids[rows][r], 'destination':dest_ids[cols][c], 
+                         'distance':block[r, c]})
+
+def _load_npz_array(path, name):
+    # memory-map an uncompressed array of an npz file (np.load reads it all)
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(name+'.npy')
+    if info.compress_type!=zipfile.ZIP_STORED:
+        with np.load(path, allow_pickle=False) as npz:
+            return npz[name]
+    with open(path, 'rb') as f:
+        f.seek(info.header_offset)
+        name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30]) # zip local header
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version==(1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    return np.memmap(path, dtype=dtype, mode='r', shape=shape, offset=offset, 
+                     order='F' if fortran_order else 'C')
+
+def convert_distance_file(in_path, out_path, *, dtype='float64'):
+    '''convert a distance lookup file (e.g. csv) to parquet, feather/arrow 
+    ipc or npz (by extension of out_path); returns 0, or 1 if the data has 
+    errors (see logs)
+
+    Keyword arguments:
+    dtype -- distance type of npz files: 'float64' or 'float32' (half the 
+    size, distances rounded to ~7 significant digits) (default: 'float64')
+    '''
+    df = read_distance_file(in_path)
+    if df is None:
+        return 1
+    df = df[_DISTANCE_COLUMNS]
+    num_duplicates = df.duplicated(['origin','destination']).sum()
+    if num_duplicates>0:
+        logging.warning(f'{num_duplicates} duplicate (origin, destination) rows ignored')
+        df = df.drop_duplicates(['origin','destination'])
+
+    suffix = os.path.splitext(str(out_path))[1].lower()
+    if _ARROW_FORMATS.get(suffix)=='parquet':
+        df.to_parquet(out_path, index=False)
+    elif _ARROW_FORMATS.get(suffix)=='feather':
+        df.reset_index(drop=True).to_feather(out_path, compression='uncompressed') # can be memory-mapped
+    elif suffix=='.npz':
+        orig_code, orig_ids = pd.factorize(df['origin'])
+        dest_code, dest_ids = pd.factorize(df['destination'])
+        distance = np.full((len(orig_ids), len(dest_ids)), np.nan, dtype=dtype)
+        distance[orig_code, dest_code] = df['distance'].to_numpy(dtype=float)
+        np.savez(out_path, origin=_to_array(orig_ids), destination=_to_array(dest_ids), 
+                 distance=distance)
+    else:
+        raise ValueError(f'unknown distance file format: {out_path} (use .parquet, .feather, .arrow or .npz)')
+    logging.info(f'wrote {df.shape[0]} distances to {out_path}')
+    return 0
+
+def _to_array(ids):
+    # ids as a numpy array that loads without pickle
+    values = np.asarray(ids)
+    return values.astype(str) if values.dtype==object else values
@@ -0,0 +1,135 @@
+# distances computed from origin and destination coordinates
+
+import numpy as np
+import pandas as pd
+import logging
+try: # optional: k-d tree neighbor searches (chunked brute force without it)
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+METRICS = ['euclidean', 'manhattan', 'haversine']
+EARTH_RADIUS = 6371.0088 # mean earth radius in km (haversine distances are in its units)
+
+def get_distance_df(orig_df, dest_df, metric='euclidean', *, radius=None, k_nearest=None,
+                    columns=None, earth_radius=EARTH_RADIUS, max_chunk_size=10**7, tree=None):
+    """Return distance lookup dataframe (origin, destination, distance)
+    computed from the coordinates of the origins and destinations, for
+    every pair or, for a sparse run, only the pairs within radius and/or
+    each origin's k_nearest nearest destinations (ties broken arbitrarily).
+    Neighbors are found with a k-d tree (scipy) or, without scipy, by brute
+    force a chunk of origins at a time, so no origin x destination matrix
+    is ever built whole. Haversine pairs are searched by the chord between
+    points on the sphere, which orders them as the great circle distance
+    does.
+
+    Keyword arguments:
+    metric -- 'euclidean', 'manhattan' (taxicab) or 'haversine' (great
+    circle, from degrees) (default: 'euclidean')
+    radius -- keep only pairs at most radius apart (default: None)
+    k_nearest -- keep only each origin's k nearest destinations (default: None)
+    columns -- (x, y) coordinate columns of both dataframes (default:
+    ('x', 'y'), or ('lon', 'lat') for haversine)
+    earth_radius -- (haversine) (default: EARTH_RADIUS, distances in km)
+    max_chunk_size -- (brute force) max origins x destinations distances
+    computed at once (default: 10**7)
+    tree -- use a k-d tree (default: if scipy is installed and radius or
+    k_nearest is set)
+    """
+    if metric not in METRICS:
+        raise ValueError(f"unknown metric '{metric}' (use one of {METRICS})")
+    if columns is None:
+        columns = ('lon', 'lat') if metric=='haversine' else ('x', 'y')
+    orig_xy = _get_coordinates(orig_df, columns, 'origin')
+    dest_xy = _get_coordinates(dest_df, columns, 'destination')
+    if metric=='haversine':
+        orig_xy, dest_xy = np.radians(orig_xy), np.radians(dest_xy)
+    if k_nearest is not None and k_nearest>=len(dest_xy):
+        k_nearest = None
+    if tree is None:
+        tree = cKDTree is not None and (radius is not None or k_nearest is not None)
+    elif tree and cKDTree is None:
+        raise ImportError('k-d tree neighbor search requires scipy')
+
+    if tree:
+        orig, dest = _get_tree_pairs(orig_xy, dest_xy, metric, radius, k_nearest, earth_radius)
+    else:
+        orig, dest = _get_brute_force_pairs(orig_xy, dest_xy, metric, radius, k_nearest,
+                                            earth_radius, max_chunk_size)
+    distance = _get_distance(orig_xy[orig], dest_xy[dest], metric, earth_radius)
+    if radius is not None: # the search is padded against rounding
+        keep = distance<=radius
+        orig, dest, distance = orig[keep], dest[keep], distance[keep]
+    order = np.lexsort((dest, orig))
+    logging.info(f'{len(order)} {metric} distances of {len(orig_xy)} origins and {len(dest_xy)} destinations')
+    return pd.DataFrame({'origin':orig_df['id'].to_numpy()[orig[order]],
+                         'destination':dest_df['id'].to_numpy()[dest[order]],
+                         'distance':distance[order]})
+
+def _get_coordinates(df, columns, name):
+    missing = [column for column in columns if column not in df.columns]
+    if len(missing)>0:
+        raise ValueError(f'{name} data has no coordinate columns {missing}')
+    xy = df[list(columns)].to_numpy(dtype=float)
+    if np.isnan(xy).any():
+        raise ValueError(f'{np.isnan(xy).any(axis=1).sum()} {name}s have no coordinates')
+    return xy
+
+def _get_distance(orig_xy, dest_xy, metric, earth_radius):
+    # distances between rows of orig_xy and dest_xy (broadcast, so also
+    # chunk x destinations matrices); haversine coordinates in radians
+    if metric=='euclidean':
+        return np.sqrt(((orig_xy - dest_xy)**2).sum(axis=-1))
+    if metric=='manhattan':
+        return np.abs(orig_xy - dest_xy).sum(axis=-1)
+    lon1, lat1 = orig_xy[...,0], orig_xy[...,1]
+    lon2, lat2 = dest_xy[...,0], dest_xy[...,1]
+    h = np.sin((lat2-lat1)/2)**2 + np.cos(lat1)*np.cos(lat2)*np.sin((lon2-lon1)/2)**2
+    return 2*earth_radius*np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+def _get_brute_force_pairs(orig_xy, dest_xy, metric, radius, k_nearest, earth_radius, max_chunk_size):
+    # (origin, destination) codes of the kept pairs, a chunk of origins at a time
+    num_dests = len(dest_xy)
+    chunk = max(1, max_chunk_size//max(num_dests, 1))
+    origs, dests = [], []
+    for start in range(0, len(orig_xy), chunk):
+        stop = min(start+chunk, len(orig_xy))
+        matrix = _get_distance(orig_xy[start:stop,None,:], dest_xy[None,:,:], metric, earth_radius)
+        if k_nearest is not None:
+            nearest = np.argpartition(matrix, k_nearest-1, axis=1)[:,:k_nearest]
+            keep = np.zeros(matrix.shape, dtype=bool)
+            np.put_along_axis(keep, nearest, True, axis=1)
+        else:
+            keep = np.ones(matrix.shape, dtype=bool)
+        if radius is not None:
+            keep &= matrix<=radius
+        orig, dest = np.nonzero(keep)
+        origs.append(orig+start)
+        dests.append(dest)
+    if len(origs)==0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(origs), np.concatenate(dests)
+
+def _get_tree_pairs(orig_xy, dest_xy, metric, radius, k_nearest, earth_radius):
+    # (origin, destination) codes of the pairs within radius and/or k nearest
+    p = 1 if metric=='manhattan' else 2
+    bound = np.inf if radius is None else radius*(1+1e-9) + 1e-9 # pad against rounding
+    if metric=='haversine': # chords of the unit sphere x earth_radius
+        orig_xy = earth_radius*_to_sphere(orig_xy)
+        dest_xy = earth_radius*_to_sphere(dest_xy)
+        if radius is not None:
+            bound = 2*earth_radius*np.sin(min(bound/(2*earth_radius), np.pi/2)) + 1e-9
+    dest_tree = cKDTree(dest_xy)
+    if k_nearest is not None:
+        _, dest = dest_tree.query(orig_xy, k=k_nearest, p=p, distance_upper_bound=bound)
+        dest = dest.reshape(len(orig_xy), k_nearest)
+        orig = np.repeat(np.arange(len(orig_xy)), k_nearest).reshape(dest.shape)
+        found = dest<len(dest_xy) # missing neighbors have index len(dest_xy)
+        return orig[found], dest[found]
+    pairs = cKDTree(orig_xy).sparse_distance_matrix(dest_tree, bound, p=p, output_type='ndarray')
+    return pairs['i'].astype(np.int64), pairs['j'].astype(np.int64)
+
+def _to_sphere(lon_lat):
+    # unit vectors of (longitude, latitude) in radians
+    lon, lat = lon_lat[:,0], lon_lat[:,1]
+    return np.column_stack([np.cos(lat)*np.cos(lon), np.cos(lat)*np.sin(lon), np.sin(lat)])
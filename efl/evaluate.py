@@ -0,0 +1,267 @@
+# evaluate open destination sets without solving a model
+
+import numpy as np
+import pandas as pd
+import logging
+
+def evaluate_open_sets(instance, open_sets, *, aversion=-1, iso_radius=None, max_chunk_size=10**7):
+    """Assign each origin to its nearest open destination for each of many
+    sets of open destinations and return the results of each set, as
+    Results.ede_out, mean_distance_out and percent_covered_out compute
+    them from its assignment. An origin's nearest open distance is the
+    running minimum over the pairs of the open destinations (vectorized
+    per destination, so a set costs the number of pairs of its open
+    destinations), and the results of a chunk of sets are computed
+    together. Sets that leave an origin with no open destination get NaN.
+
+    Returns dataframe, one row per set: num_open, mean_distance, ede
+    (ede_<aversion> for each aversion if aversion is a list) and
+    percent_covered (if iso_radius)
+
+    Keyword arguments:
+    instance -- efl.instance.Instance
+    open_sets -- boolean matrix (sets x destinations in instance order) or
+    dataframe with destination id columns (the row index is kept)
+    aversion -- aversion to inequality, or list of aversions (default: -1)
+    iso_radius -- coverage radius (default: None, no percent_covered)
+    max_chunk_size -- max sets x origins evaluated at once (default: 10**7)
+    """
+    index = None
+    if isinstance(open_sets, pd.DataFrame):
+        index = open_sets.index
+        open_sets = open_sets.reindex(columns=instance.dest_ids, fill_value=False).to_numpy()
+    open_sets = np.atleast_2d(np.asarray(open_sets, dtype=bool))
+    if open_sets.shape[1]!=instance.num_dests:
+        raise ValueError(f'open_sets has {open_sets.shape[1]} columns for {instance.num_dests} destinations')
+    many = isinstance(aversion, (list, tuple, np.ndarray))
+    aversions = list(aversion) if many else [aversion]
+    columns = [f'ede_{a}' for a in aversions] if many else ['ede']
+
+    population = instance.population.astype(float)
+    num_sets = open_sets.shape[0]
+    results = {'mean_distance':np.empty(num_sets)}
+    results.update({name:np.empty(num_sets) for name in columns})
+    if iso_radius is not None:
+        results['percent_covered'] = np.empty(num_sets)
+    chunk = max(1, max_chunk_size//max(instance.num_origs, 1))
+    for start in range(0, num_sets, chunk):
+        rows = slice(start, min(start+chunk, num_sets))
+        distance = _get_nearest_distance(instance, open_sets[rows])
+        results['mean_distance'][rows] = _get_mean_distance(distance, population)
+        for name, a in zip(columns, aversions):
+            results[name][rows] = _get_kp(distance, population, a)
+        if iso_radius is not None:
+            covered = (population*(distance<=iso_radius)).sum(axis=1)/population.sum()
+            results['percent_covered'][rows] = np.where(np.isnan(distance).any(axis=1), np.nan, covered)
+
+    num_unassigned = np.isnan(results['mean_distance']).sum()
+    if num_unassigned>0:
+        logging.warning(f'{num_unassigned} open sets leave some origins with no open destination')
+    return pd.DataFrame(dict(num_open=open_sets.sum(axis=1), **results), index=index)
+
+def _get_nearest_distance(instance, open_sets):
+    # sets x origins matrix of the distance to the nearest open destination
+    # (nan: no open destination)
+    pair_distance = instance.get_pair_distance()
+    nearest = np.full((open_sets.shape[0], instance.num_origs), np.inf)
+    for row, open_mask in enumerate(open_sets):
+        best = nearest[row]
+        for j in np.flatnonzero(open_mask):
+            k = instance.dest_pairs(j)
+            orig = instance.pair_orig[k] # distinct: one pair per origin
+            best[orig] = np.minimum(best[orig], pair_distance[k])
+    nearest[np.isinf(nearest)] = np.nan
+    return nearest
+
+def _get_mean_distance(distance, population):
+    # population-weighted mean of each row (as utils.get_mean_distance)
+    return (distance*population).sum(axis=1)/population.sum()
+
+def _get_kp(distance, population, aversion):
+    # Kolm-Pollak EDE of each row (as utils.get_kp: with the scaling
+    # factor of the row's assignment)
+    if aversion==0:
+        return _get_mean_distance(distance, population)
+    z = distance*population
+    kappa = aversion*z.sum(axis=1)/(z**2).sum(axis=1)
+    exponent = -kappa[:,None]*distance
+    shift = exponent.max(axis=1, keepdims=True) # log-sum-exp
+    log_mean = shift[:,0] + np.log((population*np.exp(exponent-shift)).sum(axis=1)/population.sum())
+    return -log_mean/kappa
+
+class IncrementalEvaluator:
+    """Results of one set of open destinations that is changed one
+    destination at a time, e.g. by toggling sites in a planning tool.
+    Each origin is assigned to its nearest open destination; the evaluator
+    keeps each origin's nearest and second nearest open destination and
+    running sums of population x distance, Kolm-Pollak terms and covered
+    population, so opening or closing a destination only touches the
+    origins that have a pair with it (closing recomputes the two nearest
+    open destinations of the origins that had it as one of theirs).
+    The EDE uses a fixed kappa = aversion x scaling_factor, as the model
+    objective does; utils.get_kp recomputes the scaling factor from each
+    assignment (see get_assignment_df).
+
+    Keyword arguments:
+    instance -- efl.instance.Instance
+    open_ids -- destination ids open at the start (default: none)
+    aversion -- aversion to inequality (default: -1)
+    scaling_factor -- (default: the scaling factor of the starting assignment)
+    iso_radius -- coverage radius of percent_covered (default: None)
+    """
+    def __init__(self, instance, open_ids=(), *, aversion=-1, scaling_factor=None, iso_radius=None):
+        self.instance = instance
+        self.population = instance.population.astype(float)
+        self.distance = instance.get_pair_distance()
+        self.open_mask = np.zeros(instance.num_dests, dtype=bool)
+        self.open_mask[[self._get_code(dest_id) for dest_id in open_ids]] = True
+        self.iso_radius = np.inf if iso_radius is None else iso_radius
+
+        num_origs = instance.num_origs
+        self.first_dest = np.full(num_origs, -1) # nearest open destination (-1: none)
+        self.first_distance = np.full(num_origs, np.inf)
+        self.second_dest = np.full(num_origs, -1) # second nearest open destination
+        self.second_distance = np.full(num_origs, np.inf)
+        self._update_nearest(np.arange(num_origs))
+
+        if scaling_factor is None:
+            if self.num_unassigned>0:
+                raise ValueError('scaling_factor is needed if some origins have no open destination')
+            z = self.first_distance*self.population
+            scaling_factor = z.sum()/(z**2).sum()
+        self.aversion = aversion
+        self.scaling_factor = scaling_factor
+        self.kappa = aversion*scaling_factor
+        self._set_sums()
+
+    @classmethod
+    def from_assignment_df(cls, instance, assignment_df, **kwargs):
+        """start from the destinations of an assignment, e.g. 
+        Results.assignment_df (origins are then reassigned to their nearest
+        open destination)"""
+        return cls(instance, assignment_df['destination'].unique(), **kwargs)
+
+    @property
+    def num_open(self):
+        return int(self.open_mask.sum())
+
+    @property
+    def num_unassigned(self):
+        # origins with no open destination
+        return int((self.first_dest<0).sum())
+
+    def open_ids(self):
+        return list(self.instance.dest_ids[self.open_mask])
+
+    def open(self, dest_id):
+        j = self._get_code(dest_id)
+        if self.open_mask[j]:
+            return
+        self.open_mask[j] = True
+        k = self.instance.dest_pairs(j)
+        orig, distance = self.instance.pair_orig[k], self.distance[k]
+        nearer = distance<self.second_distance[orig]
+        orig, distance = orig[nearer], distance[nearer]
+        first = distance<self.first_distance[orig]
+        self._remove_sums(orig[first])
+        # j becomes first (and the old first second) or second
+        new_second = orig[first]
+        self.second_dest[new_second] = self.first_dest[new_second]
+        self.second_distance[new_second] = self.first_distance[new_second]
+        self.first_dest[new_second] = j
+        self.first_distance[new_second] = distance[first]
+        self.second_dest[orig[~first]] = j
+        self.second_distance[orig[~first]] = distance[~first]
+        self._add_sums(orig[first])
+
+    def close(self, dest_id):
+        j = self._get_code(dest_id)
+        if not self.open_mask[j]:
+            return
+        self.open_mask[j] = False
+        orig = self.instance.pair_orig[self.instance.dest_pairs(j)]
+        orig = orig[(self.first_dest[orig]==j) | (self.second_dest[orig]==j)]
+        self._remove_sums(orig)
+        self._update_nearest(orig)
+        self._add_sums(orig)
+
+    def toggle(self, dest_id):
+        if self.open_mask[self._get_code(dest_id)]:
+            self.close(dest_id)
+        else:
+            self.open(dest_id)
+
+    def ede(self):
+        # Kolm-Pollak EDE with kappa = aversion x scaling_factor (nan if an 
+        # origin has no open destination)
+        if self.num_unassigned>0:
+            return np.nan
+        if self.kappa==0:
+            return self.mean_distance()
+        return -1/self.kappa*np.log(self.kp_sum/self.total_population)
+
+    def mean_distance(self):
+        if self.num_unassigned>0:
+            return np.nan
+        return self.distance_sum/self.total_population
+
+    def percent_covered(self):
+        return self.covered_population/self.total_population
+
+    def get_assignment_df(self):
+        """return assignment dataframe (origin, destination, distance, 
+        population) of the current open destinations (origins with no
+        open destination are left out)"""
+        origins = np.flatnonzero(self.first_dest>=0)
+        return pd.DataFrame({'origin':self.instance.orig_ids[origins],
+                             'destination':self.instance.dest_ids[self.first_dest[origins]],
+                             'distance':self.first_distance[origins],
+                             'population':self.instance.population[origins]})
+
+    def _get_code(self, dest_id):
+        j = self.instance.get_dest_codes([dest_id])[0]
+        if j<0:
+            raise ValueError(f'unknown destination {dest_id}')
+        return j
+
+    def _update_nearest(self, origins):
+        # recompute the two nearest open destinations of origins
+        instance = self.instance
+        counts = instance.orig_indptr[origins+1] - instance.orig_indptr[origins]
+        position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts)-counts, counts)
+        k = instance.orig_order[np.repeat(instance.orig_indptr[origins], counts) + position]
+        k = k[self.open_mask[instance.pair_dest[k]]]
+        orig = instance.pair_orig[k]
+        order = np.lexsort((self.distance[k], orig))
+        k, orig = k[order], orig[order]
+        is_first = np.ones(len(k), dtype=bool)
+        is_first[1:] = orig[1:]!=orig[:-1]
+        is_second = np.zeros(len(k), dtype=bool)
+        is_second[1:] = ~is_first[1:] & is_first[:-1]
+
+        self.first_dest[origins] = -1
+        self.first_distance[origins] = np.inf
+        self.second_dest[origins] = -1
+        self.second_distance[origins] = np.inf
+        self.first_dest[orig[is_first]] = instance.pair_dest[k[is_first]]
+        self.first_distance[orig[is_first]] = self.distance[k[is_first]]
+        self.second_dest[orig[is_second]] = instance.pair_dest[k[is_second]]
+        self.second_distance[orig[is_second]] = self.distance[k[is_second]]
+
+    def _set_sums(self):
+        self.total_population = self.population.sum()
+        self.distance_sum = 0.0
+        self.kp_sum = 0.0
+        self.covered_population = 0.0
+        self._add_sums(np.arange(self.instance.num_origs))
+
+    def _add_sums(self, origins, sign=1):
+        assigned = origins[self.first_dest[origins]>=0]
+        population = self.population[assigned]
+        distance = self.first_distance[assigned]
+        self.distance_sum += sign*(population*distance).sum()
+        self.kp_sum += sign*(population*np.exp(-self.kappa*distance)).sum()
+        self.covered_population += sign*population[distance<=self.iso_radius].sum()
+
+    def _remove_sums(self, origins):
+        self._add_sums(origins, sign=-1)
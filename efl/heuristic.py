@@ -0,0 +1,269 @@
+# greedy + vertex substitution heuristic for the facility location model
+
+import numpy as np
+import heapq
+import logging
+
+def solve(instance, coef, *,
+          minimize, num_locations, target,
+          open_destinations, percent_destinations, min_percent_open):
+    """Find a good (not necessarily optimal) set of destinations to open
+    for the linearized Kolm-Pollak model, using only numpy.
+    minimize='ede': greedy add up to num_locations, then fast interchange
+    (Teitz-Bart vertex substitution) until no swap improves the objective.
+    minimize='locations': greedy add until the objective meets target,
+    then drop destinations that are not needed.
+    Destinations in open_destinations are always open and at least
+    min_percent_open of percent_destinations are open.
+    Capacities are not supported.
+
+    Returns (list of open destination ids, assignment dataframe)
+
+    Keyword arguments:
+    instance -- efl.instance.Instance
+    coef -- numpy array of objective coefficients (one per pair)
+    minimize -- 'ede' or 'locations'
+    num_locations -- number of locations to open (if minimize='ede')
+    target -- bound on the sum of coefficients (if minimize='locations')
+    """
+    pairs = _Pairs(instance, coef)
+    dest_ids = instance.dest_ids
+    forced = np.isin(dest_ids, open_destinations)
+    percent = np.isin(dest_ids, percent_destinations)
+
+    if minimize=='ede':
+        open_mask = _greedy_add(pairs, forced.copy(), percent, min_percent_open,
+                                num_locations=num_locations)
+        open_mask = _interchange(pairs, open_mask, forced, percent, min_percent_open)
+    else: # minimize=='locations'
+        open_mask = _greedy_add(pairs, forced.copy(), percent, min_percent_open,
+                                target=target)
+        open_mask = _drop(pairs, open_mask, forced, percent, min_percent_open, target)
+
+    rows = pairs.assign(open_mask)
+    if rows is None:
+        raise ValueError('infeasible: heuristic left some origins with no open destination')
+    return list(dest_ids[open_mask]), instance.get_assignment_df(rows)
+
+def assign(instance, coef, open_ids):
+    """Return the best pair (code) of each origin among the open
+    destinations, or None if an origin has no open destination"""
+    pairs = _Pairs(instance, coef)
+    open_mask = np.isin(instance.dest_ids, list(open_ids))
+    return pairs.assign(open_mask)
+
+def solve_coverage(instance, *, max_locations, open_destinations, percent_destinations, 
+                   min_percent_open, swaps=True):
+    """Find good (not necessarily optimal) sets of destinations to open
+    that maximize the population covered, for every number of locations
+    up to max_locations at once. The pairs of the instance are the
+    coverage sets (e.g. pairs within iso_radius) and every origin must have
+    at least one. Lazy greedy: destinations in open_destinations open
+    first, then the best min_percent_open of percent_destinations, then
+    the destination with the largest marginal coverage, taken from a
+    priority queue whose stale gains are only recomputed when they reach
+    the top (gains never increase as more destinations open). Greedy
+    solutions are nested, so solution k is the first k destinations opened.
+    With swaps, each solution is improved by fast interchange.
+
+    Returns dict of number of locations: list of open destination ids, 
+    from the number that must open (at least 1) to max_locations
+
+    Keyword arguments:
+    instance -- efl.instance.Instance of the coverage pairs
+    max_locations -- largest number of locations to open
+    swaps -- improve each greedy solution by interchange (default: True)
+    """
+    population = instance.population.astype(float)
+    pairs = _Pairs(instance, np.zeros(instance.num_pairs), penalty=population)
+    dest_ids = instance.dest_ids
+    forced = np.isin(dest_ids, open_destinations)
+    percent = np.isin(dest_ids, percent_destinations)
+    min_locations = forced.sum() + min_percent_open
+    if min_locations>max_locations:
+        raise ValueError(f'infeasible: {min_locations} (> max_locations={max_locations}) destinations must open')
+    max_locations = min(max_locations, instance.num_dests)
+
+    covered = np.zeros(instance.num_origs, dtype=bool)
+    order = _open_covering(pairs, covered, np.flatnonzero(forced))
+    order += _lazy_greedy(pairs, covered, population, percent & ~forced, min_percent_open)
+    order += _lazy_greedy(pairs, covered, population, ~np.isin(np.arange(instance.num_dests), order), 
+                          max_locations-len(order))
+
+    solutions = {}
+    for k in range(max(min_locations, 1), max_locations+1):
+        open_mask = np.zeros(instance.num_dests, dtype=bool)
+        open_mask[order[:k]] = True
+        if swaps:
+            open_mask = _interchange(pairs, open_mask, forced, percent, min_percent_open)
+        solutions[k] = list(dest_ids[open_mask])
+    return solutions
+
+def _open_covering(pairs, covered, dests):
+    # open dests (in order) and mark the origins they cover
+    for j in dests:
+        covered[pairs.orig[pairs.dest_pairs(j)]] = True
+    return list(dests)
+
+def _lazy_greedy(pairs, covered, population, candidates, num_locations):
+    # open num_locations of the candidates, each time the one that covers
+    # the most uncovered population
+    def gain(j):
+        orig = pairs.orig[pairs.dest_pairs(j)]
+        return population[orig[~covered[orig]]].sum()
+    heap = [(-gain(j), j) for j in np.flatnonzero(candidates)]
+    heapq.heapify(heap)
+    order = []
+    while len(order)<num_locations and heap:
+        _, j = heapq.heappop(heap)
+        current = gain(j)
+        if heap and current < -heap[0][0]:
+            heapq.heappush(heap, (-current, j)) # stale: not the best any more
+            continue
+        order += _open_covering(pairs, covered, [j])
+    logging.info(f'lazy greedy: {len(order)} open, covered population {population[covered].sum()}')
+    return order
+
+class _Pairs:
+    # (origin, destination) pairs sorted by origin, then by coefficient,
+    # so the first open pair of an origin is its best assignment
+    def __init__(self, instance, coef, penalty=None):
+        coef = np.asarray(coef, dtype=float)
+        order = np.lexsort((coef, instance.pair_orig))
+        self.row = order # pair code in the instance
+        self.orig = instance.pair_orig[order]
+        self.dest = instance.pair_dest[order]
+        self.coef = coef[order]
+        self.num_pairs = len(order)
+        self.num_dests = instance.num_dests
+        counts = np.bincount(self.orig, minlength=instance.num_origs)
+        if (counts==0).any():
+            raise ValueError('infeasible: some origins have no (origin, destination) pairs')
+        self.starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        # cost of an origin with no open destination (default: worse than 
+        # any assignment)
+        self.penalty = penalty
+        if penalty is None:
+            self.penalty = 2*np.maximum.reduceat(self.coef, self.starts) + 1
+        # pairs of each destination
+        self.by_dest = np.argsort(self.dest, kind='stable')
+        self.dest_indptr = np.concatenate(([0], np.cumsum(np.bincount(self.dest, minlength=self.num_dests))))
+
+    def best(self, open_mask):
+        # per origin: (best cost, best destination (-1 if none), second best cost, best pair)
+        position = np.where(open_mask[self.dest], np.arange(self.num_pairs), self.num_pairs)
+        first = np.minimum.reduceat(position, self.starts)
+        has_first = first<self.num_pairs
+        position[first[has_first]] = self.num_pairs
+        second = np.minimum.reduceat(position, self.starts)
+        has_second = second<self.num_pairs
+        first_safe = np.minimum(first, self.num_pairs-1)
+        second_safe = np.minimum(second, self.num_pairs-1)
+        cost1 = np.where(has_first, self.coef[first_safe], self.penalty)
+        site1 = np.where(has_first, self.dest[first_safe], -1)
+        cost2 = np.where(has_second, self.coef[second_safe], self.penalty)
+        return cost1, site1, cost2, first
+
+    def gains(self, cost1):
+        # decrease in objective from opening each destination
+        improvement = np.maximum(cost1[self.orig]-self.coef, 0)
+        return np.bincount(self.dest, weights=improvement, minlength=self.num_dests)
+
+    def dest_pairs(self, dest):
+        return self.by_dest[self.dest_indptr[dest]:self.dest_indptr[dest+1]]
+
+    def assign(self, open_mask):
+        first = self.best(open_mask)[3]
+        if (first>=self.num_pairs).any():
+            return None
+        return self.row[first]
+
+def _greedy_add(pairs, open_mask, percent, min_percent_open, *, num_locations=None, target=None):
+    # open the destination with the largest gain until num_locations are
+    # open (or the objective meets target) and min_percent_open holds
+    while True:
+        cost1 = pairs.best(open_mask)[0]
+        need_percent = min_percent_open - (open_mask & percent).sum()
+        if num_locations is not None:
+            slots = num_locations - open_mask.sum()
+            if slots<=0:
+                break
+        elif need_percent<=0 and cost1.sum()<=target:
+            break
+        candidates = ~open_mask
+        if need_percent>0 and (num_locations is None or need_percent>=slots):
+            candidates &= percent
+        if not candidates.any():
+            raise ValueError('infeasible: heuristic ran out of destinations to open')
+        gains = pairs.gains(cost1)
+        gains[~candidates] = -1
+        open_mask[np.argmax(gains)] = True
+    logging.info(f'greedy: {open_mask.sum()} open, objective {pairs.best(open_mask)[0].sum()}')
+    return open_mask
+
+def _removable(open_mask, forced, percent, min_percent_open, adding_percent=False):
+    # destinations that can close without breaking the open/percent rules
+    removable = open_mask & ~forced
+    if (open_mask & percent).sum() - 1 + adding_percent < min_percent_open:
+        removable &= ~percent
+    return removable
+
+def _interchange(pairs, open_mask, forced, percent, min_percent_open):
+    # fast interchange: for each closed destination j, find the open
+    # destination r whose swap with j decreases the objective most
+    cost1, site1, cost2, _ = pairs.best(open_mask)
+    base_loss = _get_loss(pairs, cost1, site1, cost2)
+    num_swaps = 0
+    j = 0
+    since_improvement = 0
+    while since_improvement<pairs.num_dests:
+        since_improvement += 1
+        if not open_mask[j]:
+            k = pairs.dest_pairs(j)
+            orig, coef = pairs.orig[k], pairs.coef[k]
+            gain = np.maximum(cost1[orig]-coef, 0).sum()
+            # origins of r that can move to j instead of their second best
+            adjust = ((np.minimum(coef, cost2[orig]) - np.minimum(coef, cost1[orig]))
+                      - (cost2[orig]-cost1[orig]))
+            has_site = site1[orig]>=0
+            loss = base_loss + np.bincount(site1[orig][has_site], weights=adjust[has_site],
+                                minlength=pairs.num_dests)
+            removable = _removable(open_mask, forced, percent, min_percent_open, percent[j])
+            if removable.any():
+                delta = np.where(removable, loss - gain, np.inf)
+                r = np.argmin(delta)
+                if delta[r] < -1e-9*cost1.sum():
+                    open_mask[r] = False
+                    open_mask[j] = True
+                    cost1, site1, cost2, _ = pairs.best(open_mask)
+                    base_loss = _get_loss(pairs, cost1, site1, cost2)
+                    num_swaps += 1
+                    since_improvement = 0
+        j = (j+1) % pairs.num_dests
+    logging.info(f'interchange: {num_swaps} swaps, objective {cost1.sum()}')
+    return open_mask
+
+def _drop(pairs, open_mask, forced, percent, min_percent_open, target):
+    # close the destination whose removal costs least and re-optimize the
+    # rest with interchange, as long as the objective still meets target
+    while True:
+        cost1, site1, cost2, _ = pairs.best(open_mask)
+        loss = _get_loss(pairs, cost1, site1, cost2)
+        removable = _removable(open_mask, forced, percent, min_percent_open)
+        if not removable.any():
+            break
+        trial = open_mask.copy()
+        trial[np.argmin(np.where(removable, loss, np.inf))] = False
+        if pairs.best(trial)[0].sum()>target:
+            trial = _interchange(pairs, trial, forced, percent, min_percent_open)
+            if pairs.best(trial)[0].sum()>target:
+                break
+        open_mask = trial
+    logging.info(f'drop: {open_mask.sum()} open, objective {pairs.best(open_mask)[0].sum()}')
+    return open_mask
+
+def _get_loss(pairs, cost1, site1, cost2):
+    # objective increase from closing each open destination
+    assigned = site1>=0
+    return np.bincount(site1[assigned], weights=(cost2-cost1)[assigned],
+                       minlength=pairs.num_dests)
@@ -0,0 +1,100 @@
+# compact, integer-coded instance of the facility location model
+
+import numpy as np
+import pandas as pd
+
+class Instance:
+    """Origins, destinations and (origin, destination) pairs coded as
+    integers: origin i is row i of orig_df, destination j is row j of
+    dest_df and pair k is row k of dist_df. Population is stored once per
+    origin and pairs are indexed both ways with CSR offsets. IDs are only
+    decoded when an assignment dataframe is produced.
+
+    Keyword arguments:
+    orig_df -- dataframe (id, population)
+    dest_df -- dataframe (id, [open], [preference], [capacity])
+    dist_df -- dataframe (origin, destination, distance, [population])
+    """
+    def __init__(self, orig_df, dest_df, dist_df):
+        self.orig_ids = orig_df['id'].to_numpy()
+        self.dest_ids = dest_df['id'].to_numpy()
+        self.population = orig_df['population'].to_numpy() # per origin
+        self.capacity = np.full(len(self.dest_ids), np.nan) # per destination (nan: none)
+        if 'capacity' in set(dest_df.columns.values):
+            self.capacity = dest_df['capacity'].to_numpy(dtype=float)
+
+        self.pair_orig = _get_codes(dist_df['origin'], self.orig_ids)
+        self.pair_dest = _get_codes(dist_df['destination'], self.dest_ids)
+        if (self.pair_orig<0).any() or (self.pair_dest<0).any():
+            raise ValueError('distance pairs with an unknown origin or destination')
+        self.distance = _get_compact_distance(dist_df['distance'].to_numpy(dtype=float))
+
+        # pairs of origin i: orig_order[orig_indptr[i]:orig_indptr[i+1]] (same for destinations)
+        self.orig_indptr, self.orig_order = _get_csr(self.pair_orig, self.num_origs)
+        self.dest_indptr, self.dest_order = _get_csr(self.pair_dest, self.num_dests)
+
+    @property
+    def num_origs(self):
+        return len(self.orig_ids)
+
+    @property
+    def num_dests(self):
+        return len(self.dest_ids)
+
+    @property
+    def num_pairs(self):
+        return len(self.pair_orig)
+
+    def orig_pairs(self, i):
+        return self.orig_order[self.orig_indptr[i]:self.orig_indptr[i+1]]
+
+    def dest_pairs(self, j):
+        return self.dest_order[self.dest_indptr[j]:self.dest_indptr[j+1]]
+
+    def get_total_population(self):
+        return self.population.sum()
+
+    def get_pair_population(self):
+        return self.population[self.pair_orig].astype(float)
+
+    def get_pair_distance(self):
+        return self.distance.astype(float)
+
+    def get_kp_coefficients(self, kappa):
+        # linear kolm-pollak coefficients (weighted distances if kappa==0)
+        if kappa==0:
+            return self.get_pair_population()*self.get_pair_distance()
+        return self.get_pair_population()*np.exp(-kappa*self.get_pair_distance())
+
+    def get_dest_codes(self, ids):
+        # codes of destination ids (ids must be destinations of the instance)
+        return _get_codes(pd.Series(list(ids)), self.dest_ids)
+
+    def get_assignment_df(self, pairs):
+        """return assignment dataframe (origin, destination, distance,
+        population) of the given pairs, in pair order"""
+        pairs = np.sort(np.asarray(pairs, dtype=np.int64))
+        orig = self.pair_orig[pairs]
+        return pd.DataFrame({'origin':self.orig_ids[orig],
+                             'destination':self.dest_ids[self.pair_dest[pairs]],
+                             'distance':self.get_pair_distance()[pairs],
+                             'population':self.population[orig]})
+
+def _get_codes(values, ids):
+    # position of each value in ids (-1 if missing)
+    return pd.Index(ids).get_indexer(values).astype(np.int32)
+
+def _get_csr(row_code, num_rows):
+    # (indptr, order) so that order[indptr[r]:indptr[r+1]] are the entries in row r
+    order = np.argsort(row_code, kind='stable')
+    indptr = np.zeros(num_rows+1, dtype=np.int64)
+    np.cumsum(np.bincount(row_code, minlength=num_rows), out=indptr[1:])
+    return indptr, order
+
+def _get_compact_distance(distance):
+    # float32 when it stores every distance exactly (e.g. whole minutes
+    # or meters), so that results don't depend on the representation
+    compact = distance.astype(np.float32)
+    if np.array_equal(compact, distance, equal_nan=True):
+        return compact
+    return distance
@@ -0,0 +1,114 @@
+# lagrangian relaxation bounds for the facility location model
+
+import numpy as np
+import logging
+import efl.heuristic as heuristic
+
+def solve(instance, coef, *,
+          num_locations, open_destinations, percent_destinations, min_percent_open,
+          max_iterations=1000, tolerance=1e-4, improve=True):
+    """Lagrangian relaxation of the must_assign constraints of the
+    minimize='ede' model, optimized by subgradient steps.
+    Every iteration gives a lower bound on the objective (sum of kp
+    coefficients) and an open set whose best assignment is an upper bound.
+    Capacities are not supported.
+
+    Returns (lower bound, upper bound, open destination ids of the upper
+    bound, assignment dataframe of the upper bound, number of iterations)
+
+    Keyword arguments:
+    instance -- efl.instance.Instance
+    coef -- numpy array of objective coefficients (one per pair)
+    num_locations -- number of locations to open
+    open_destinations -- ids of destinations that must open
+    percent_destinations -- ids of 'percent' destinations
+    min_percent_open -- number of percent destinations that must open
+    max_iterations -- number of subgradient steps; with 0 the lower bound
+    is every origin at its best destination and the upper bound is the
+    heuristic's (requires improve) (default: 1000)
+    tolerance -- stop when (upper - lower)/upper is below tolerance (default: 1e-4)
+    improve -- start from the greedy + interchange heuristic and improve
+    the best lagrangian open set with interchange (default: True)
+    """
+    if max_iterations<1 and not improve:
+        raise ValueError('max_iterations=0 requires improve=True (no open set for the upper bound)')
+    pairs = heuristic._Pairs(instance, coef)
+    dest_ids = instance.dest_ids
+    forced = np.isin(dest_ids, open_destinations)
+    percent = np.isin(dest_ids, percent_destinations)
+    num_origs = instance.num_origs
+
+    best_open = None
+    upper = np.inf
+    if improve:
+        best_open = heuristic._greedy_add(pairs, forced.copy(), percent, min_percent_open,
+                                          num_locations=num_locations)
+        best_open = heuristic._interchange(pairs, best_open, forced, percent, min_percent_open)
+        upper = _get_upper(pairs, best_open)
+
+    # start from the bound "every origin at its best destination"
+    multipliers = pairs.coef[pairs.starts].copy()
+    lower = -np.inf
+    step_scale = 2.0
+    since_improvement = 0
+    iteration = 0
+    for iteration in range(1, max_iterations+1):
+        reduced = np.minimum(pairs.coef - multipliers[pairs.orig], 0)
+        rho = np.bincount(pairs.dest, weights=reduced, minlength=pairs.num_dests)
+        open_mask = _select(rho, forced, percent, min_percent_open, num_locations)
+        bound = multipliers.sum() + rho[open_mask].sum()
+        if bound>lower:
+            lower = bound
+            since_improvement = 0
+        else:
+            since_improvement += 1
+            if since_improvement>=20:
+                step_scale /= 2
+                since_improvement = 0
+        candidate = _get_upper(pairs, open_mask)
+        if candidate<upper:
+            upper = candidate
+            best_open = open_mask
+        if upper<np.inf and upper-lower<=tolerance*abs(upper):
+            break
+
+        # subgradient: 1 - number of destinations each origin is assigned to
+        assigned = open_mask[pairs.dest] & (pairs.coef<multipliers[pairs.orig])
+        subgradient = 1 - np.bincount(pairs.orig, weights=assigned, minlength=num_origs)
+        norm = (subgradient**2).sum()
+        if norm==0 or step_scale<1e-8: # relaxed solution is feasible (optimal) or steps vanished
+            break
+        target = upper if upper<np.inf else 1.05*abs(bound)
+        multipliers = multipliers + step_scale*(target-bound)/norm*subgradient
+    if iteration==0: # no steps: the bound of the starting multipliers
+        lower = multipliers.sum()
+    logging.info(f'lagrangian: {iteration} iterations, bounds [{lower}, {upper}]')
+
+    if best_open is None:
+        raise ValueError('infeasible: no lagrangian open set assigns every origin')
+    if improve:
+        best_open = heuristic._interchange(pairs, best_open.copy(), forced, percent, min_percent_open)
+        upper = min(upper, _get_upper(pairs, best_open))
+    assignment_df = instance.get_assignment_df(pairs.assign(best_open))
+    return lower, upper, list(dest_ids[best_open]), assignment_df, iteration
+
+def _select(rho, forced, percent, min_percent_open, num_locations):
+    # open set minimizing sum of rho: forced destinations, the most negative
+    # percent destinations required, then the most negative of the rest
+    open_mask = forced.copy()
+    need_percent = min_percent_open - (forced & percent).sum()
+    if need_percent>0:
+        candidates = np.flatnonzero(percent & ~open_mask)
+        open_mask[candidates[np.argsort(rho[candidates], kind='stable')[:need_percent]]] = True
+    slots = num_locations - open_mask.sum()
+    if slots>0:
+        candidates = np.flatnonzero(~open_mask)
+        open_mask[candidates[np.argsort(rho[candidates], kind='stable')[:slots]]] = True
+    return open_mask
+
+def _get_upper(pairs, open_mask):
+    # objective of the best assignment to open_mask (inf if an origin is left out)
+    cost1, site1, _, _ = pairs.best(open_mask)
+    if (site1<0).any():
+        return np.inf
+    return cost1.sum()
@@ -0,0 +1,319 @@
+# equitable facility location model assembled from the numpy/CSR arrays of
+# an instance and solved without pyomo (a free MPS file read by the solver)
+
+from pyomo.core.expr import LinearExpression
+from pyomo.core.expr.numeric_expr import MonomialTermExpression
+from dataclasses import dataclass
+import numpy as np
+import tempfile
+import logging
+import time
+import os
+
+@dataclass
+class MatrixModel:
+    """Facility location model as arrays (minimized). Columns are x[j]
+    (destination j, binary) then y[k] (pair k); rows are CSR arrays
+    (indptr, indices, data) with a sense ('E', 'L' or 'G') and a
+    right-hand side each, and blocks maps each constraint name of the
+    'rules' model to its slice of rows. values holds the current column
+    values (a warm start, then the solution; None if unset)."""
+    num_dests: int
+    obj: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    data: np.ndarray
+    sense: np.ndarray
+    rhs: np.ndarray
+    blocks: dict
+    continuous_assignment: bool = False
+    values: np.ndarray = None
+
+    @property
+    def num_cols(self):
+        return len(self.obj)
+
+    @property
+    def num_rows(self):
+        return len(self.rhs)
+
+    @property
+    def x_values(self):
+        return self.values[:self.num_dests]
+
+    @property
+    def y_values(self):
+        return self.values[self.num_dests:]
+
+def build_model(instance, coef, *,
+                minimize, num_locations, target,
+                open_destinations, percent_destinations, min_percent_open,
+                continuous_assignment=False):
+    """Build the model of the 'rules' backend of model.optimize as a
+    MatrixModel: every block of rows is assembled in bulk from the
+    instance's CSR arrays (orig_indptr/orig_order for must_assign,
+    pair_dest for assign_to_open, dest_indptr/dest_order for capacity),
+    with no per-row python objects.
+
+    Keyword arguments:
+    instance -- efl.instance.Instance
+    coef -- numpy array of objective coefficients (one per pair)
+    minimize -- 'ede' or 'locations'
+    num_locations -- number of locations to open (if minimize='ede')
+    target -- bound on the sum of coefficients (if minimize='locations')
+    open_destinations -- ids of destinations that must open
+    percent_destinations -- ids of 'percent' destinations
+    min_percent_open -- number of percent destinations that must open
+    continuous_assignment -- y continuous in [0,1] instead of binary
+    """
+    if (np.diff(instance.orig_indptr)==0).any():
+        raise ValueError('infeasible: some origins have no (origin, destination) pairs')
+
+    num_dests, num_pairs = instance.num_dests, instance.num_pairs
+    x = np.arange(num_dests)
+    y = num_dests + np.arange(num_pairs)
+    coef = np.asarray(coef, dtype=float)
+    obj = np.zeros(num_dests + num_pairs)
+    rows = [] # (name, indptr, indices, data, sense, rhs)
+
+    if minimize=='ede':
+        # minimize the Kolm-Pollak EDE
+        logging.info('adding objective')
+        obj[y] = coef
+
+        # set the number of locations to open
+        logging.info('adding num locations constraint')
+        rows.append(('num_locations', [0, num_dests], x, np.ones(num_dests), 'E', num_locations))
+
+    else: # minimize=='locations'
+        # minimize the number of locations to open
+        logging.info('building objective')
+        obj[x] = 1
+
+        # meet target level of access
+        logging.info('adding target access constraint')
+        rows.append(('target_access', [0, num_pairs], y, coef, 'L', target))
+
+    # don't assign an origin to a location unless it is open: y[k] - x[pair_dest[k]] <= 0
+    logging.info('adding assign to open constraint')
+    rows.append(('assign_to_open', 2*np.arange(num_pairs + 1),
+                 np.column_stack([y, instance.pair_dest]).ravel(),
+                 np.tile([1.0, -1.0], num_pairs), 'L', 0))
+
+    # must assign each origin to a destination
+    logging.info('adding must assign constraint')
+    rows.append(('must_assign', instance.orig_indptr, num_dests + instance.orig_order,
+                 np.ones(num_pairs), 'E', 1))
+
+    # set open destinations to open
+    if len(open_destinations)>0:
+        logging.info('adding set open constraint')
+        open_code = instance.get_dest_codes(open_destinations)
+        rows.append(('set_open', np.arange(len(open_code) + 1), open_code,
+                     np.ones(len(open_code)), 'E', 1))
+
+    # open minimum number of percent_open destinations
+    if len(percent_destinations)>0:
+        logging.info('adding min percent open constraint')
+        percent_code = instance.get_dest_codes(percent_destinations)
+        rows.append(('min_percent_open', [0, len(percent_code)], percent_code,
+                     np.ones(len(percent_code)), 'G', min_percent_open))
+
+    # restrict capacity of each destination as appropriate
+    capped = np.flatnonzero(~np.isnan(instance.capacity))
+    if len(capped)>0:
+        logging.info('adding capacity constraint')
+        counts = np.diff(instance.dest_indptr)[capped]
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        # positions of the capped destinations' segments of dest_order
+        position = np.arange(indptr[-1]) + np.repeat(instance.dest_indptr[capped] - indptr[:-1], counts)
+        pairs = instance.dest_order[position]
+        rows.append(('capacity', indptr, num_dests + pairs,
+                     instance.get_pair_population()[pairs], 'L', instance.capacity[capped]))
+
+    model = _stack_rows(rows, obj, num_dests)
+    model.continuous_assignment = continuous_assignment
+    logging.info('model complete')
+
+    return model
+
+def _stack_rows(rows, obj, num_dests):
+    # one MatrixModel from blocks of (name, indptr, indices, data, sense, rhs)
+    blocks, indptr, indices, data, sense, rhs = {}, [np.zeros(1, dtype=np.int64)], [], [], [], []
+    start = 0
+    for name, block_indptr, block_indices, block_data, block_sense, block_rhs in rows:
+        block_indptr = np.asarray(block_indptr, dtype=np.int64)
+        num_rows = len(block_indptr) - 1
+        blocks[name] = slice(start, start + num_rows)
+        indptr.append(indptr[-1][-1] + block_indptr[1:])
+        indices.append(np.asarray(block_indices, dtype=np.int64))
+        data.append(np.asarray(block_data, dtype=float))
+        sense.append(np.full(num_rows, block_sense))
+        rhs.append(np.broadcast_to(np.asarray(block_rhs, dtype=float), num_rows))
+        start += num_rows
+    return MatrixModel(num_dests, obj, np.concatenate(indptr), np.concatenate(indices),
+                       np.concatenate(data), np.concatenate(sense), np.concatenate(rhs), blocks)
+
+def set_objective(model, coef):
+    """replace the objective coefficients of the y (one per pair)"""
+    model.obj[model.num_dests:] = coef
+
+def set_row(model, name, coef=None, rhs=None):
+    """replace the coefficients (in column order) and/or right-hand side of
+    a single-row constraint, e.g. num_locations or target_access"""
+    row = model.blocks[name].start
+    if coef is not None:
+        model.data[model.indptr[row]:model.indptr[row+1]] = coef
+    if rhs is not None:
+        model.rhs[row] = rhs
+
+def get_model_stats(model):
+    """numbers of variables by type, rows and nonzeros of a MatrixModel"""
+    num_pairs = model.num_cols - model.num_dests
+    return {'num_binaries':model.num_dests + (0 if model.continuous_assignment else num_pairs),
+            'num_integers':0,
+            'num_continuous':num_pairs if model.continuous_assignment else 0,
+            'num_rows':model.num_rows, 'num_nonzeros':len(model.data)}
+
+def write_mps(model, path):
+    """Write model as a free MPS file: the columns are named x{j} and
+    y{k}, the rows c{r} and the objective obj. The entries are formatted
+    as whole arrays (each distinct value once), not row by row."""
+    num_cols, num_rows = model.num_cols, model.num_rows
+    col_names = _names(['x', 'y'], [model.num_dests, num_cols - model.num_dests])
+    row_names = _names(['obj', 'c'], [1, num_rows])
+    # objective (row -1, listed even if 0 so every column is declared) then
+    # the rows' entries, in column order
+    row = np.concatenate([np.full(num_cols, -1),
+                          np.repeat(np.arange(num_rows), np.diff(model.indptr))])
+    col = np.concatenate([np.arange(num_cols), model.indices])
+    value = np.concatenate([model.obj, model.data])
+    order = np.lexsort((row, col))
+    row, col, value = row[order], col[order], value[order]
+    entries = ' ' + col_names[col] + ' ' + row_names[row + 1] + ' ' + _format(value)
+    # binary x, then y (binary or continuous in [0,1])
+    num_integer = num_cols if not model.continuous_assignment else model.num_dests
+    split = np.searchsorted(col, num_integer)
+
+    with open(path, 'w') as f:
+        f.write('NAME efl\nROWS\n N obj\n')
+        f.write('\n'.join(' ' + model.sense.astype(object) + ' ' + row_names[1:]) + '\n')
+        f.write("COLUMNS\n MARKER 'MARKER' 'INTORG'\n")
+        f.write('\n'.join(entries[:split]) + '\n')
+        f.write(" MARKER 'MARKER' 'INTEND'\n")
+        if split<len(entries):
+            f.write('\n'.join(entries[split:]) + '\n')
+        f.write('RHS\n')
+        nonzero = np.flatnonzero(model.rhs)
+        if len(nonzero)>0:
+            f.write('\n'.join(' rhs ' + row_names[nonzero + 1] + ' ' + _format(model.rhs[nonzero])) + '\n')
+        f.write('BOUNDS\n')
+        f.write('\n'.join(' BV bnd ' + col_names[:num_integer]) + '\n')
+        if num_integer<num_cols:
+            f.write('\n'.join(' UP bnd ' + col_names[num_integer:] + ' 1') + '\n')
+        f.write('ENDATA\n')
+
+def _names(prefixes, counts):
+    # object array of prefix + index for each block of names ('obj' once)
+    return np.concatenate([np.array([prefix], dtype=object) if prefix=='obj' else
+                           np.char.add(prefix, np.arange(count).astype(str)).astype(object)
+                           for prefix, count in zip(prefixes, counts)])
+
+def _format(values):
+    # object array of exact decimal strings, formatting each distinct value once
+    unique, inverse = np.unique(values, return_inverse=True)
+    return np.array([repr(v) for v in unique.tolist()], dtype=object)[inverse.ravel()]
+
+def solve(model, solver_name, *, options, tee, warmstart, timings=None):
+    """Solve model with the solver's python API (pyscipopt for scip,
+    gurobipy for gurobi) from an MPS file, set model.values to the
+    solution and return (lower bound, upper bound, solver time).
+
+    options -- solver parameters by name (e.g. 'limits/time')
+    warmstart -- start from model.values (scip takes the values of the
+    integer columns as a partial solution)
+    timings -- dict to record the time to write the MPS file in ('write_model')
+    """
+    base_name = solver_name.split('_')[0]
+    if base_name not in ['scip', 'gurobi']:
+        raise ValueError(f"the matrix backend solves with scip or gurobi, not '{solver_name}'")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'model.mps')
+        start_time = time.time()
+        write_mps(model, path)
+        if timings is not None:
+            timings['write_model'] = time.time() - start_time
+        start = model.values if warmstart else None
+        if base_name=='scip':
+            return _solve_scip(model, path, options, tee=tee, start=start)
+        return _solve_gurobi(model, path, options, tee=tee, start=start)
+
+def _solve_scip(model, path, options, *, tee, start):
+    try:
+        import pyscipopt
+    except ImportError:
+        raise ImportError("the matrix backend needs pyscipopt to solve with scip (conda install pyscipopt)")
+    scip = pyscipopt.Model()
+    if not tee:
+        scip.hideOutput()
+    scip.readProblem(path)
+    for name, value in options.items():
+        scip.setParam(name, value)
+    variables = scip.getVars()
+    columns = _get_columns([v.name for v in variables], model.num_dests)
+    if start is not None:
+        solution = scip.createPartialSol()
+        for v, value in zip(variables, start[columns].tolist()):
+            if v.vtype()!='CONTINUOUS':
+                scip.setSolVal(solution, v, value)
+        scip.addSol(solution)
+    scip.optimize()
+    status = scip.getStatus()
+    if status not in ['optimal', 'gaplimit'] or scip.getNSols()==0:
+        raise ValueError(f'Solver terminated with no solution: {status}')
+    solution = scip.getBestSol()
+    model.values = np.empty(model.num_cols)
+    model.values[columns] = [scip.getSolVal(solution, v) for v in variables]
+    return scip.getDualbound(), scip.getPrimalbound(), scip.getSolvingTime()
+
+def _solve_gurobi(model, path, options, *, tee, start):
+    try:
+        import gurobipy
+    except ImportError:
+        raise ImportError("the matrix backend needs gurobipy to solve with gurobi")
+    grb = gurobipy.read(path)
+    grb.setParam('OutputFlag', int(bool(tee)))
+    for name, value in options.items():
+        grb.setParam(name, value)
+    variables = grb.getVars()
+    columns = _get_columns(grb.getAttr('VarName', variables), model.num_dests)
+    if start is not None:
+        grb.setAttr('Start', variables, start[columns].tolist())
+    grb.optimize()
+    if grb.Status!=gurobipy.GRB.OPTIMAL:
+        raise ValueError(f'Solver terminated with no solution: status {grb.Status}')
+    model.values = np.empty(model.num_cols)
+    model.values[columns] = grb.getAttr('X', variables)
+    return grb.ObjBound, grb.ObjVal, grb.Runtime
+
+def _get_columns(names, num_dests):
+    # column of each solver variable, from its name (x{j} or y{k})
+    return np.array([int(name[1:]) + (num_dests if name[0]=='y' else 0) for name in names], dtype=np.int64)
+
+def get_assignment_df(model, instance):
+    """return assignment dataframe (origin, destination, distance, population)
+    read from the y values of a solved MatrixModel"""
+    return instance.get_assignment_df(np.flatnonzero(model.y_values>0.9)) # handles floating point errors
+
+def get_values(variables):
+    # values of an indexed variable as an array in index order (None is 0)
+    return np.fromiter((v.value or 0 for v in variables.values()), dtype=float, count=len(variables))
+
+def _linear(coefs, variables):
+    # sum of coef*var built directly (no operator overloading)
+    return LinearExpression([MonomialTermExpression((c, v))
+                             for c, v in zip(np.asarray(coefs, dtype=float).tolist(), variables)])
+
+def _sum(variables):
+    # sum of var built directly (no operator overloading)
+    return LinearExpression(list(variables))
@@ -6,8 +6,17 @@ import logging
 import math
 import numpy as np
 import efl.utils as utils
+import efl.matrix_model as matrix_model
+import efl.radius_model as radius_model
+import efl.heuristic as heuristic
+import efl.lagrangian as lagrangian
+import efl.presolve as model_presolve
+import efl.profiling as profiling
+from efl.instance import Instance
 import time
 from collections import defaultdict
+from dataclasses import dataclass, field
+from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
 
 class Results:
     def __init__(self, assignment_df, parameters_dict, solver_mip_gap, solver_wall_time):
@@ -15,6 +24,8 @@ class Results:
         self.parameters_dict = parameters_dict # input parameters
         self.solver_mip_gap = solver_mip_gap
         self.solver_wall_time = solver_wall_time
+        self.timings = {} # seconds per phase, e.g. validation, build_model, solve
+        self.model_stats = {} # e.g. num_binaries, num_rows, num_nonzeros
 
     def ede_out(self, aversion=None):
         if not aversion:
@@ -40,6 +51,12 @@ class Results:
     def aversion_out(self):
         kappa_in = self.parameters_dict['aversion'] * self.parameters_dict['scaling_factor']
         return kappa_in / self.scaling_factor_out()
+
+    # phase timings (time_<phase>) and model statistics
+    def stats_out(self):
+        stats = {f'time_{phase}':seconds for phase, seconds in self.timings.items()}
+        stats.update(self.model_stats)
+        return stats
     
 
 def _apply_radius(orig_df, dest_df, dist_df, radius):
@@ -97,36 +114,31 @@ def _get_alpha_approximation(dist_df, *, open_destinations=[], percent_destinati
 def _get_kp_coefficients(dist_df, kappa):
     '''return dictionary: ((orig, dest): coeff)
     '''
-    df = dist_df
-    if kappa==0: # coefficients are weighted distances
-        df['coef'] = df['population']*df['distance']
-        # df = (
-        #     dist_df
-        #     .assign( 
-        #         coef = lambda x: x['population']*x['distance']
-        #     )
-        # )     
-    else: # coefficients linear kolm-pollak coefficients 
-        df['coef'] = df['population']*np.exp(-kappa*df['distance'])
-        # df = (
-        #     dist_df
-        #     .assign( 
-        #         coef = lambda x: x['population']*np.exp(-kappa*x['distance'])
-        #     )
-        # )
-
-    triple = list(zip(df['origin'], df['destination'], df['coef']))
+    coef = _get_kp_coefficient_array(dist_df, kappa)
+    triple = list(zip(dist_df['origin'], dist_df['destination'], coef))
     coef_dict = {(x, y):z for x, y, z in triple}
 
     return coef_dict
 
+def _get_kp_coefficient_array(dist_df, kappa):
+    '''return numpy array of coefficients (one per row of dist_df)
+    '''
+    population = dist_df['population'].to_numpy(dtype=float)
+    distance = dist_df['distance'].to_numpy(dtype=float)
+    if kappa==0: # coefficients are weighted distances
+        return population*distance
+    # coefficients linear kolm-pollak coefficients 
+    return population*np.exp(-kappa*distance)
+
     
 def optimize(orig_df, dest_df, dist_df, 
                 minimize, num_locations, target_ede, *, 
                 aversion=-1, scaling_factor=None, 
                 min_percent=0, radius=None,
                 solver='scip', time_limit=3600, mip_gap=None, 
-                tee=None):
+                tee=None, backend='rules', initial_open=None, threads=None,
+                continuous_assignment=None, formulation='pairs', presolve=True,
+                aggregate=True, aggregate_tolerance=0):
     """Build pyomo facility location model that minimizes the Kolm-Pollak EDE
 
     Keyword arguments:
@@ -141,29 +153,390 @@ def optimize(orig_df, dest_df, dist_df,
     radius -- remove distances exceeding radius (default: include all distances)
     scaling_factor -- set your own value for alpha 
     (default: use "force" OR "percent" OR "all" destinations in that order)
-    solver -- 'scip' ('gurobi' to be added later)
+    solver -- 'scip', 'gurobi', 'heuristic' (greedy + interchange, no 
+    capacities, solver_mip_gap is None) or 'lagrangian' (minimize='ede', no 
+    capacities, solver_mip_gap from lagrangian bounds, see lagrangian_bounds)
     time_limit -- solver times out and returns best solution so far (seconds) (default: 3600)
     mip_gap -- solver stops when within this percent of optimal (default: 0)
     tee -- print solver output to screen (default: False)
+    backend -- 'rules' (pyomo rule callbacks) or 'matrix' (the same model 
+    assembled in bulk from numpy/CSR arrays, written as an MPS file and 
+    solved through pyscipopt or gurobipy instead of pyomo; faster to build 
+    and write on large instances) (default: 'rules')
+    initial_open -- destination ids to warm start the solver from, e.g. the 
+    destinations of a heuristic solution; scip takes the start through 
+    scip_direct (pyscipopt), otherwise it is dropped with a warning (see 
+    _solve) (default: None)
+    threads -- max number of solver threads (default: solver default)
+    continuous_assignment -- declare y continuous in [0,1] instead of binary; 
+    without capacities some optimal y is integral once x is, so only the 
+    destinations are binary (default: True if no destination has a capacity)
+    formulation -- 'pairs' (one assignment variable per origin, destination 
+    pair) or 'radius' (per origin, one row and variable per distinct 
+    distance; smaller and tighter, no capacities, ignores backend and 
+    continuous_assignment) (default: 'pairs')
+    presolve -- before the model is built, remove duplicate and dominated 
+    destinations (see presolve.reduce_destinations) and (minimize='ede', no 
+    capacities) the pairs no optimal assignment can use (default: True)
+    aggregate -- (no capacities) solve for one origin per group of origins 
+    with the same distance profile, with their total population, and 
+    assign each origin to its group's destination (see 
+    presolve.aggregate_origins) (default: True)
+    aggregate_tolerance -- group origins whose distances to each destination 
+    are in the same multiple of this; the EDE of the results is at most 
+    parameters_dict['aggregate_ede_bound'] (< 2*aggregate_tolerance) above 
+    the optimum. Requires minimize='ede': merged distances are averages, so
+    target_ede could not be guaranteed (default: 0, identical profiles only)
+    """
+    if aggregate and aggregate_tolerance>0 and minimize!='ede':
+        raise ValueError("aggregate_tolerance>0 requires minimize='ede' (merged distances would "
+                         "change the EDE that target_ede bounds)")
+
+    if solver=='heuristic':
+        return _optimize_heuristic(orig_df, dest_df, dist_df, 
+                            minimize, num_locations, target_ede, 
+                            aversion=aversion, scaling_factor=scaling_factor, 
+                            min_percent=min_percent, radius=radius)
+    if solver=='lagrangian':
+        if minimize!='ede':
+            raise ValueError("the lagrangian solver requires minimize='ede'")
+        return lagrangian_bounds(orig_df, dest_df, dist_df, num_locations, 
+                            aversion=aversion, scaling_factor=scaling_factor, 
+                            min_percent=min_percent, radius=radius).results
+
+    model, md = _build_model(orig_df, dest_df, dist_df, 
+                            minimize, num_locations, target_ede, 
+                            aversion=aversion, scaling_factor=scaling_factor, 
+                            min_percent=min_percent, radius=radius, backend=backend,
+                            continuous_assignment=continuous_assignment, formulation=formulation,
+                            presolve=presolve, presolve_locations=num_locations if presolve else None,
+                            aggregate_tolerance=aggregate_tolerance if aggregate else None)
+    if initial_open is not None:
+        _set_initial_values(model, md.instance, initial_open)
+    model_stats = dict(md.stats, **_get_model_stats(model, _count_nonzeros(model, md, minimize)))
+
+    # solve
+    timings = md.timings
+    mip_gap_actual, wall_time = _solve(model, solver, time_limit=time_limit, 
+                                       mip_gap=mip_gap, tee=tee, 
+                                       warmstart=initial_open is not None, threads=threads,
+                                       timings=timings)
+
+    # pull together results
+    parameters = {'minimize':minimize, 'num_locations':num_locations, 
+                  'target_ede':target_ede,'aversion':aversion,
+                  'scaling_factor':md.alpha,'min_percent':min_percent, 
+                  'radius':radius,
+                  'solver':solver,'time_limit':time_limit, 
+                  'mip_gap':mip_gap, 'backend':backend, 'formulation':formulation,
+                  'aggregate':aggregate, 'aggregate_tolerance':aggregate_tolerance,
+                  'aggregate_ede_bound':2*md.aggregation_error}
+    profiling.begin('extract')
+    start_time = time.time()
+    assignment_df = _get_model_assignment_df(model, md.instance, backend)
+    if md.origin_map is not None:
+        assignment_df = model_presolve.expand_origins(assignment_df, md.origin_map, orig_df, dist_df)
+    timings['extract'] = time.time() - start_time
+    profiling.end('extract')
+
+    result = Results(assignment_df, parameters, mip_gap_actual, wall_time)
+    result.timings = timings
+    result.model_stats = model_stats
+
+    return result
+
+def _optimize_heuristic(orig_df, dest_df, dist_df, minimize, num_locations, target_ede, *, 
+                        aversion, scaling_factor, min_percent, radius):
+    # solve with the greedy + interchange heuristic instead of a MIP solver
+    md = _get_model_data(orig_df, dest_df, dist_df, minimize, num_locations, target_ede, 
+                         aversion=aversion, scaling_factor=scaling_factor, 
+                         min_percent=min_percent, radius=radius)
+    if not np.isnan(md.instance.capacity).all():
+        raise ValueError('the heuristic solver does not support capacities')
+
+    logging.info('starting heuristic')
+    start_time = time.time()
+    open_ids, assignment_df = heuristic.solve(md.instance, 
+                    md.instance.get_kp_coefficients(md.kappa), minimize=minimize, 
+                    num_locations=num_locations, target=md.target,
+                    open_destinations=md.open_destinations, 
+                    percent_destinations=md.percent_destinations, min_percent_open=md.min_percent_open)
+    wall_time = time.time() - start_time
+
+    parameters = {'minimize':minimize, 'num_locations':num_locations, 
+                  'target_ede':target_ede,'aversion':aversion,
+                  'scaling_factor':md.alpha,'min_percent':min_percent, 
+                  'radius':radius,
+                  'solver':'heuristic','time_limit':None, 
+                  'mip_gap':None, 'backend':None}
+
+    result = Results(assignment_df, parameters, None, wall_time)
+    result.timings = dict(md.timings, solve=wall_time)
+    result.model_stats = md.stats
+    return result
+
+@dataclass
+class LagrangianBounds:
+    lower_bound: float # certified lower bound on the model ede
+    upper_bound: float # model ede of results (a feasible solution)
+    iterations: int
+    results: Results # best solution found
+
+    def gap(self):
+        # relative gap on the objective, comparable to solver_mip_gap
+        return self.results.solver_mip_gap
+
+def lagrangian_bounds(orig_df, dest_df, dist_df, num_locations, *,
+                      aversion=-1, scaling_factor=None, min_percent=0, radius=None,
+                      max_iterations=1000, tolerance=1e-4, improve=True):
+    """Bound the optimal EDE of optimize(minimize='ede') without a MIP
+    solver, by lagrangian relaxation of the must assign constraints.
+    Bounds are on the EDE the model minimizes, i.e. computed with the
+    model's scaling factor (results.ede_out() recomputes the scaling factor
+    from the assignment). Capacities are not supported.
+    Returns LagrangianBounds; its results hold the upper bound solution,
+    with solver_mip_gap the relative gap between the objective bounds.
+
+    Keyword arguments:
+    max_iterations -- number of subgradient steps (0: the trivial lower
+    bound and the heuristic upper bound, see lagrangian.solve) (default: 1000)
+    tolerance -- stop when the relative gap is below tolerance (default: 1e-4)
+    improve -- improve the upper bound with greedy + interchange (default: True)
+    """
+    md = _get_model_data(orig_df, dest_df, dist_df, 'ede', num_locations, None,
+                         aversion=aversion, scaling_factor=scaling_factor,
+                         min_percent=min_percent, radius=radius)
+    if not np.isnan(md.instance.capacity).all():
+        raise ValueError('lagrangian bounds do not support capacities')
+
+    logging.info('starting lagrangian relaxation')
+    start_time = time.time()
+    lower, upper, open_ids, assignment_df, iterations = lagrangian.solve(
+                    md.instance, md.instance.get_kp_coefficients(md.kappa),
+                    num_locations=num_locations, open_destinations=md.open_destinations,
+                    percent_destinations=md.percent_destinations, min_percent_open=md.min_percent_open,
+                    max_iterations=max_iterations, tolerance=tolerance, improve=improve)
+    wall_time = time.time() - start_time
+
+    parameters = {'minimize':'ede', 'num_locations':num_locations,
+                  'target_ede':None,'aversion':aversion,
+                  'scaling_factor':md.alpha,'min_percent':min_percent,
+                  'radius':radius,
+                  'solver':'lagrangian','time_limit':None,
+                  'mip_gap':tolerance, 'backend':None}
+    gap = (upper-lower)/abs(upper) if upper!=0 else 0
+    results = Results(assignment_df, parameters, gap, wall_time)
+
+    total_pop = md.instance.get_total_population()
+    return LagrangianBounds(_get_ede_from_objective(lower, total_pop, md.kappa),
+                            _get_ede_from_objective(upper, total_pop, md.kappa),
+                            iterations, results)
+
+def _get_ede_from_objective(objective, total_pop, kappa):
+    # inverse of _get_adjusted_target
+    if kappa<0:
+        return -1/kappa*np.log(objective/total_pop)
+    return objective/total_pop
+
+def _set_initial_values(model, instance, initial_open):
+    # open initial_open and assign each origin to its best open destination
+    # (distance orders pairs like the kp coefficients)
+    initial_open = set(initial_open)
+    if isinstance(model, matrix_model.MatrixModel):
+        model.values = np.zeros(model.num_cols)
+        model.values[:model.num_dests] = np.isin(instance.dest_ids, list(initial_open))
+        pairs = heuristic.assign(instance, instance.get_pair_distance(), initial_open)
+        if pairs is None:
+            logging.warning('initial_open leaves some origins unassigned')
+            return
+        model.values[model.num_dests + np.asarray(pairs, dtype=np.int64)] = 1
+        return
+    for j, dest in enumerate(instance.dest_ids):
+        model.x[j].set_value(int(dest in initial_open))
+    if not hasattr(model, 'y'): # radius formulation
+        radius_model.set_initial_values(model, instance, np.isin(instance.dest_ids, list(initial_open)))
+        return
+    for y in model.y.values():
+        y.set_value(0)
+    pairs = heuristic.assign(instance, instance.get_pair_distance(), initial_open)
+    if pairs is None:
+        logging.warning('initial_open leaves some origins unassigned')
+        return
+    for k in pairs:
+        model.y[k].set_value(1)
+
+def optimize_sweep(orig_df, dest_df, dist_df, minimize, points, *, 
+                   scaling_factor=None, min_percent=0, radius=None,
+                   solver='scip', time_limit=3600, mip_gap=None, 
+                   tee=None, backend='rules', persistent=True, continuous_assignment=None,
+                   formulation='pairs', presolve=True):
+    """Build the facility location model once and solve it for each point
+    of a parameter sweep. Between solves only the right-hand side of
+    num_locations or target_access and the kp coefficients (aversion) change,
+    and each solve is warm-started from the previous optimal solution (if
+    the solver supports it, see _solve). Returns a list of Results (one per
+    point).
+
+    Keyword arguments:
+    points -- list of dicts with keys 'aversion' and 'num_locations' 
+    (if minimize='ede') or 'target_ede' (if minimize='locations')
+    persistent -- reuse the solver's persistent interface, e.g. 
+    'scip_persistent', if it is available (default: True)
+    (other arguments as in optimize)
     """
+    first = points[0]
+    presolve_locations = None # safe for every point: the fewest locations
+    min_destinations = None # and enough destinations for the most
+    if presolve and minimize=='ede':
+        presolve_locations = min(point['num_locations'] for point in points)
+        min_destinations = max(point['num_locations'] for point in points)
+    model, md = _build_model(orig_df, dest_df, dist_df, 
+                            minimize, first.get('num_locations'), first.get('target_ede'), 
+                            aversion=first['aversion'], scaling_factor=scaling_factor, 
+                            min_percent=min_percent, radius=radius, backend=backend,
+                            continuous_assignment=continuous_assignment, formulation=formulation,
+                            presolve=presolve, presolve_locations=presolve_locations,
+                            min_destinations=min_destinations)
+    instance, alpha = md.instance, md.alpha
+    model_stats = dict(md.stats, **_get_model_stats(model, _count_nonzeros(model, md, minimize)))
+    solver_name, solver_object = _get_sweep_solver(model, solver, persistent=persistent, 
+                                                   time_limit=time_limit, mip_gap=mip_gap)
+
+    results = []
+    previous = first
+    for point in points:
+        if minimize=='ede' and point['num_locations']>instance.num_dests:
+            raise ValueError(f'infeasible: fewer than num_locations={point["num_locations"]} destinations supplied')
+        timings = md.timings if point is first else {} # the model is built once
+        start_time = time.time()
+        _update_sweep_model(model, solver_object, orig_df, instance, minimize, alpha, previous, point)
+        timings['update_model'] = time.time() - start_time
+        mip_gap_actual, wall_time = _solve(model, solver_name, time_limit=time_limit, 
+                                           mip_gap=mip_gap, tee=tee, solver=solver_object, 
+                                           warmstart=point is not first, timings=timings)
+        parameters = {'minimize':minimize, 'num_locations':point.get('num_locations'), 
+                      'target_ede':point.get('target_ede'),'aversion':point['aversion'],
+                      'scaling_factor':alpha,'min_percent':min_percent, 
+                      'radius':radius,
+                      'solver':solver_name,'time_limit':time_limit, 
+                      'mip_gap':mip_gap, 'backend':backend, 'formulation':formulation}
+        start_time = time.time()
+        assignment_df = _get_model_assignment_df(model, instance, backend)
+        timings['extract'] = time.time() - start_time
+        results.append(Results(assignment_df, parameters, mip_gap_actual, wall_time))
+        results[-1].timings = timings
+        results[-1].model_stats = model_stats.copy()
+        previous = point
+
+    return results
+
+def _get_sweep_solver(model, solver_name, *, persistent, time_limit, mip_gap):
+    # return (solver name, solver object), preferring the persistent interface
+    if isinstance(model, matrix_model.MatrixModel): # solved through the solver's own API
+        return solver_name, None
+    if persistent:
+        persistent_name = f'{solver_name}_persistent'
+        if pyo.SolverFactory(persistent_name).available(exception_flag=False):
+            solver = _get_solver(persistent_name, time_limit=time_limit, mip_gap=mip_gap)
+            if isinstance(solver, PersistentSolver):
+                solver.set_instance(model)
+            return persistent_name, solver
+        logging.info(f'{persistent_name} is not available; using {solver_name}')
+    return solver_name, _get_solver(solver_name, time_limit=time_limit, mip_gap=mip_gap)
+
+def _update_sweep_model(model, solver, orig_df, instance, minimize, alpha, previous, point):
+    # change only what differs between the previous point and this one
+    new_aversion = point['aversion']!=previous['aversion']
+    kappa = point['aversion']*alpha
+    new_target = minimize=='locations' and point['target_ede']!=previous['target_ede']
+    if new_aversion or new_target:
+        if new_aversion:
+            logging.info(f'updating kp coefficients (aversion={point["aversion"]})')
+        if isinstance(model, matrix_model.MatrixModel):
+            coef = instance.get_kp_coefficients(kappa)
+        else:
+            kp_expr, kp_constant = _get_kp_expr(model, instance, kappa)
+    if isinstance(model, matrix_model.MatrixModel):
+        if minimize=='ede':
+            if new_aversion:
+                matrix_model.set_objective(model, coef)
+            if point['num_locations']!=previous['num_locations']:
+                logging.info(f'updating num_locations={point["num_locations"]}')
+                matrix_model.set_row(model, 'num_locations', rhs=point['num_locations'])
+        elif new_aversion or new_target:
+            logging.info(f'updating target_ede={point["target_ede"]}')
+            matrix_model.set_row(model, 'target_access', coef=coef, 
+                                 rhs=_get_adjusted_target(orig_df, point['target_ede'], kappa))
+    elif minimize=='ede':
+        if new_aversion:
+            model.obj.set_value(kp_expr + kp_constant)
+            if isinstance(solver, PersistentSolver):
+                solver.set_objective(model.obj)
+        if point['num_locations']!=previous['num_locations']:
+            logging.info(f'updating num_locations={point["num_locations"]}')
+            model.num_locations.set_value(model.num_locations.body==point['num_locations'])
+            _update_persistent_constraint(solver, model.num_locations)
+    else: # minimize=='locations'
+        if new_aversion or new_target:
+            logging.info(f'updating target_ede={point["target_ede"]}')
+            target = _get_adjusted_target(orig_df, point['target_ede'], kappa)
+            model.target_access.set_value(kp_expr<=target-kp_constant)
+            _update_persistent_constraint(solver, model.target_access)
+
+def _get_kp_expr(model, instance, kappa):
+    # (expression, constant) whose sum is the sum of kp coefficients of the assignment
+    coef = instance.get_kp_coefficients(kappa)
+    if hasattr(model, 'u'): # radius formulation
+        return radius_model.get_kp_expr(model, radius_model.get_levels(instance), coef)
+    return matrix_model._linear(coef, model.y.values()), 0
+
+def _update_persistent_constraint(solver, constraint):
+    # persistent solvers with an explicit instance must be told about changes
+    if isinstance(solver, PersistentSolver):
+        solver.remove_constraint(constraint)
+        solver.add_constraint(constraint)
 
+@dataclass
+class _ModelData:
+    # model inputs shared by the solver backends
+    orig_df: pd.DataFrame
+    dest_df: pd.DataFrame # destinations within radius
+    instance: Instance # integer-coded destinations and pairs within radius
+    open_destinations: list
+    percent_destinations: list
+    min_percent_open: int
+    alpha: float
+    kappa: float
+    target: float=None # adjusted target_ede (if minimize='locations')
+    origin_map: pd.Series=None # representative of each origin (if origins are aggregated)
+    aggregation_error: float=0 # max change of a distance by aggregation
+    stats: dict=field(default_factory=dict) # sizes removed by radius and presolve
+    timings: dict=field(default_factory=dict) # seconds per phase
+
+def _get_model_data(orig_df, dest_df, dist_df, minimize, num_locations, target_ede, *, 
+                    aversion, scaling_factor, min_percent, radius, presolve=False, 
+                    presolve_locations=None, min_destinations=None, aggregate_tolerance=None):
+    # presolve_locations: the fewest locations any solve opens (pairs
+    # presolve); min_destinations: the most, which presolve must leave
+    # destinations for (default: num_locations if minimize='ede')
+    profiling.begin('model_data')
+    start_time = time.time()
+    stats = {'num_pairs_in':dist_df.shape[0]}
     dist_df = _apply_radius(orig_df, dest_df, dist_df, radius)
+    stats['pairs_removed_by_radius'] = stats['num_pairs_in'] - dist_df.shape[0]
     dest_df = dest_df[dest_df.id.isin(set(dist_df['destination']))]
+    if min_destinations is None:
+        min_destinations = num_locations if minimize=='ede' else 0
+    if presolve:
+        dest_df, dist_df, removed = model_presolve.reduce_destinations(dest_df, dist_df, 
+                    min_destinations=min_destinations)
+        stats['destinations_removed_by_presolve'] = len(removed)
 
     # collect model sets
-    origins = list(orig_df['id'])
     destinations = list(dest_df['id'])
     if minimize=='ede':
         if len(destinations)<num_locations:
             raise ValueError(f'infeasible: fewer than num_locations={num_locations} destinations supplied')
-    orig_dest_pairs = list(zip(dist_df['origin'], dist_df['destination']))
-    temp_dict = (
-        dist_df
-        .groupby('origin')
-        .agg(dests = ('destination',list))
-        .to_dict()
-    )
-    orig_to_dests = temp_dict['dests']
       
     # collect model parameters
     open_destinations = _get_open(dest_df)
@@ -177,19 +550,307 @@ def optimize(orig_df, dest_df, dist_df,
     alpha = _get_alpha_approximation(dist_df, open_destinations=open_destinations, 
                        percent_destinations=percent_destinations, alpha=scaling_factor)
     kappa = aversion*alpha
-    pair_to_kpcoef = _get_kp_coefficients(dist_df, kappa)
+    adjusted_target_ede = None
+    if minimize=='locations':
+        adjusted_target_ede = _get_adjusted_target(orig_df, target_ede, kappa)
+
+    has_capacity = 'capacity' in set(dest_df.columns.values) and dest_df['capacity'].notna().any()
+    origin_map = None
+    aggregation_error = 0
+    if aggregate_tolerance is not None and not has_capacity: # after alpha (per origin)
+        num_origs = orig_df.shape[0]
+        orig_df, dist_df, origin_map, aggregation_error = model_presolve.aggregate_origins(
+                    orig_df, dist_df, tolerance=aggregate_tolerance)
+        stats['origins_aggregated'] = num_origs - orig_df.shape[0]
+    if minimize=='ede' and presolve_locations is not None and not has_capacity:
+        num_pairs = dist_df.shape[0]
+        dist_df = _truncate_candidates(dist_df, dest_df, presolve_locations, open_destinations)
+        stats['pairs_removed_by_presolve'] = num_pairs - dist_df.shape[0]
+
+    instance = Instance(orig_df, dest_df, dist_df)
+    stats['num_pairs'] = instance.num_pairs
+    profiling.end('model_data')
+    return _ModelData(orig_df, dest_df, instance, open_destinations, percent_destinations,
+                      min_percent_open, alpha, kappa, adjusted_target_ede, 
+                      origin_map, aggregation_error, stats, {'model_data':time.time()-start_time})
+
+def _truncate_candidates(dist_df, dest_df, num_locations, open_destinations):
+    """Drop the pairs that no optimal assignment uses when exactly 
+    num_locations of the destinations open (and there are no capacities): 
+    each origin is assigned to its nearest open destination, which is no 
+    farther than its (D - num_locations + 1)-th nearest candidate (at most
+    D - num_locations destinations are closed) or its nearest 'open' 
+    destination. Pairs tied with the bound are kept."""
+    origin = dist_df['origin']
+    distance = dist_df['distance']
+    rank = dest_df.shape[0] - num_locations + 1
+    nearest_rank = distance.groupby(origin).rank(method='first')
+    bound = distance.where(nearest_rank==rank).groupby(origin).min()
+    if len(open_destinations)>0:
+        open_bound = distance.where(dist_df['destination'].isin(set(open_destinations))).groupby(origin).min()
+        bound = pd.concat([bound, open_bound], axis=1).min(axis=1)
+    keep = (distance <= origin.map(bound).fillna(np.inf)).to_numpy()
+    num_removed = len(keep) - keep.sum()
+    logging.info(f'presolve: removed {num_removed} of {len(keep)} pairs '
+                 f'({num_removed} assignment variables and assign_to_open constraints)')
+    return dist_df if num_removed==0 else dist_df[keep]
+
+def _build_model(orig_df, dest_df, dist_df, minimize, num_locations, target_ede, *, 
+                 aversion, scaling_factor, min_percent, radius, backend, 
+                 continuous_assignment=None, formulation='pairs', presolve=False, 
+                 presolve_locations=None, min_destinations=None, aggregate_tolerance=None):
+    # return (model, model data)
+    md = _get_model_data(orig_df, dest_df, dist_df, minimize, num_locations, target_ede, 
+                         aversion=aversion, scaling_factor=scaling_factor, 
+                         min_percent=min_percent, radius=radius, presolve=presolve,
+                         presolve_locations=presolve_locations, min_destinations=min_destinations,
+                         aggregate_tolerance=aggregate_tolerance)
+    has_capacity = not np.isnan(md.instance.capacity).all()
+    profiling.begin('build_model')
+    start_time = time.time()
+    if formulation=='radius':
+        if has_capacity:
+            raise ValueError('the radius formulation does not support capacities')
+        model = radius_model.build_model(md.instance, 
+                    md.instance.get_kp_coefficients(md.kappa), minimize=minimize, 
+                    num_locations=num_locations, target=md.target,
+                    open_destinations=md.open_destinations, 
+                    percent_destinations=md.percent_destinations, min_percent_open=md.min_percent_open)
+        md.timings['build_model'] = time.time() - start_time
+        profiling.end('build_model')
+        return model, md
+    if formulation!='pairs':
+        raise ValueError(f"unknown formulation '{formulation}' (use 'pairs' or 'radius')")
+    if continuous_assignment is None:
+        continuous_assignment = not has_capacity
+    elif continuous_assignment and has_capacity:
+        raise ValueError('continuous_assignment requires destinations without capacities')
+
+    if backend=='matrix':
+        model = matrix_model.build_model(md.instance, 
+                    md.instance.get_kp_coefficients(md.kappa), minimize=minimize, 
+                    num_locations=num_locations, target=md.target,
+                    open_destinations=md.open_destinations, 
+                    percent_destinations=md.percent_destinations, min_percent_open=md.min_percent_open,
+                    continuous_assignment=continuous_assignment)
+    else:
+        model = _build_rules_model(md.instance, 
+                    md.instance.get_kp_coefficients(md.kappa), minimize=minimize, 
+                    num_locations=num_locations, target=md.target,
+                    open_destinations=md.open_destinations, 
+                    percent_destinations=md.percent_destinations, min_percent_open=md.min_percent_open,
+                    continuous_assignment=continuous_assignment)
+    md.timings['build_model'] = time.time() - start_time
+    profiling.end('build_model')
+
+    return model, md
+
+def _get_adjusted_target(orig_df, target_ede, kappa):
+    # target_ede as a bound on the sum of kp coefficients
+    total_pop = orig_df['population'].sum()
+    target_ede_base = target_ede
+    if kappa<0: # adjust for kp score
+        target_ede_base = np.exp(-kappa*target_ede)
+    return total_pop*target_ede_base # adjust for total pop
+
+_OPTION_NAMES = {'scip': {'time_option': 'limits/time', 'mip_gap_option':'limits/gap',
+                           'threads_option':'parallel/maxnthreads'},
+                 'gurobi': {'time_option': 'TimeLimit', 'mip_gap_option':'MIPGap',
+                            'threads_option':'Threads'}}
+
+def _get_solver(solver_name, *, time_limit, mip_gap, threads=None):
+    solver = pyo.SolverFactory(solver_name)       
+    solver.options.update(_get_solver_options(solver_name, time_limit=time_limit, 
+                                              mip_gap=mip_gap, threads=threads))
+    return solver
+
+def _get_solver_options(solver_name, *, time_limit, mip_gap, threads=None):
+    # solver parameters by the solver's own names (None leaves the default)
+    option_names = _OPTION_NAMES[solver_name.split('_')[0]] # e.g. scip_persistent uses scip options
+    options = {}
+    if time_limit is not None:
+        options[option_names['time_option']] = time_limit
+    if mip_gap is not None:
+        options[option_names['mip_gap_option']] = mip_gap
+    if threads is not None:
+        options[option_names['threads_option']] = threads
+    return options
+
+def _solve(model, solver_name, *, time_limit, mip_gap, tee, solver=None, warmstart=False,
+           threads=None, timings=None):
+    """Solve model and return (mip_gap_actual, wall_time)
+
+    solver -- solver object to reuse, e.g. a persistent solver (default: new solver)
+    warmstart -- start from the current variable values: gurobi and scip_direct
+    or scip_persistent (the values of the integer variables are added to scip
+    as a partial solution) take them; a new solver without warm starts (e.g.
+    the scip executable) is replaced by its direct interface if that is
+    available, otherwise the start is dropped with a warning
+    threads -- max number of solver threads (default: solver default)
+    timings -- dict to record the solve phase in: 'solve' (wall time) and, if 
+    the solver reports its own time, 'solver' and 'solver_io' (the rest: 
+    writing the model file and reading the solution)
+
+    A matrix_model.MatrixModel is written as an MPS file and solved through
+    the solver's python API (see matrix_model.solve), with its start taken
+    from model.values; solver is unused.
+    """
+    if isinstance(model, matrix_model.MatrixModel):
+        logging.info('starting solver')
+        profiling.begin('solve')
+        start_time = time.time()
+        options = _get_solver_options(solver_name, time_limit=time_limit, mip_gap=mip_gap, threads=threads)
+        lower, upper, solver_time = matrix_model.solve(model, solver_name, options=options, tee=tee, 
+                                                       warmstart=warmstart and model.values is not None,
+                                                       timings=timings)
+        wall_time = time.time() - start_time
+        profiling.end('solve')
+        if timings is not None:
+            timings['solve'] = wall_time
+            timings['solver'] = solver_time
+            timings['solver_io'] = max(wall_time - solver_time, 0)
+        return abs(lower-upper)/abs(upper), wall_time
+    if solver is None:
+        solver = _get_solver(solver_name, time_limit=time_limit, mip_gap=mip_gap, threads=threads)
+        if warmstart and not _can_warm_start(solver):
+            direct_name = f"{solver_name.split('_')[0]}_direct"
+            if direct_name!=solver_name and pyo.SolverFactory(direct_name).available(exception_flag=False):
+                logging.info(f'{solver_name} cannot warm start; using {direct_name}')
+                solver_name = direct_name
+                solver = _get_solver(solver_name, time_limit=time_limit, mip_gap=mip_gap, threads=threads)
+    kwargs = dict(tee=tee, **_get_warmstart_kwargs(solver, solver_name, warmstart))
+    logging.info('starting solver')
+    profiling.begin('solve')
+    start_time = time.time()
+    if isinstance(solver, PersistentSolver): # instance was set with set_instance
+        solver_result = solver.solve(**kwargs)
+    else:
+        solver_result = solver.solve(model, **kwargs)
+    end_time = time.time()
+    profiling.end('solve')
+    if not solver_result.solver.termination_condition==pyo.TerminationCondition.optimal:
+        raise ValueError(f'Solver terminated with no solution: {solver_result.solver.termination_condition}')
+
+    if solver_name=='scip':
+        upper = solver_result['Solver'][0]['Primal bound']
+        lower = solver_result['Solver'][0]['Dual bound']
+    else:
+        lower = float(solver_result['Problem'][0]['Lower bound'])
+        upper = float(solver_result['Problem'][0]['Upper bound'])    
+    mip_gap_actual = abs(lower-upper)/abs(upper)
+    wall_time = end_time - start_time
+    if timings is not None:
+        timings['solve'] = wall_time
+        solver_time = _get_solver_time(solver_result)
+        if solver_time is not None:
+            timings['solver'] = solver_time
+            timings['solver_io'] = max(wall_time - solver_time, 0)
+
+    return mip_gap_actual, wall_time
+
+def _can_warm_start(solver):
+    return _has_warmstart_config(solver) or solver.warm_start_capable()
+
+def _has_warmstart_config(solver):
+    # pyomo's scip_direct and scip_persistent take the start as a config option
+    config = getattr(solver, 'config', None)
+    return config is not None and 'warmstart_discrete_vars' in config
+
+def _get_warmstart_kwargs(solver, solver_name, warmstart):
+    # solve keyword arguments that (don't) start from the current values
+    if _has_warmstart_config(solver):
+        # the option persists, and sweep solvers are reused
+        solver.config.warmstart_discrete_vars = warmstart
+        return {}
+    if not warmstart:
+        return {}
+    if solver.warm_start_capable():
+        return {'warmstart':True}
+    logging.warning(f'{solver_name} does not support warm starts; solving without the initial solution')
+    return {}
+
+def _get_solver_time(solver_result):
+    # time reported by the solver (None if it reports none)
+    for name in ['wallclock_time', 'time']:
+        try:
+            return float(getattr(solver_result.solver[0], name))
+        except (AttributeError, TypeError, ValueError):
+            pass
+    return None
+
+def _get_model_stats(model, num_nonzeros):
+    # numbers of variables by type and rows, from the sizes of the model's
+    # components (every variable of a component has the same domain), and
+    # num_nonzeros (linear terms of the rows), which callers derive from
+    # the instance, so no row is walked
+    if isinstance(model, matrix_model.MatrixModel):
+        return matrix_model.get_model_stats(model)
+    stats = {'num_binaries':0, 'num_integers':0, 'num_continuous':0}
+    for var in model.component_objects(pyo.Var, active=True):
+        if len(var)==0:
+            continue
+        v = next(iter(var.values()))
+        kind = 'num_binaries' if v.is_binary() else 'num_integers' if v.is_integer() else 'num_continuous'
+        stats[kind] += len(var)
+    stats['num_rows'] = sum(len(c) for c in model.component_objects(pyo.Constraint, active=True))
+    stats['num_nonzeros'] = int(num_nonzeros)
+    return stats
+
+def _count_nonzeros(model, md, minimize):
+    # linear terms of the rows of a model built by _build_model: besides
+    # num_locations (x) or target_access (y, or u), set_open and 
+    # min_percent_open, the pairs formulation has a row per pair (y, x), 
+    # per origin (its y) and per capped destination (its y), and the radius
+    # formulation a row per level (its x, its u and the previous level's u, 
+    # see radius_model; every u is the last of one row and the first of another)
+    instance = md.instance
+    num_fixed = len(md.open_destinations) + len(md.percent_destinations)
+    if hasattr(model, 'u'): # radius formulation
+        num_u = len(model.u)
+        return (instance.num_dests if minimize=='ede' else num_u) + instance.num_pairs + 2*num_u + num_fixed
+    capped = ~np.isnan(instance.capacity)
+    return ((instance.num_dests if minimize=='ede' else instance.num_pairs) + 3*instance.num_pairs 
+            + np.diff(instance.dest_indptr)[capped].sum() + num_fixed)
+
+def _get_model_assignment_df(model, instance, backend):
+    is_matrix = isinstance(model, matrix_model.MatrixModel)
+    if is_matrix:
+        fractional = model.continuous_assignment
+    else:
+        fractional = not hasattr(model, 'y') or _has_continuous_y(model)
+    if fractional:
+        # y may be fractional (e.g. ties, or slack in target_access) or 
+        # absent (radius formulation): assign each origin to its nearest 
+        # open destination instead
+        x = model.x_values if is_matrix else matrix_model.get_values(model.x)
+        pairs = heuristic.assign(instance, instance.get_pair_distance(), instance.dest_ids[x>0.9])
+        return instance.get_assignment_df(pairs)
+    if is_matrix:
+        return matrix_model.get_assignment_df(model, instance)
+    return _get_assignment_df(model, instance)
+
+def _has_continuous_y(model):
+    return len(model.y)>0 and next(iter(model.y.values())).is_continuous()
+
+def _build_rules_model(instance, coef, *, 
+                       minimize, num_locations, target, 
+                       open_destinations, percent_destinations, min_percent_open,
+                       continuous_assignment=False):
+    # build the model with pyomo rule callbacks (indexed by instance codes)
+    destinations = range(instance.num_dests)
+    pairs = range(instance.num_pairs)
+    pair_to_kpcoef = np.asarray(coef, dtype=float).tolist()
 
-    # build model
     model = pyo.ConcreteModel()
     logging.info('adding variables')
     model.x = pyo.Var(destinations, domain=pyo.Binary)
-    model.y = pyo.Var(orig_dest_pairs, domain=pyo.Binary)
+    model.y = pyo.Var(pairs, domain=pyo.UnitInterval if continuous_assignment else pyo.Binary)
 
     if minimize=='ede':
         # minimize the Kolm-Pollak EDE
         logging.info('adding objective')
         def obj_rule(model):
-            return sum(model.y[orig,dest]*pair_to_kpcoef[orig,dest] for orig,dest in orig_dest_pairs)
+            return sum(model.y[k]*pair_to_kpcoef[k] for k in pairs)
         model.obj = pyo.Objective(rule=obj_rule, sense=pyo.minimize)
 
         # set the number of locations to open
@@ -205,82 +866,40 @@ def optimize(orig_df, dest_df, dist_df,
             return sum(model.x[dest] for dest in destinations)
         model.obj = pyo.Objective(rule=obj_rule, sense=pyo.minimize)
 
-        # meet target level of access
+        # meet target level of access (target is adjusted for kp score and total pop)
         logging.info('adding target access constraint')
-        total_pop = orig_df['population'].sum()
-        target_ede_base = target_ede
-        if kappa<0: # adjust for kp score
-            target_ede_base = np.exp(-kappa*target_ede)
-        adjusted_target_ede = total_pop*target_ede_base # adjust for total pop
         def target_access_rule(model):
-            return sum(model.y[orig,dest]*pair_to_kpcoef[orig,dest] 
-                       for orig,dest in orig_dest_pairs) <= adjusted_target_ede
+            return sum(model.y[k]*pair_to_kpcoef[k] for k in pairs) <= target
         model.target_access = pyo.Constraint(rule=target_access_rule)
 
     # add constraints common to both models
-    _assign_to_open_constraint(model, orig_dest_pairs)
-    _must_assign_constraint(model, origins, orig_to_dests)
-    _set_open_constraint(model, open_destinations)
-    _min_percent_open_constraint(model, percent_destinations, min_percent_open)
-    _capacity_constraint(model, orig_df, dest_df, dist_df)
+    _assign_to_open_constraint(model, instance)
+    _must_assign_constraint(model, instance)
+    _set_open_constraint(model, instance.get_dest_codes(open_destinations).tolist())
+    _min_percent_open_constraint(model, instance.get_dest_codes(percent_destinations).tolist(), 
+                                 min_percent_open)
+    _capacity_constraint(model, instance)
     logging.info('model complete')
-    # model.target_access.pprint()
-
-    # solve
-    option_names = {}
-    option_names['scip'] = {'time_option': 'limits/time', 'mip_gap_option':'limits/gap'}
-    option_names['gurobi'] = {'time_option': 'TimeLimit', 'mip_gap_option':'MIPGap'}
-
-    solver_name = solver
-    solver = pyo.SolverFactory(solver_name)       
-    if time_limit is not None:
-        solver.options[option_names[solver_name]['time_option']] = time_limit
-    if mip_gap is not None:
-        solver.options[option_names[solver_name]['mip_gap_option']] = mip_gap
-    logging.info('starting solver')
-    start_time = time.time()
-    solver_result = solver.solve(model, tee=tee)
-    end_time = time.time()
-    if not solver_result.solver.termination_condition==pyo.TerminationCondition.optimal:
-        raise ValueError(f'Solver terminated with no solution: {solver_result.solver.termination_condition}')
 
-    # pull together results
-    if solver_name=='scip':
-        upper = solver_result['Solver'][0]['Primal bound']
-        lower = solver_result['Solver'][0]['Dual bound']
-    elif solver_name=='gurobi':
-        lower = float(solver_result['Problem'][0]['Lower bound'])
-        upper = float(solver_result['Problem'][0]['Upper bound'])    
-    mip_gap_actual = abs(lower-upper)/abs(upper)
-    wall_time = end_time - start_time
-    parameters = {'minimize':minimize, 'num_locations':num_locations, 
-                  'target_ede':target_ede,'aversion':aversion,
-                  'scaling_factor':alpha,'min_percent':min_percent, 
-                  'radius':radius,
-                  'solver':solver_name,'time_limit':time_limit, 
-                  'mip_gap':mip_gap}
-    assignment_df = _get_assignment_df(model, dist_df)
+    return model
 
-    result = Results(assignment_df, parameters, mip_gap_actual, wall_time)
-
-    return result
-
-def _assign_to_open_constraint(model, orig_dest_pairs):
+def _assign_to_open_constraint(model, instance):
     # don't assign an origin to a location unless it is open
     logging.info('adding assign to open constraint')
-    def assign_to_open_rule(model,orig,dest):
-        return model.y[orig,dest] <= model.x[dest]
-    model.assign_to_open = pyo.Constraint(orig_dest_pairs, rule=assign_to_open_rule)
+    pair_dest = instance.pair_dest.tolist()
+    def assign_to_open_rule(model,k):
+        return model.y[k] <= model.x[pair_dest[k]]
+    model.assign_to_open = pyo.Constraint(range(instance.num_pairs), rule=assign_to_open_rule)
 
-def _must_assign_constraint(model, origins, orig_to_dests):
+def _must_assign_constraint(model, instance):
     # must assign each origin to a destination
     logging.info('adding must assign constraint')
     def must_assign_rule(model,orig):
-        return sum(model.y[orig,dest] for dest in orig_to_dests[orig])==1
-    model.must_assign = pyo.Constraint(origins, rule=must_assign_rule)
+        return sum(model.y[k] for k in instance.orig_pairs(orig))==1
+    model.must_assign = pyo.Constraint(range(instance.num_origs), rule=must_assign_rule)
 
 def _set_open_constraint(model, open_destinations):
-    # set open destinations to open
+    # set open destinations (codes) to open
     if len(open_destinations)==0:
         return
     logging.info('adding set open constraint')
@@ -289,7 +908,7 @@ def _set_open_constraint(model, open_destinations):
     model.set_open = pyo.Constraint(open_destinations, rule=set_open_rule)
 
 def _min_percent_open_constraint(model, percent_destinations, min_open):    
-    # open minimum number of percent_open destinations
+    # open minimum number of percent_open destinations (codes)
     if len(percent_destinations)==0:
         return
     logging.info('adding min percent open constraint')
@@ -297,28 +916,16 @@ def _min_percent_open_constraint(model, percent_destinations, min_open):
         return sum(model.x[dest] for dest in percent_destinations)>=min_open
     model.min_percent_open = pyo.Constraint(rule=min_percent_open_rule)
 
-def _capacity_constraint(model, orig_df, dest_df, dist_df):
-    if not 'capacity' in set(dest_df.columns.values):
-        return 
-    cap_dest_df = dest_df.query('capacity.notna()')
-    if cap_dest_df.shape[0]==0:
+def _capacity_constraint(model, instance):
+    capped_dests = np.flatnonzero(~np.isnan(instance.capacity)).tolist()
+    if len(capped_dests)==0:
         return
     logging.info('adding capacity constraint')
-    capped_dests = set(cap_dest_df['id'])
-    temp_dict = (
-        dist_df
-        .query('destination in @capped_dests')
-        .groupby('destination')
-        .agg(origs = ('origin',list))
-        .to_dict()
-    )
-    capped_dest_to_origs = temp_dict['origs']
-    orig_to_pop = {orig:pop for orig,pop in zip(orig_df['id'],orig_df['population'])}
-    dest_to_cap = {dest:cap for dest,cap in zip(cap_dest_df['id'],cap_dest_df['capacity'])}
+    pair_to_pop = instance.get_pair_population().tolist()
     # restrict capacity of each destination as appropriate
     def capacity_rule(model,dest):
-        return (sum(model.y[orig,dest]*orig_to_pop[orig] 
-                    for orig in capped_dest_to_origs[dest])<=dest_to_cap[dest])
+        return (sum(model.y[k]*pair_to_pop[k] 
+                    for k in instance.dest_pairs(dest))<=instance.capacity[dest])
     model.capacity = pyo.Constraint(capped_dests, rule=capacity_rule)
 
 # mip_gap default = scip gap default = 0
@@ -334,13 +941,10 @@ def solve_model(model, *, mip_solver='scip', time_limit=3600, mip_gap=0, tee=Non
         raise ValueError(f'Solver terminated with no solution: {solver_result.solver.termination_condition}')
 
 
-def _get_assignment_df(model, dist_df):
-    assignments = [(orig,dest,dist,pop) for orig,dest,dist,pop
-                   in zip(dist_df['origin'],dist_df['destination'],dist_df['distance'],dist_df['population']) 
-                   if model.y[orig,dest].value>0.9] # this handles floating point errors (sometimes 1 is not exactly 1)
-    assignment_df = (
-        pd.DataFrame(assignments, columns=['origin','destination','distance','population'])
-    )
+def _get_assignment_df(model, instance):
+    y = matrix_model.get_values(model.y) # y[k] is pair k
+    assigned = np.flatnonzero(y>0.9) # this handles floating point errors (sometimes 1 is not exactly 1)
+    assignment_df = instance.get_assignment_df(assigned)
 
     return assignment_df
 
@@ -357,7 +961,7 @@ def optimize_isochrone(orig_df, dest_df, dist_df, iso_radius,
                        percent_coverage=1, 
                        min_percent=0, radius=None,
                        solver='scip', time_limit=3600, mip_gap=None, 
-                       tee=None):
+                       tee=None, threads=None, presolve=True):
     """Build pyomo facility location model that minimizes either
     (1) number of people uncovered* by k optimally located sites
     (2) number of locations to cover* % of population
@@ -376,142 +980,224 @@ def optimize_isochrone(orig_df, dest_df, dist_df, iso_radius,
     percent_coverage -- % of pop that must be covered (used if minimize='locations'; default=1)
     min_percent -- decimal percent of "percent" destinations that must open (default: 0)
     radius -- remove distances exceeding radius (default: include all distances)
-    solver -- 'scip' ('gurobi' to be added later)
+    solver -- 'scip' ('gurobi' to be added later) or 'greedy' (lazy greedy 
+    + interchange heuristic, minimize='uncovered', solver_mip_gap is None; 
+    see optimize_isochrone_greedy)
     time_limit -- solver times out and returns best solution so far (seconds) (default: 3600)
     mip_gap -- solver stops when within this percent of optimal (default: 0)
     tee -- print solver output to screen (default: False)
+    threads -- max number of solver threads (default: solver default)
+    presolve -- remove duplicate and dominated destinations before the 
+    model is built (see presolve.reduce_destinations) (default: True)
     """
 
-    dist_df = _apply_radius(orig_df, dest_df, dist_df, radius)
-    dest_df = dest_df[dest_df.id.isin(set(dist_df['destination']))]
+    if solver=='greedy':
+        if minimize!='uncovered':
+            raise ValueError("the greedy solver requires minimize='uncovered'")
+        if num_locations<1:
+            raise ValueError(f'the greedy solver requires num_locations>=1 (num_locations={num_locations})')
+        if num_locations>dest_df.shape[0]:
+            raise ValueError(f'infeasible: fewer than num_locations={num_locations} destinations supplied')
+        results = optimize_isochrone_greedy(orig_df, dest_df, dist_df, iso_radius, num_locations, 
+                                            min_percent=min_percent, radius=radius)
+        if num_locations not in results: # destinations beyond radius were removed
+            raise ValueError(f'infeasible: fewer than num_locations={num_locations} destinations supplied')
+        return results[num_locations]
 
-    # collect model sets
-    origins = list(orig_df['id'])
-    destinations = list(dest_df['id'])
+    profiling.begin('model_data')
+    start_time = time.time()
+    num_pairs_in = dist_df.shape[0]
+    dest_df, dist_df, cover_df, coverable = _get_coverage_data(orig_df, dest_df, dist_df, iso_radius, 
+                    radius=radius, presolve=presolve and (minimize!='uncovered' or dest_df.shape[0]>=num_locations),
+                    min_destinations=num_locations if minimize=='uncovered' else 0)
+
+    # collect model sets (indexed by instance codes)
+    instance = Instance(orig_df, dest_df, cover_df)
+    destinations = range(instance.num_dests)
     if minimize=='uncovered':
         if len(destinations)<num_locations:
             raise ValueError(f'infeasible: fewer than num_locations={num_locations} destinations supplied')
-    orig_dest_pairs = list(zip(dist_df['origin'], dist_df['destination']))
+    # origins no destination covers are left out of the model
+    num_uncoverable = int((~coverable).sum())
+    uncoverable_pop = instance.population[~coverable].sum()
+    coverable = np.flatnonzero(coverable)
       
     # collect model parameters
     open_destinations = _get_open(dest_df)
-    orig_to_pop = {id:pop for id,pop in list(zip(orig_df['id'], orig_df['population']))}
-    triple = list(zip(dist_df['origin'], dist_df['destination'], dist_df['distance']))
-    pair_to_dist = {(x, y):z for x, y, z in triple}
     percent_destinations = _get_percent_open(dest_df)
     min_percent_open = math.ceil(len(percent_destinations)*min_percent)
     min_to_open = len(open_destinations) + min_percent_open
+    total_pop = orig_df['population'].sum()
     if minimize=='uncovered':
         if min_to_open > num_locations:
             raise ValueError(f'infeasible: {min_to_open} (> num_locations={num_locations}) destinations must open')
+    elif total_pop - uncoverable_pop < total_pop*percent_coverage:
+        raise ValueError(f'infeasible: origins with population {uncoverable_pop} have no destination '
+                         f'within iso_radius={iso_radius} (percent_coverage={percent_coverage})')
+
+    timings = {'model_data':time.time()-start_time}
+    profiling.end('model_data')
 
-    # build model
+    # build model: z[orig] (one per coverable origin, continuous since 
+    # z=min(1, number of open destinations covering orig) is integral once 
+    # x is) is at most the number of open destinations in its coverage set
+    profiling.begin('build_model')
+    start_time = time.time()
     model = pyo.ConcreteModel()
     logging.info('adding variables')
     model.x = pyo.Var(destinations, domain=pyo.Binary)
-    model.y = pyo.Var(orig_dest_pairs, domain=pyo.Binary)
-    model.z = pyo.Var(origins, domain=pyo.Binary)
+    model.z = pyo.Var(coverable.tolist(), domain=pyo.UnitInterval)
+    x_vars = list(model.x.values())
+    covered_pop = matrix_model._linear(instance.population[coverable], model.z.values())
 
     if minimize=='uncovered': 
         # maximize 'covered': the number of residents within iso_radius of open site
         logging.info('adding maximize coverage objective')
-        def obj_rule(model):
-            return sum(model.z[orig]*orig_to_pop[orig] for orig in origins)
-        model.obj = pyo.Objective(rule=obj_rule, sense=pyo.maximize)
+        model.obj = pyo.Objective(expr=covered_pop, sense=pyo.maximize)
 
         # set the number of locations to open
         logging.info('adding num locations constraint')
-        def num_locations_rule(model):
-            return sum(model.x[dest] for dest in destinations)==num_locations
-        model.num_locations = pyo.Constraint(rule=num_locations_rule)
+        model.num_locations = pyo.Constraint(expr=matrix_model._sum(x_vars)==num_locations)
     
     else: # minimize=='locations'
         # minimize the number of locations to open
         logging.info('adding min locations objective')
-        def obj_rule(model):
-            return sum(model.x[dest] for dest in destinations)
-        model.obj = pyo.Objective(rule=obj_rule, sense=pyo.minimize)
+        model.obj = pyo.Objective(expr=matrix_model._sum(x_vars), sense=pyo.minimize)
 
         # meet target level of isochrone coverage
         logging.info('adding percent coverage constraint')
-        total_pop = orig_df['population'].sum()
-        def target_coverage_rule(model):
-            return ( 
-                sum(model.z[orig]*orig_to_pop[orig] for orig in origins) 
-                                                >= total_pop*percent_coverage 
-            )
-        model.target_coverage = pyo.Constraint(rule=target_coverage_rule)
-
-    # determine if dest "covers" orig
-    logging.info('adding dest covers orig constraint')
-    def dest_covers_orig_rule(model,orig,dest):
-        return pair_to_dist[orig,dest]*model.y[orig,dest] <= model.x[dest]*iso_radius
-    model.dest_covers_orig = pyo.Constraint(orig_dest_pairs, rule=dest_covers_orig_rule)
-
-    # determine if orig is covered
+        model.target_coverage = pyo.Constraint(expr=covered_pop>=total_pop*percent_coverage)
+
+    # orig is covered only if an open destination covers it
     logging.info('adding orig covered constraint')
+    pair_to_dest = instance.pair_dest.tolist()
     def orig_covered_rule(model,orig):
-        return model.z[orig] <= sum(model.y[orig,dest] for dest in destinations)
-    model.orig_covered = pyo.Constraint(origins, rule=orig_covered_rule)
+        covering = matrix_model._sum(x_vars[pair_to_dest[k]] for k in instance.orig_pairs(orig))
+        return model.z[orig] <= covering
+    model.orig_covered = pyo.Constraint(coverable.tolist(), rule=orig_covered_rule)
 
     # add common constraints
-    _set_open_constraint(model, open_destinations)
-    _min_percent_open_constraint(model, percent_destinations, min_percent_open)
+    _set_open_constraint(model, instance.get_dest_codes(open_destinations).tolist())
+    _min_percent_open_constraint(model, instance.get_dest_codes(percent_destinations).tolist(), 
+                                 min_percent_open)
     ##### Don't need capacities -- maybe add later? #####
     # _capacity_constraint(model, orig_dest_pairs, orig_df, dest_df)
     logging.info('model complete')
+    timings['build_model'] = time.time() - start_time
+    profiling.end('build_model')
+    model_stats = {'num_pairs_in':num_pairs_in, 'pairs_removed_by_radius':num_pairs_in-dist_df.shape[0],
+                   'num_pairs':instance.num_pairs}
+    # rows: num_locations (x) or target_coverage (z), a row per coverable 
+    # origin (its z and covering x), set_open and min_percent_open
+    num_nonzeros = ((instance.num_dests if minimize=='uncovered' else len(coverable)) + len(coverable) 
+                    + instance.num_pairs + len(open_destinations) + len(percent_destinations))
+    model_stats.update(_get_model_stats(model, num_nonzeros))
 
     # solve
-    option_names = {}
-    option_names['scip'] = {'time_option': 'limits/time', 'mip_gap_option':'limits/gap'}
-    option_names['gurobi'] = {'time_option': 'TimeLimit', 'mip_gap_option':'MIPGap'}
-
-    solver_name = solver
-    solver = pyo.SolverFactory(solver_name)       
-    if time_limit is not None:
-        solver.options[option_names[solver_name]['time_option']] = time_limit
-    if mip_gap is not None:
-        solver.options[option_names[solver_name]['mip_gap_option']] = mip_gap
-    logging.info('starting solver') 
-    start_time = time.time()
-    solver_result = solver.solve(model, tee=tee)
-    end_time = time.time()
-    if not solver_result.solver.termination_condition==pyo.TerminationCondition.optimal:
-        raise ValueError(f'Solver terminated with no solution: {solver_result.solver.termination_condition}')
+    mip_gap_actual, wall_time = _solve(model, solver, time_limit=time_limit, 
+                                       mip_gap=mip_gap, tee=tee, threads=threads, timings=timings)
 
     # pull together results
-    if solver_name=='scip':
-        upper = solver_result['Solver'][0]['Primal bound']
-        lower = solver_result['Solver'][0]['Dual bound']
-    elif solver_name=='gurobi':
-        lower = float(solver_result['Problem'][0]['Lower bound'])
-        upper = float(solver_result['Problem'][0]['Upper bound'])    
-    mip_gap_actual = abs(lower-upper)/abs(upper)
-    wall_time = end_time - start_time
     parameters = {'minimize':minimize, 'num_locations':num_locations, 
                   'iso_radius':iso_radius,'percent_coverage':percent_coverage,
                   'min_percent':min_percent, 
                   'radius':radius,
-                  'solver':solver_name,'time_limit':time_limit, 
-                  'mip_gap':mip_gap}
-    assignment_df = _get_isochrone_assignment_df(model, origins, destinations, dist_df, orig_df)
+                  'solver':solver,'time_limit':time_limit, 
+                  'mip_gap':mip_gap, 'uncoverable_origins':num_uncoverable}
+    profiling.begin('extract')
+    start_time = time.time()
+    x = matrix_model.get_values(model.x)
+    assignment_df = _get_isochrone_assignment_df(instance.dest_ids[x>0.9].tolist(), dist_df, orig_df)
+    timings['extract'] = time.time() - start_time
+    profiling.end('extract')
 
     result = Results(assignment_df, parameters, mip_gap_actual, wall_time)
+    result.timings = timings
+    result.model_stats = model_stats
 
     return result
 
-def _get_isochrone_assignment_df(model, origins, destinations, dist_df, orig_df):
-           
-    open_dests = [dest for dest in destinations if model.x[dest].value>0.9]
-    open_dist_df = (
-        dist_df
-        .query(f'destination in {open_dests}')
-        .drop(columns=['population'])
-        .sort_values('distance')
-        .groupby('origin')
-        .first()
-        .reset_index()
-    )
+def optimize_isochrone_greedy(orig_df, dest_df, dist_df, iso_radius, max_locations, *, 
+                              min_percent=0, radius=None, swaps=True):
+    """Maximize the population within iso_radius of an open site for every
+    number of locations up to max_locations at once, with the lazy greedy
+    heuristic (see heuristic.solve_coverage; not necessarily optimal).
+    Returns dict of number of locations: Results (as optimize_isochrone 
+    with minimize='uncovered' and solver='greedy'), from the number of 
+    destinations that must open (at least 1) to max_locations. solver_wall_time is the 
+    time of the whole run and solver_mip_gap is None.
+
+    Keyword arguments:
+    swaps -- improve each greedy solution by interchange (default: True)
+    (other arguments as in optimize_isochrone)
+    """
+    profiling.begin('model_data')
+    start_time = time.time()
+    num_pairs_in = dist_df.shape[0]
+    dest_df, dist_df, cover_df, coverable = _get_coverage_data(orig_df, dest_df, dist_df, iso_radius, 
+                                                               radius=radius, presolve=False)
+    percent_destinations = _get_percent_open(dest_df)
+    min_percent_open = math.ceil(len(percent_destinations)*min_percent)
+    instance = Instance(orig_df[coverable], dest_df, cover_df)
+    timings = {'model_data':time.time()-start_time}
+    profiling.end('model_data')
+    model_stats = {'num_pairs_in':num_pairs_in, 'pairs_removed_by_radius':num_pairs_in-dist_df.shape[0],
+                   'num_pairs':instance.num_pairs}
+
+    logging.info('starting lazy greedy')
+    profiling.begin('solve')
+    start_time = time.time()
+    solutions = heuristic.solve_coverage(instance,
+                    max_locations=max_locations, open_destinations=_get_open(dest_df),
+                    percent_destinations=percent_destinations, min_percent_open=min_percent_open,
+                    swaps=swaps)
+    wall_time = time.time() - start_time
+    timings['solve'] = wall_time
+    profiling.end('solve')
+
+    results = {}
+    for k, open_dests in solutions.items():
+        parameters = {'minimize':'uncovered', 'num_locations':k, 
+                      'iso_radius':iso_radius,'percent_coverage':None,
+                      'min_percent':min_percent, 
+                      'radius':radius,
+                      'solver':'greedy','time_limit':None, 
+                      'mip_gap':None, 'uncoverable_origins':int((~coverable).sum()), 
+                      'swaps':swaps}
+        profiling.begin('extract')
+        start_time = time.time()
+        assignment_df = _get_isochrone_assignment_df(open_dests, dist_df, orig_df)
+        results[k] = Results(assignment_df, parameters, None, wall_time)
+        results[k].timings = dict(timings, extract=time.time()-start_time)
+        results[k].model_stats = model_stats
+        profiling.end('extract')
+    return results
+
+def _get_coverage_data(orig_df, dest_df, dist_df, iso_radius, *, radius, presolve, min_destinations=0):
+    """return (dest_df, dist_df within radius, cover_df, coverable): the
+    pairs of cover_df (distance 0) are within iso_radius, so the pairs of
+    an origin are its coverage set, and coverable is True for the origins
+    (rows of orig_df) with a non-empty coverage set"""
+    dist_df = _apply_radius(orig_df, dest_df, dist_df, radius)
+    dest_df = dest_df[dest_df.id.isin(set(dist_df['destination']))]
+    # distances no longer matter in the coverage sets, so presolve removes 
+    # destinations whose coverage set is in another's
+    cover_df = dist_df[dist_df['distance'].to_numpy()<=iso_radius].assign(distance=0)
+    if presolve:
+        dest_df, cover_df, _ = model_presolve.reduce_destinations(dest_df, cover_df, 
+                                                    min_destinations=min_destinations)
+    coverable = orig_df['id'].isin(set(cover_df['origin'])).to_numpy()
+    if not coverable.all():
+        logging.info(f'{(~coverable).sum()} origins (population '
+                     f'{orig_df["population"].to_numpy()[~coverable].sum()}) '
+                     f'have no destination within iso_radius={iso_radius}')
+    return dest_df, dist_df, cover_df, coverable
+
+def _get_isochrone_assignment_df(open_dests, dist_df, orig_df):
+    # each origin's nearest open destination (origins with none are left out)
+    open_dist_df = dist_df[dist_df['destination'].isin(set(open_dests)).to_numpy()]
+    nearest = open_dist_df['distance'].groupby(open_dist_df['origin'], sort=False).idxmin()
+    open_dist_df = open_dist_df.loc[nearest.to_numpy()].drop(columns=['population'])
     assignment_df = (
         orig_df[['id','population']]
         .rename(columns={'id':'origin'})
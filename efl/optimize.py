@@ -1,17 +1,57 @@
 import sys
 import os
 import efl.data as data
+import efl.distance as distance
 import efl.model as model
+import efl.cache as result_cache
+import efl.profiling as profiling
 import pandas as pd
 import click
+import logging
+import inspect
+import numbers
+import concurrent.futures
+import contextlib
+import functools
+import time
 
 import importlib
 importlib.reload(model)
 
-@click.command()
+class _DefaultGroup(click.Group):
+    # arguments that don't start with a subcommand go to 'run', so 
+    # `efl origins.csv ...` keeps working next to `efl sweep ...`
+    def parse_args(self, ctx, args):
+        if len(args)>0 and args[0] not in self.commands and args[0]!='--help':
+            args = ['run'] + list(args)
+        return super().parse_args(ctx, args)
+
+class _DistanceArgument(click.Path):
+    # an existing distance file, or a metric name: distances are then 
+    # computed from the coordinates in the origin and destination files
+    def convert(self, value, param, ctx):
+        if _is_metric(value):
+            return value
+        return super().convert(value, param, ctx)
+
+@click.group(cls=_DefaultGroup)
+def main():
+    """Equitable facility location (the default command is 'run')"""
+
+def _profiled(function):
+    # run function under the profiler of its profile and out_file 
+    # arguments (see _get_profiler)
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        out_file = kwargs.get('out_file')
+        with _get_profiler(kwargs.get('profile', False), getattr(out_file, 'name', out_file)):
+            return function(*args, **kwargs)
+    return wrapper
+
+@main.command('run')
 @click.argument('origin_file', type=click.File('r'))
 @click.argument('destination_file', type=click.File('r'))
-@click.argument('distance_file', type=click.File('r'))
+@click.argument('distance_file', type=_DistanceArgument(exists=True, dir_okay=False))
 @click.argument('out_file', type=click.File('w'))
 @click.option('--minimize', default='ede', type=click.Choice(['ede', 'locations'], case_sensitive=False),
               help='value to minimize (default: ede)')
@@ -29,7 +69,11 @@ importlib.reload(model)
               help='maximum distance that can be assigned (default: none)')
 @click.option('--capacity', default=None, type=click.FloatRange(0,max=None,min_open=True), 
               help='capacity on all destinations not capacitated in destinations file (default: none)')
-@click.option('--solver', default='scip', type=click.Choice(['scip', 'gurobi'], case_sensitive=False),
+@click.option('--sparse', default=False, type=click.BOOL,
+              help='join only the distance rows that exist; missing pairs are allowed (default: False)')
+@click.option('--k_nearest', default=None, type=click.IntRange(1,),
+              help='(sparse) keep only the k nearest destinations of each origin (default: all)')
+@click.option('--solver', default='scip', type=click.Choice(['scip', 'gurobi', 'heuristic', 'lagrangian'], case_sensitive=False),
               help='(default: scip)')
 @click.option('--time_limit', default=None, type=click.FloatRange(0,max=None,min_open=True), 
               help='solver: time limit in seconds (returns best solutions so far)')
@@ -37,12 +81,24 @@ importlib.reload(model)
               help='solver: MIP optimality gap')
 @click.option('--tee', default=None, type=click.BOOL,
               help='print solver output to screen (default: False)')
+@click.option('--backend', default='rules', type=click.Choice(['rules', 'matrix'], case_sensitive=False),
+              help='model construction: pyomo rules or numpy/CSR matrix (default: rules)')
+@click.option('--cache_dir', default=None, type=click.Path(file_okay=False),
+              help='reuse results of identical runs stored in this directory (default: no cache)')
+@click.option('--trusted_dir', default=None, type=click.Path(file_okay=False),
+              help='skip validating a distance file that is unchanged since it passed (records in this directory)')
+@click.option('--formulation', default='pairs', type=click.Choice(['pairs', 'radius'], case_sensitive=False),
+              help='assignment variables per (origin, destination) pair, or per distinct distance of each origin (no capacities) (default: pairs)')
+@click.option('--profile', is_flag=True, default=False,
+              help='profile the run and write out_file_profile.txt and out_file_profile_<phase>.prof')
 
+@_profiled
 def cli(origin_file, destination_file, distance_file, out_file, *,
         minimize, num_locations, target_ede,
         aversion, scaling_factor,
-        min_percent, radius, capacity,
-        solver, time_limit, mip_gap, tee):
+        min_percent, radius, capacity, sparse, k_nearest,
+        solver, time_limit, mip_gap, tee, backend, cache_dir, trusted_dir, formulation,
+        profile=False):
     """Command line interface to run equitable facility location
     model and send output to two csv files:
     out_file -- origin, destination, distance, population
@@ -51,7 +107,10 @@ def cli(origin_file, destination_file, distance_file, out_file, *,
     Required arguments:
     origin_file -- path to origin data (csv)
     destination_file -- path to destination data (csv)
-    distance_file -- path to lookup table for statistics (csv)
+    distance_file -- path to lookup table for statistics (csv, parquet, 
+    feather/arrow or npz; see 'convert'), or 'euclidean', 'manhattan' or 
+    'haversine' to compute distances from the x, y (lon, lat) columns of the
+    origin and destination files (with sparse, only within radius/k_nearest)
     out_file -- path to out file (csv)
 
     Keyword arguments (model):
@@ -63,57 +122,86 @@ def cli(origin_file, destination_file, distance_file, out_file, *,
     min_percent -- min % of open='percent' destinations to select (default: 0)
     radius -- max distance to include in optimization
     capacity -- assigned to destinations with no individual capacity
+    sparse -- join only the distance rows that exist (default: False)
+    k_nearest -- (sparse) keep each origin's k nearest destinations
 
     Keyword arguments (solver):
-    solver -- 'scip' or 'gurobi' (default: 'scip')
+    solver -- 'scip', 'gurobi', 'heuristic' or 'lagrangian' (default: 'scip')
     time_limit -- max solver time (seconds)
     mip_gap -- min optimality gap
     tee -- print solver output to screen (default: False)
+    backend -- 'rules' or 'matrix' model construction (default: 'rules')
+    cache_dir -- directory of cached results (default: no cache)
+    trusted_dir -- directory of distance file validation records (default: always validate)
+    formulation -- 'pairs' or 'radius' (default: 'pairs')
+    profile -- profile the run and write out_file_profile.txt and 
+    out_file_profile_<phase>.prof (see profiling.Profiler) (default: False)
     """
 
     # check if all the data looks ok; exit if not
     print(f'cli {mip_gap =}')
+    profiling.begin('validation')
+    start_time = time.time()
     orig_df = data.validate_origin_df(pd.read_csv(origin_file))
     dest_df = data.validate_destination_df(pd.read_csv(destination_file), capacity)
-    dist_lookup_df = data.validate_distance_df(pd.read_csv(distance_file))
+    dist_lookup_df = _get_distance_lookup(distance_file, orig_df, dest_df, 
+                                          radius=radius if sparse else None,
+                                          k_nearest=k_nearest if sparse else None, 
+                                          trusted_dir=trusted_dir)
+    validation_time = time.time() - start_time
+    profiling.end('validation')
     if any(df is None for df in [orig_df, dest_df, dist_lookup_df]):
         print('Data has errors. See logs.')
         return 1 # 1 means data error (0 means success)
     
+    options = dict(minimize=minimize, num_locations=num_locations, target_ede=target_ede,
+                   aversion=aversion, scaling_factor=scaling_factor,
+                   min_percent=min_percent, radius=radius,
+                   sparse=sparse, k_nearest=k_nearest,
+                   solver=solver, time_limit=time_limit, mip_gap=mip_gap,
+                   backend=backend, formulation=formulation)
     try:
-        results = _run_optimization(orig_df, dest_df, dist_lookup_df, 
-                        minimize=minimize, num_locations=num_locations, target_ede=target_ede,
-                        aversion=aversion, scaling_factor=scaling_factor,
-                        min_percent=min_percent, radius=radius,
-                        solver=solver, time_limit=time_limit, mip_gap=mip_gap,
-                        tee = tee)   
+        results = _run_with_cache(cache_dir, [orig_df, dest_df, dist_lookup_df], 
+                        _get_cache_parameters('run', options, capacity),
+                        lambda: _run_optimization(orig_df, dest_df, dist_lookup_df, 
+                                                  tee=tee, **options))
     except ValueError as e:
         print(f'Error: {e}')
         return 1
     
     # add parameters that don't get passed to the model module
+    _add_timing(results, 'validation', validation_time)
     results.parameters_dict['capacity'] = capacity
+    results.parameters_dict['sparse'] = sparse
+    results.parameters_dict['k_nearest'] = k_nearest
     results.parameters_dict['origin_file'] = origin_file.name
     results.parameters_dict['destination_file'] = destination_file.name
-    results.parameters_dict['distance_file'] = distance_file.name
+    results.parameters_dict['distance_file'] = distance_file
     results.parameters_dict['out_file'] = out_file.name
 
     _print_to_files(results, out_file.name)
 
     return 0
 
+@_profiled
 def run(origin_df, destination_df, distance_lookup_df, *, 
         out_file=None, minimize='ede', num_locations=None, target_ede=None,
         aversion=-1, scaling_factor=None,
         min_percent=0, radius=None, capacity=None,
-        solver='scip', time_limit=None, mip_gap=None, tee=None):
+        sparse=False, k_nearest=None,
+        solver='scip', time_limit=None, mip_gap=None, tee=None, backend='rules',
+        initial_open=None, threads=None, cache=None, formulation='pairs', profile=False):
     """Run equitable facility location model and return
     equitable_facility_location.model.Results object
 
     Required arguments:
     origin_df -- origin data (pandas DataFrame)
     destination_df -- destination data (pandas DataFrame)
-    distance_lookup_df -- distance lookup table (pandas DataFrame)
+    distance_lookup_df -- distance lookup table (pandas DataFrame or path to a 
+    csv, parquet, feather/arrow or npz file), or 'euclidean', 'manhattan' or
+    'haversine' to compute distances from the coordinates of the origins and
+    destinations (see distance.get_distance_df; with sparse, only the pairs 
+    within radius and/or the k_nearest of each origin)
 
     Keyword arguments (model):
     out_file -- path to csv for results (default: None)
@@ -125,34 +213,65 @@ def run(origin_df, destination_df, distance_lookup_df, *,
     min_percent -- min % of open='percent' dests to select (default: 0)
     radius -- max distance to include in optimization
     capacity -- assigned to dests with no individual capacity
+    sparse -- join only the distance rows that exist (default: False)
+    k_nearest -- (sparse) keep each origin's k nearest destinations
 
     Keyword arguments (solver):
-    solver -- 'scip' or 'gurobi' (default: 'scip')
+    solver -- 'scip', 'gurobi', 'heuristic' (greedy + interchange; 
+    no capacities) or 'lagrangian' (lagrangian bounds; minimize='ede',
+    no capacities) (default: 'scip')
     time_limit -- max solver time (seconds)
     mip_gap -- min optimality gap
     tee -- print solver output to screen (default: False)
+    backend -- 'rules' or 'matrix' model construction (default: 'rules')
+    initial_open -- destination ids to warm start the solver from, e.g. 
+    destinations of a heuristic solution; with solver='scip' this needs 
+    pyscipopt, otherwise the start is dropped with a warning (default: None)
+    threads -- max number of solver threads (default: solver default)
+    cache -- cache.ResultCache or directory: return the stored results of an 
+    identical run (same data and parameters) or store these (default: None)
+    formulation -- 'pairs' (one assignment variable per origin, destination 
+    pair) or 'radius' (one per distinct distance of each origin; smaller and 
+    tighter, no capacities) (default: 'pairs')
+    profile -- profile the phases of the run (cProfile, tracemalloc and peak 
+    RSS) and write out_file_profile.txt and out_file_profile_<phase>.prof, 
+    or profile.txt and profile_<phase>.prof if profile is a path prefix 
+    (see profiling.Profiler) (default: False)
     """
     
+    profiling.begin('validation')
+    start_time = time.time()
     orig_df = data.validate_origin_df(origin_df)
     dest_df = data.validate_destination_df(destination_df, capacity)
-    dist_lookup_df = data.validate_distance_df(distance_lookup_df)
+    dist_lookup_df = _get_distance_lookup(distance_lookup_df, orig_df, dest_df, 
+                                          radius=radius if sparse else None,
+                                          k_nearest=k_nearest if sparse else None)
+    validation_time = time.time() - start_time
+    profiling.end('validation')
     if any(df is None for df in [orig_df, dest_df, dist_lookup_df]):
         print('Data has errors. See logs.')
         return 1 # 1 means data error (0 means success)
     
+    options = dict(minimize=minimize, num_locations=num_locations, target_ede=target_ede,
+                   aversion=aversion, scaling_factor=scaling_factor,
+                   min_percent=min_percent, radius=radius,
+                   sparse=sparse, k_nearest=k_nearest,
+                   solver=solver, time_limit=time_limit, mip_gap=mip_gap, 
+                   backend=backend, initial_open=initial_open, formulation=formulation)
     try:
-        results = _run_optimization(orig_df, dest_df, dist_lookup_df, 
-                            minimize=minimize, num_locations=num_locations, target_ede=target_ede,
-                            aversion=aversion, scaling_factor=scaling_factor,
-                            min_percent=min_percent, radius=radius,
-                            solver=solver, time_limit=time_limit, mip_gap=mip_gap, 
-                            tee=tee)
+        results = _run_with_cache(cache, [orig_df, dest_df, dist_lookup_df], 
+                        _get_cache_parameters('run', options, capacity),
+                        lambda: _run_optimization(orig_df, dest_df, dist_lookup_df, 
+                                                  tee=tee, threads=threads, **options))
     except ValueError as e:
         print(f'Error: {e}')
         return 1
 
     # add parameters that don't get passed to the model module
+    _add_timing(results, 'validation', validation_time)
     results.parameters_dict['capacity'] = capacity
+    results.parameters_dict['sparse'] = sparse
+    results.parameters_dict['k_nearest'] = k_nearest
     results.parameters_dict['out_file'] = out_file
     if out_file is not None:
         _print_to_files(results, out_file)
@@ -162,18 +281,23 @@ def run(origin_df, destination_df, distance_lookup_df, *,
 def _run_optimization(orig_df, dest_df, dist_lookup_df, *, 
             minimize='ede', num_locations=None, target_ede=None,
             aversion=-1, scaling_factor=None,
-            min_percent=0, radius=None,
-            solver='scip', time_limit=None, mip_gap=None, tee=None):
+            min_percent=0, radius=None, sparse=False, k_nearest=None,
+            solver='scip', time_limit=None, mip_gap=None, tee=None, backend='rules',
+            initial_open=None, threads=None, formulation='pairs'):
     
     if minimize=='ede' and num_locations is None:
         raise ValueError(f'if minimize=ede then num_locations must be set')
     if minimize=='locations' and target_ede is None:
         raise ValueError(f'if minimize=locations then target_ede must be set')
     
-    dist_df = data.build_dist_df(orig_df, dest_df, dist_lookup_df)
+    profiling.begin('build_dist_df')
+    start_time = time.time()
+    dist_df = data.build_dist_df(orig_df, dest_df, dist_lookup_df, 
+                                 sparse=sparse, radius=radius, k_nearest=k_nearest)
     if dist_df is None:
-        print('Data has errors. See logs.')
-        return 1
+        raise ValueError('distance data has errors (see logs)')
+    build_time = time.time() - start_time
+    profiling.end('build_dist_df')
     
     print(f'minimizing {minimize}')
     results = model.optimize(
@@ -182,13 +306,24 @@ def _run_optimization(orig_df, dest_df, dist_lookup_df, *,
                         aversion=aversion, scaling_factor=scaling_factor,
                         min_percent=min_percent, radius=radius,
                         solver=solver, time_limit=time_limit, mip_gap=mip_gap, 
-                        tee=tee
+                        tee=tee, backend=backend, initial_open=initial_open,
+                        threads=threads, formulation=formulation
                         )
+    _add_timing(results, 'build_dist_df', build_time)
 
     return results
 
 def _print_to_files(results, out_file):
     out_file_stripped = _remove_csv(out_file)
+    summary_dict = _get_summary_dict(results)
+    summary_df = pd.DataFrame(summary_dict.items(), columns=['parameter','value'])
+
+    results.assignment_df.to_csv(out_file_stripped+'.csv', index=False)
+    summary_df.to_csv(out_file_stripped+'_summary.csv', index=False)
+
+    return 0
+
+def _get_summary_dict(results):
     summary_dict = results.parameters_dict.copy()
     summary_dict['solver_wall_time'] = results.solver_wall_time
     summary_dict['solver_mip_gap'] = results.solver_mip_gap
@@ -197,11 +332,549 @@ def _print_to_files(results, out_file):
     summary_dict['num_locations_out'] = results.num_locations_out()
     summary_dict['mean_distance_out'] = results.mean_distance_out()
     summary_dict['ede_out'] = results.ede_out()
-    summary_df = pd.DataFrame(summary_dict.items(), columns=['parameter','value'])
+    summary_dict.update(results.stats_out())
+    return summary_dict
 
-    results.assignment_df.to_csv(out_file_stripped+'.csv', index=False)
-    summary_df.to_csv(out_file_stripped+'_summary.csv', index=False)
+def _add_timing(results, phase, seconds):
+    # record a phase that ran before the model module (listed first)
+    results.timings = {phase:seconds, **results.timings}
+
+def _get_profiler(profile, out_file):
+    # profiling.Profiler writing next to out_file (or to the path prefix 
+    # profile), or a context that does nothing if profile is False
+    if not profile:
+        return contextlib.nullcontext()
+    if isinstance(profile, str):
+        return profiling.Profiler(profile)
+    if out_file is None:
+        raise ValueError('profile=True writes next to out_file; set out_file or pass a path prefix as profile')
+    return profiling.Profiler(_remove_csv(out_file)+'_profile')
+
+def _get_distance_lookup(distance_lookup, orig_df, dest_df, *, radius=None, k_nearest=None, 
+                         trusted_dir=None):
+    # validated distance lookup dataframe from a dataframe, a file path or a
+    # metric name (computed from the coordinates of the origins and 
+    # destinations, only within radius/k_nearest); files are read only for
+    # the validated origins and destinations (and not validated again if 
+    # they are trusted, see data.read_distance_file)
+    if isinstance(distance_lookup, pd.DataFrame):
+        return data.validate_distance_df(distance_lookup)
+    if orig_df is None or dest_df is None:
+        return None
+    if _is_metric(distance_lookup):
+        try:
+            return distance.get_distance_df(orig_df, dest_df, distance_lookup, 
+                                            radius=radius, k_nearest=k_nearest)
+        except ValueError as e:
+            logging.error(e)
+            return None
+    return data.read_distance_file(distance_lookup, origins=orig_df['id'], 
+                                   destinations=dest_df['id'], radius=radius, 
+                                   trusted_dir=trusted_dir)
+
+def _is_metric(distance_lookup):
+    # a metric name that is not also the path of a file
+    return (isinstance(distance_lookup, str) and distance_lookup in distance.METRICS 
+            and not os.path.exists(distance_lookup))
+
+def _run_with_cache(cache, dfs, cache_parameters, run_function):
+    # stored results of an identical run, or run_function() (then stored)
+    cache = result_cache.get_cache(cache)
+    if cache is None:
+        return run_function()
+    key = cache.get_key(dfs, cache_parameters)
+    results = cache.get(key)
+    if results is None:
+        results = run_function()
+        cache.put(key, results)
+    else:
+        print(f'using cached results {key}')
+    return results
+
+def _get_cache_parameters(model_name, options, capacity):
+    # parameters that change the results, completed with the defaults of 
+    # the run function so that every entry point (cli, run, batch) builds 
+    # the same key; the unused one of num_locations and 
+    # target_ede/percent_coverage is dropped so equivalent runs share a key
+    run_function = _run_optimization if model_name=='run' else _run_isochrone
+    parameters = dict(_get_run_defaults(run_function), **options)
+    parameters.update(model=model_name, capacity=capacity)
+    for name, value in parameters.items(): # e.g. aversion -1 (run) and -1.0 (cli)
+        if isinstance(value, numbers.Real) and not isinstance(value, bool):
+            parameters[name] = float(value)
+    if parameters.get('initial_open') is not None:
+        parameters['initial_open'] = sorted(str(dest) for dest in parameters['initial_open'])
+    if model_name=='run':
+        unused = 'target_ede' if parameters['minimize']=='ede' else 'num_locations'
+    else:
+        unused = 'percent_coverage' if parameters['minimize']=='uncovered' else 'num_locations'
+    parameters[unused] = None
+    return parameters
+
+def _get_run_defaults(run_function):
+    # keyword defaults of _run_optimization or _run_isochrone (but tee and 
+    # threads, which don't change the results)
+    return {name:parameter.default 
+            for name, parameter in inspect.signature(run_function).parameters.items()
+            if parameter.kind==parameter.KEYWORD_ONLY and name not in ['tee', 'threads']}
+
+@main.command('sweep')
+@click.argument('origin_file', type=click.File('r'))
+@click.argument('destination_file', type=click.File('r'))
+@click.argument('distance_file', type=_DistanceArgument(exists=True, dir_okay=False))
+@click.argument('out_file', type=click.File('w'))
+@click.option('--minimize', default='ede', type=click.Choice(['ede', 'locations'], case_sensitive=False),
+              help='value to minimize (default: ede)')
+@click.option('--num_locations', multiple=True, type=click.IntRange(1,), 
+              help='number of locations to open; repeat for each sweep value (required if minimize=ede)')
+@click.option('--target_ede', multiple=True, type=click.FloatRange(0,max=None,min_open=True), 
+              help='lower bound on ede; repeat for each sweep value (required if minimize=locations)')
+@click.option('--aversion', multiple=True, default=[-1], type=click.FloatRange(min=None,max=0), 
+              help='aversion to inequality parameter; repeat for each sweep value (default: -1)')
+@click.option('--scaling_factor', type=click.FloatRange(0,max=None,min_open=True),
+              help='("alpha") default: estimate based on data')
+@click.option('--min_percent', default=0, type=click.FloatRange(0,1),
+              help='minimum percentage of "percent" destinations to open (default: 0)')
+@click.option('--radius', type=click.FloatRange(0,max=None,min_open=True), 
+              help='maximum distance that can be assigned (default: none)')
+@click.option('--capacity', default=None, type=click.FloatRange(0,max=None,min_open=True), 
+              help='capacity on all destinations not capacitated in destinations file (default: none)')
+@click.option('--sparse', default=False, type=click.BOOL,
+              help='join only the distance rows that exist; missing pairs are allowed (default: False)')
+@click.option('--k_nearest', default=None, type=click.IntRange(1,),
+              help='(sparse) keep only the k nearest destinations of each origin (default: all)')
+@click.option('--solver', default='scip', type=click.Choice(['scip', 'gurobi'], case_sensitive=False),
+              help='(default: scip)')
+@click.option('--time_limit', default=None, type=click.FloatRange(0,max=None,min_open=True), 
+              help='solver: time limit in seconds per sweep point')
+@click.option('--mip_gap', default=None, type=click.FloatRange(0,1,min_open=True,max_open=True), 
+              help='solver: MIP optimality gap')
+@click.option('--tee', default=None, type=click.BOOL,
+              help='print solver output to screen (default: False)')
+@click.option('--backend', default='rules', type=click.Choice(['rules', 'matrix'], case_sensitive=False),
+              help='model construction: pyomo rules or numpy/CSR matrix (default: rules)')
+@click.option('--persistent', default=True, type=click.BOOL,
+              help='use the persistent solver interface if available (default: True)')
+@click.option('--trusted_dir', default=None, type=click.Path(file_okay=False),
+              help='skip validating a distance file that is unchanged since it passed (records in this directory)')
+@click.option('--formulation', default='pairs', type=click.Choice(['pairs', 'radius'], case_sensitive=False),
+              help='assignment variables per (origin, destination) pair, or per distinct distance of each origin (no capacities) (default: pairs)')
+def sweep_cli(origin_file, destination_file, distance_file, out_file, *,
+              minimize, num_locations, target_ede, aversion, scaling_factor,
+              min_percent, radius, capacity, sparse, k_nearest,
+              solver, time_limit, mip_gap, tee, backend, persistent, trusted_dir, formulation):
+    """Command line interface to solve the equitable facility location
+    model for every combination of the num_locations (or target_ede) and
+    aversion values, building the model once. Writes one pair of csv files
+    per sweep point (out_file_<i>, out_file_<i>_summary) and a table with
+    one row per point (out_file_sweep).
+
+    Arguments are as for 'run', except that --num_locations, --target_ede
+    and --aversion may be repeated, e.g. 
+    efl sweep ... --num_locations 4 --num_locations 5 --aversion -1 --aversion -2
+    """
+    orig_df = data.validate_origin_df(pd.read_csv(origin_file))
+    dest_df = data.validate_destination_df(pd.read_csv(destination_file), capacity)
+    dist_lookup_df = _get_distance_lookup(distance_file, orig_df, dest_df, 
+                                          radius=radius if sparse else None,
+                                          k_nearest=k_nearest if sparse else None, 
+                                          trusted_dir=trusted_dir)
+    if any(df is None for df in [orig_df, dest_df, dist_lookup_df]):
+        print('Data has errors. See logs.')
+        return 1 # 1 means data error (0 means success)
+
+    try:
+        results_list = _run_sweep(orig_df, dest_df, dist_lookup_df, 
+                        minimize=minimize, num_locations=list(num_locations), 
+                        target_ede=list(target_ede), aversion=list(aversion), 
+                        scaling_factor=scaling_factor,
+                        min_percent=min_percent, radius=radius,
+                        sparse=sparse, k_nearest=k_nearest,
+                        solver=solver, time_limit=time_limit, mip_gap=mip_gap,
+                        tee=tee, backend=backend, persistent=persistent,
+                        formulation=formulation)
+    except ValueError as e:
+        print(f'Error: {e}')
+        return 1
+
+    for results in results_list:
+        results.parameters_dict['capacity'] = capacity
+        results.parameters_dict['sparse'] = sparse
+        results.parameters_dict['k_nearest'] = k_nearest
+        results.parameters_dict['origin_file'] = origin_file.name
+        results.parameters_dict['destination_file'] = destination_file.name
+        results.parameters_dict['distance_file'] = distance_file
+        results.parameters_dict['out_file'] = out_file.name
+    _print_sweep_to_files(results_list, out_file.name)
+
+    return 0
+
+def sweep(origin_df, destination_df, distance_lookup_df, *, 
+          out_file=None, minimize='ede', num_locations=None, target_ede=None,
+          aversion=-1, scaling_factor=None,
+          min_percent=0, radius=None, capacity=None,
+          sparse=False, k_nearest=None,
+          solver='scip', time_limit=None, mip_gap=None, tee=None, 
+          backend='rules', persistent=True, formulation='pairs'):
+    """Run the equitable facility location model for every combination of
+    num_locations (or target_ede) and aversion values and return a list of
+    equitable_facility_location.model.Results objects (one per point).
+    Data is validated and the model is built once; between solves only 
+    the constraint right-hand sides or objective coefficients change and 
+    each solve is warm-started from the previous solution (gurobi, and scip 
+    through its direct or persistent interface, which needs pyscipopt).
+
+    Keyword arguments are as for run, except:
+    num_locations -- number or list of numbers (required if minimize = 'ede')
+    target_ede -- number or list of numbers (required if minimize = 'locations')
+    aversion -- number or list of numbers (default: -1)
+    persistent -- use the persistent solver interface if available (default: True)
+    out_file -- writes out_file_<i>.csv (+ _summary) per point and out_file_sweep.csv
+    """
+    orig_df = data.validate_origin_df(origin_df)
+    dest_df = data.validate_destination_df(destination_df, capacity)
+    dist_lookup_df = _get_distance_lookup(distance_lookup_df, orig_df, dest_df, 
+                                          radius=radius if sparse else None,
+                                          k_nearest=k_nearest if sparse else None)
+    if any(df is None for df in [orig_df, dest_df, dist_lookup_df]):
+        print('Data has errors. See logs.')
+        return 1 # 1 means data error (0 means success)
+
+    try:
+        results_list = _run_sweep(orig_df, dest_df, dist_lookup_df, 
+                        minimize=minimize, num_locations=num_locations, 
+                        target_ede=target_ede, aversion=aversion, 
+                        scaling_factor=scaling_factor,
+                        min_percent=min_percent, radius=radius,
+                        sparse=sparse, k_nearest=k_nearest,
+                        solver=solver, time_limit=time_limit, mip_gap=mip_gap,
+                        tee=tee, backend=backend, persistent=persistent,
+                        formulation=formulation)
+    except ValueError as e:
+        print(f'Error: {e}')
+        return 1
+
+    for results in results_list:
+        results.parameters_dict['capacity'] = capacity
+        results.parameters_dict['sparse'] = sparse
+        results.parameters_dict['k_nearest'] = k_nearest
+        results.parameters_dict['out_file'] = out_file
+    if out_file is not None:
+        _print_sweep_to_files(results_list, out_file)
+
+    return results_list
+
+def _run_sweep(orig_df, dest_df, dist_lookup_df, *, 
+               minimize='ede', num_locations=None, target_ede=None,
+               aversion=-1, scaling_factor=None,
+               min_percent=0, radius=None, sparse=False, k_nearest=None,
+               solver='scip', time_limit=None, mip_gap=None, tee=None, 
+               backend='rules', persistent=True, formulation='pairs'):
+    points = _get_sweep_points(minimize, num_locations, target_ede, aversion)
+
+    dist_df = data.build_dist_df(orig_df, dest_df, dist_lookup_df, 
+                                 sparse=sparse, radius=radius, k_nearest=k_nearest)
+    if dist_df is None:
+        raise ValueError('distance data has errors (see logs)')
+
+    print(f'minimizing {minimize} at {len(points)} sweep points')
+    results_list = model.optimize_sweep(
+                        orig_df, dest_df, dist_df, minimize, points,
+                        scaling_factor=scaling_factor,
+                        min_percent=min_percent, radius=radius,
+                        solver=solver, time_limit=time_limit, mip_gap=mip_gap, 
+                        tee=tee, backend=backend, persistent=persistent,
+                        formulation=formulation
+                        )
+
+    return results_list
+
+def _get_sweep_points(minimize, num_locations, target_ede, aversion):
+    # list of parameter dicts, grouped by aversion so coefficients change least often
+    if minimize=='ede':
+        name, values = 'num_locations', num_locations
+    else:
+        name, values = 'target_ede', target_ede
+    values = _as_list(values)
+    if len(values)==0:
+        raise ValueError(f'if minimize={minimize} then {name} must be set')
+    return [{'aversion':a, name:v} for a in _as_list(aversion) for v in values]
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
 
+def _print_sweep_to_files(results_list, out_file):
+    out_file_stripped = _remove_csv(out_file)
+    summary_rows = []
+    for i, results in enumerate(results_list):
+        _print_to_files(results, f'{out_file_stripped}_{i}.csv')
+        summary_rows.append(_get_summary_dict(results))
+    pd.DataFrame(summary_rows).to_csv(out_file_stripped+'_sweep.csv', index=False)
+
+    return 0
+
+@main.command('batch')
+@click.argument('origin_file', type=click.File('r'))
+@click.argument('destination_file', type=click.File('r'))
+@click.argument('distance_file', type=_DistanceArgument(exists=True, dir_okay=False))
+@click.argument('scenario_file', type=click.File('r'))
+@click.argument('out_file', type=click.File('w'))
+@click.option('--workers', default=None, type=click.IntRange(1,), 
+              help='number of worker processes (default: number of cpus)')
+@click.option('--solver_threads', default=None, type=click.IntRange(1,), 
+              help='max solver threads per worker (default: solver default)')
+@click.option('--tee', default=None, type=click.BOOL,
+              help='print solver output to screen (default: False)')
+@click.option('--cache_dir', default=None, type=click.Path(file_okay=False),
+              help='reuse results of identical runs stored in this directory (default: no cache)')
+@click.option('--trusted_dir', default=None, type=click.Path(file_okay=False),
+              help='skip validating a distance file that is unchanged since it passed (records in this directory)')
+def batch_cli(origin_file, destination_file, distance_file, scenario_file, out_file, *,
+              workers, solver_threads, tee, cache_dir, trusted_dir):
+    """Command line interface to run one equitable facility location 
+    (or isochrone) model per row of scenario_file in parallel. Writes one 
+    pair of csv files per scenario (out_file_<i>, out_file_<i>_summary) and
+    a table with one row per scenario (out_file_batch), appended as 
+    scenarios finish.
+
+    scenario_file columns are 'run' options (minimize, num_locations, 
+    target_ede, aversion, radius, capacity, solver, ...); rows with an 
+    iso_radius are isochrone models (minimize, num_locations, 
+    percent_coverage, ...). Empty cells use the defaults; 'to_open' is 
+    read as num_locations and 'name' labels the scenario.
+    """
+    orig_df = data.validate_origin_df(pd.read_csv(origin_file))
+    dest_df = data.validate_destination_df(pd.read_csv(destination_file))
+    dist_lookup_df = _get_distance_lookup(distance_file, orig_df, dest_df, 
+                                          trusted_dir=trusted_dir)
+    if any(df is None for df in [orig_df, dest_df, dist_lookup_df]):
+        print('Data has errors. See logs.')
+        return 1 # 1 means data error (0 means success)
+
+    try:
+        scenarios = _get_scenarios(pd.read_csv(scenario_file))
+        _run_batch(orig_df, dest_df, dist_lookup_df, scenarios, 
+                   out_file=out_file.name, workers=workers, 
+                   solver_threads=solver_threads, tee=tee, cache=cache_dir)
+    except ValueError as e:
+        print(f'Error: {e}')
+        return 1
+
+    return 0
+
+def batch(origin_df, destination_df, distance_lookup_df, scenarios, *, 
+          out_file=None, workers=None, solver_threads=None, tee=None, cache=None):
+    """Run one equitable facility location (or isochrone) model per 
+    scenario across a process pool and return a list of 
+    equitable_facility_location.model.Results objects in scenario order 
+    (None for a scenario that failed; see logs and out_file_batch).
+    Data is validated once and sent to each worker once.
+
+    Keyword arguments:
+    scenarios -- scenario table (pandas DataFrame or list of dicts): one 
+    row per scenario, columns are keyword arguments of run or, for rows 
+    with an iso_radius, of run_isochrone; empty cells use the defaults, 
+    'to_open' is read as num_locations and 'name' labels the scenario
+    out_file -- writes out_file_<i>.csv (+ _summary) per scenario and 
+    out_file_batch.csv with one row per scenario, appended as scenarios finish
+    workers -- number of worker processes; 1 runs in this process 
+    (default: number of cpus)
+    solver_threads -- max solver threads per worker (default: solver default)
+    tee -- print solver output to screen (default: False)
+    cache -- cache.ResultCache or directory shared by the workers (default: None)
+    """
+    orig_df = data.validate_origin_df(origin_df)
+    dest_df = data.validate_destination_df(destination_df)
+    dist_lookup_df = _get_distance_lookup(distance_lookup_df, orig_df, dest_df)
+    if any(df is None for df in [orig_df, dest_df, dist_lookup_df]):
+        print('Data has errors. See logs.')
+        return 1 # 1 means data error (0 means success)
+
+    try:
+        scenarios = _get_scenarios(pd.DataFrame(scenarios))
+        results_list = _run_batch(orig_df, dest_df, dist_lookup_df, scenarios, 
+                                  out_file=out_file, workers=workers, 
+                                  solver_threads=solver_threads, tee=tee, cache=cache)
+    except ValueError as e:
+        print(f'Error: {e}')
+        return 1
+
+    return results_list
+
+# scenario columns (keyword arguments of _run_optimization / _run_isochrone)
+_SCENARIO_COLUMNS = ['name', 'minimize', 'num_locations', 'target_ede', 'aversion', 
+                     'scaling_factor', 'min_percent', 'radius', 'capacity', 
+                     'sparse', 'k_nearest', 'solver', 'time_limit', 'mip_gap', 
+                     'backend', 'formulation', 'iso_radius', 'percent_coverage']
+_ISOCHRONE_COLUMNS = ['name', 'minimize', 'num_locations', 'iso_radius', 
+                      'percent_coverage', 'min_percent', 'radius', 'capacity', 
+                      'sparse', 'k_nearest', 'solver', 'time_limit', 'mip_gap']
+# columns of out_file_batch.csv
+_BATCH_COLUMNS = ['scenario', 'name', 'status', 'error', 
+                  'minimize', 'num_locations', 'target_ede', 'iso_radius', 
+                  'percent_coverage', 'aversion', 'scaling_factor', 'min_percent', 
+                  'radius', 'capacity', 'sparse', 'k_nearest', 'solver', 
+                  'time_limit', 'mip_gap', 'backend', 'formulation', 'out_file',
+                  'solver_wall_time', 'solver_mip_gap', 'num_locations_out', 
+                  'mean_distance_out', 'ede_out', 'scaling_factor_out', 'aversion_out']
+
+def _get_scenarios(scenario_df):
+    # list of scenario dicts (empty cells dropped, types as for the cli)
+    scenario_df = scenario_df.rename(columns={'to_open':'num_locations'})
+    unknown = set(scenario_df.columns) - set(_SCENARIO_COLUMNS)
+    if len(unknown)>0:
+        raise ValueError(f'unknown scenario columns: {sorted(unknown)}')
+    scenarios = []
+    for i, row in enumerate(scenario_df.to_dict('records')):
+        scenario = {key:value for key, value in row.items() if not pd.isna(value)}
+        if 'iso_radius' in scenario:
+            unknown = set(scenario) - set(_ISOCHRONE_COLUMNS)
+            if len(unknown)>0:
+                raise ValueError(f'scenario {i}: {sorted(unknown)} do not apply to isochrone models')
+        for key in ['num_locations', 'k_nearest']:
+            if key in scenario:
+                scenario[key] = int(scenario[key])
+        if 'sparse' in scenario and isinstance(scenario['sparse'], str):
+            scenario['sparse'] = scenario['sparse'].strip().lower() in ['true', '1', 'yes']
+        scenarios.append(scenario)
+    if len(scenarios)==0:
+        raise ValueError('no scenarios supplied')
+    return scenarios
+
+def _run_batch(orig_df, dest_df, dist_lookup_df, scenarios, *, 
+               out_file=None, workers=None, solver_threads=None, tee=None, cache=None):
+    summary_file = None
+    if out_file is not None:
+        summary_file = _remove_csv(out_file)+'_batch.csv'
+        pd.DataFrame(columns=_BATCH_COLUMNS).to_csv(summary_file, index=False)
+
+    print(f'running {len(scenarios)} scenarios')
+    results_list = [None]*len(scenarios)
+    def record(outcome):
+        # keep results and append the summary row as soon as a scenario finishes
+        i, summary, results = outcome
+        results_list[i] = results
+        print(f'scenario {i}: {summary["status"]}')
+        if summary_file is not None:
+            (pd.DataFrame([summary])
+             .reindex(columns=_BATCH_COLUMNS)
+             .to_csv(summary_file, mode='a', header=False, index=False))
+
+    if workers==1: # run in this process
+        _init_batch_worker(orig_df, dest_df, dist_lookup_df)
+        for i, scenario in enumerate(scenarios):
+            record(_run_scenario(i, scenario, out_file, solver_threads, tee, cache))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_batch_worker, 
+                initargs=(orig_df, dest_df, dist_lookup_df)) as pool:
+            futures = [pool.submit(_run_scenario, i, scenario, out_file, solver_threads, tee, cache)
+                       for i, scenario in enumerate(scenarios)]
+            for future in concurrent.futures.as_completed(futures):
+                record(future.result())
+
+    return results_list
+
+# validated inputs of this (worker) process, set once by _init_batch_worker
+_batch_inputs = {}
+
+def _init_batch_worker(orig_df, dest_df, dist_lookup_df):
+    _batch_inputs['orig_df'] = orig_df
+    _batch_inputs['dest_df'] = dest_df
+    _batch_inputs['dist_lookup_df'] = dist_lookup_df
+
+def _run_scenario(i, scenario, out_file, solver_threads, tee, cache):
+    # return (i, summary row, Results or None)
+    scenario = scenario.copy()
+    summary = {'scenario':i, 'name':scenario.pop('name', None)}
+    capacity = scenario.pop('capacity', None)
+    iso_radius = scenario.pop('iso_radius', None)
+    if iso_radius is not None:
+        scenario.setdefault('solver', 'scip')
+    run_function = _run_optimization if iso_radius is None else _run_isochrone
+    options = dict(_get_run_defaults(run_function), **scenario)
+    orig_df = _batch_inputs['orig_df']
+    dest_df = data._include_capacity(_batch_inputs['dest_df'].copy(), capacity)
+    dist_lookup_df = _batch_inputs['dist_lookup_df']
+    try:
+        if iso_radius is None:
+            results = _run_with_cache(cache, [orig_df, dest_df, dist_lookup_df], 
+                            _get_cache_parameters('run', options, capacity),
+                            lambda: _run_optimization(orig_df, dest_df, dist_lookup_df, 
+                                        tee=tee, threads=solver_threads, **options))
+        else:
+            results = _run_with_cache(cache, [orig_df, dest_df, dist_lookup_df], 
+                            _get_cache_parameters('isochrone', dict(options, iso_radius=iso_radius), capacity),
+                            lambda: _run_isochrone(orig_df, dest_df, dist_lookup_df, iso_radius, 
+                                        tee=tee, threads=solver_threads, **options))
+    except Exception as e: # one failed scenario doesn't stop the batch
+        logging.error(f'scenario {i}: {e}')
+        summary.update(status='error', error=str(e))
+        return i, summary, None
+
+    results.parameters_dict['capacity'] = capacity
+    results.parameters_dict['sparse'] = options.get('sparse', False)
+    results.parameters_dict['k_nearest'] = options.get('k_nearest')
+    results.parameters_dict['out_file'] = None
+    if out_file is not None:
+        scenario_file = f'{_remove_csv(out_file)}_{i}.csv'
+        results.parameters_dict['out_file'] = scenario_file
+        if iso_radius is None:
+            _print_to_files(results, scenario_file)
+        else:
+            _print_to_files_isochrone(results, scenario_file)
+
+    if iso_radius is None:
+        summary.update(_get_summary_dict(results))
+    else:
+        summary.update(_get_isochrone_summary_dict(results))
+    summary['status'] = 'ok'
+    return i, summary, results
+
+@main.command('convert')
+@click.argument('distance_file', type=click.Path(exists=True, dir_okay=False))
+@click.argument('out_file', type=click.Path(dir_okay=False))
+@click.option('--dtype', default='float64', type=click.Choice(['float64', 'float32']),
+              help='(npz) distance type; float32 halves the file size (default: float64)')
+def convert_cli(distance_file, out_file, *, dtype):
+    """Convert a distance file (e.g. csv) to a format that loads faster:
+    parquet (.parquet), feather/arrow ipc (.feather, .arrow) or an 
+    origin x destination matrix (.npz), chosen by the extension of out_file.
+    """
+    try:
+        return data.convert_distance_file(distance_file, out_file, dtype=dtype)
+    except (ValueError, ImportError) as e:
+        print(f'Error: {e}')
+        return 1
+
+@main.command('benchmark')
+@click.argument('out_file', type=click.Path(dir_okay=False))
+@click.option('--sizes', default=None, 
+              help='origins x destinations of each instance, e.g. 1000x100,20000x1000 (default: benchmark.SIZES)')
+@click.option('--seeds', default=1, type=click.IntRange(1,), help='instances of each size (default: 1)')
+@click.option('--models', default='run,isochrone', help='run and/or isochrone (default: run,isochrone)')
+@click.option('--solver', default='scip', type=click.Choice(['scip', 'gurobi', 'heuristic', 'lagrangian'], case_sensitive=False),
+              help='solver of run (default: scip)')
+@click.option('--isochrone_solver', default='scip', type=click.Choice(['scip', 'gurobi', 'greedy'], case_sensitive=False),
+              help='solver of run_isochrone (default: scip)')
+@click.option('--time_limit', default=600, type=click.FloatRange(0,max=None,min_open=True),
+              help='solver time limit in seconds per run (default: 600)')
+def benchmark_cli(out_file, *, sizes, seeds, models, solver, isochrone_solver, time_limit):
+    """Time run and run_isochrone on synthetic instances of growing size
+    and write phase timings, peak memory and objective values to out_file
+    (csv; see benchmark.run_benchmark).
+    """
+    import efl.benchmark as benchmark # imports this module
+    options = {}
+    if sizes is not None:
+        options['sizes'] = [tuple(int(n) for n in size.split('x')) for size in sizes.split(',')]
+    benchmark.run_benchmark(out_file, seeds=range(seeds), models=models.split(','), 
+                            solver=solver, isochrone_solver=isochrone_solver, 
+                            time_limit=time_limit, **options)
     return 0
 
 def _remove_csv(out_file):
@@ -227,17 +900,24 @@ def _remove_csv(out_file):
 # Minimize the number of locations so that every resident is within x 
 # radius of an open location
 #########################################################################
+@_profiled
 def run_isochrone(origin_df, destination_df, distance_lookup_df, iso_radius, *, 
         out_file=None, minimize='uncovered', num_locations=None, percent_coverage=1,
         min_percent=0, radius=None, capacity=None,
-        solver=None, time_limit=None, mip_gap=None, tee=None):
+        sparse=False, k_nearest=None,
+        solver='scip', time_limit=None, mip_gap=None, tee=None, threads=None, cache=None,
+        profile=False):
     """Run isochrone optimization model and return
     equitable_facility_location.model.Results object
 
     Required arguments:
     origin_df -- origin data (pandas DataFrame)
     destination_df -- destination data (pandas DataFrame)
-    distance_lookup_df -- distance lookup table (pandas DataFrame)
+    distance_lookup_df -- distance lookup table (pandas DataFrame or path to a 
+    csv, parquet, feather/arrow or npz file), or 'euclidean', 'manhattan' or
+    'haversine' to compute distances from the coordinates of the origins and
+    destinations (see distance.get_distance_df; with sparse, only the pairs 
+    within radius and/or the k_nearest of each origin)
     iso_radius -- number in same units as distances
 
     Keyword arguments (model):
@@ -248,34 +928,54 @@ def run_isochrone(origin_df, destination_df, distance_lookup_df, iso_radius, *,
     min_percent -- min % of open='percent' dests to select (default: 0)
     radius -- max distance to include in optimization
     capacity -- assigned to dests with no individual capacity
+    sparse -- join only the distance rows that exist (default: False)
+    k_nearest -- (sparse) keep each origin's k nearest destinations
 
     Keyword arguments (solver):
-    solver -- 'scip' or 'gurobi' (default: 'scip')
+    solver -- 'scip', 'gurobi' or 'greedy' (lazy greedy + interchange 
+    heuristic, minimize='uncovered'; see run_isochrone_greedy for every 
+    number of locations at once) (default: 'scip')
     time_limit -- max solver time (seconds)
     mip_gap -- min optimality gap
     tee -- print solver output to screen (default: False)
+    threads -- max number of solver threads (default: solver default)
+    cache -- cache.ResultCache or directory: return the stored results of an 
+    identical run (same data and parameters) or store these (default: None)
+    profile -- profile the run as run does (default: False)
     """
     
+    profiling.begin('validation')
+    start_time = time.time()
     orig_df = data.validate_origin_df(origin_df)
     dest_df = data.validate_destination_df(destination_df, capacity)
-    dist_lookup_df = data.validate_distance_df(distance_lookup_df)
+    dist_lookup_df = _get_distance_lookup(distance_lookup_df, orig_df, dest_df, 
+                                          radius=radius if sparse else None,
+                                          k_nearest=k_nearest if sparse else None)
+    validation_time = time.time() - start_time
+    profiling.end('validation')
     if any(df is None for df in [orig_df, dest_df, dist_lookup_df]):
         print('Data has errors. See logs.')
         return 1 # 1 means data error (0 means success)
     
+    options = dict(minimize=minimize, num_locations=num_locations, 
+                   percent_coverage=percent_coverage,
+                   min_percent=min_percent, radius=radius,
+                   sparse=sparse, k_nearest=k_nearest,
+                   solver=solver, time_limit=time_limit, mip_gap=mip_gap)
     try:
-        results = _run_isochrone(orig_df, dest_df, dist_lookup_df, iso_radius,
-                            minimize=minimize, num_locations=num_locations, 
-                            percent_coverage=percent_coverage,
-                            min_percent=min_percent, radius=radius,
-                            solver=solver, time_limit=time_limit, mip_gap=mip_gap, 
-                            tee=tee)
+        results = _run_with_cache(cache, [orig_df, dest_df, dist_lookup_df], 
+                        _get_cache_parameters('isochrone', dict(options, iso_radius=iso_radius), capacity),
+                        lambda: _run_isochrone(orig_df, dest_df, dist_lookup_df, iso_radius, 
+                                               tee=tee, threads=threads, **options))
     except ValueError as e:
         print(f'Error: {e}')
         return 1
 
     # add parameters that don't get passed to the model module
+    _add_timing(results, 'validation', validation_time)
     results.parameters_dict['capacity'] = capacity
+    results.parameters_dict['sparse'] = sparse
+    results.parameters_dict['k_nearest'] = k_nearest
     results.parameters_dict['out_file'] = out_file
     if out_file is not None:
         _print_to_files_isochrone(results, out_file)
@@ -284,16 +984,20 @@ def run_isochrone(origin_df, destination_df, distance_lookup_df, iso_radius, *,
 
 def _run_isochrone(orig_df, dest_df, dist_lookup_df, iso_radius, *, 
             minimize='uncovered', num_locations=None, percent_coverage=1,
-            min_percent=0, radius=None,
-            solver=None, time_limit=None, mip_gap=None, tee=None):
+            min_percent=0, radius=None, sparse=False, k_nearest=None,
+            solver='scip', time_limit=None, mip_gap=None, tee=None, threads=None):
     
     if minimize=='uncovered' and num_locations is None:
         raise ValueError(f'if minimize=uncovered then num_locations must be set')
     
-    dist_df = data.build_dist_df(orig_df, dest_df, dist_lookup_df)
+    profiling.begin('build_dist_df')
+    start_time = time.time()
+    dist_df = data.build_dist_df(orig_df, dest_df, dist_lookup_df, 
+                                 sparse=sparse, radius=radius, k_nearest=k_nearest)
     if dist_df is None:
-        print('Data has errors. See logs.')
-        return 1
+        raise ValueError('distance data has errors (see logs)')
+    build_time = time.time() - start_time
+    profiling.end('build_dist_df')
     
     print(f'(isochrone) minimizing {minimize}')
     results = model.optimize_isochrone(
@@ -301,25 +1005,93 @@ def _run_isochrone(orig_df, dest_df, dist_lookup_df, iso_radius, *,
                         num_locations, percent_coverage=percent_coverage,
                         min_percent=min_percent, radius=radius,
                         solver=solver, time_limit=time_limit, mip_gap=mip_gap, 
-                        tee=tee
+                        tee=tee, threads=threads
                         )
+    _add_timing(results, 'build_dist_df', build_time)
 
     return results
 
 def _print_to_files_isochrone(results, out_file):
     out_file_stripped = _remove_csv(out_file)
+    summary_dict = _get_isochrone_summary_dict(results)
+    summary_df = pd.DataFrame(summary_dict.items(), columns=['parameter','value'])
+
+    results.assignment_df.to_csv(out_file_stripped+'.csv', index=False)
+    summary_df.to_csv(out_file_stripped+'_summary.csv', index=False)
+
+    return 0
+
+def _get_isochrone_summary_dict(results):
     summary_dict = results.parameters_dict.copy()
     summary_dict['solver_wall_time'] = results.solver_wall_time
     summary_dict['solver_mip_gap'] = results.solver_mip_gap
     summary_dict['num_locations_out'] = results.num_locations_out()
     summary_dict['mean_distance_out'] = results.mean_distance_out()
-    summary_df = pd.DataFrame(summary_dict.items(), columns=['parameter','value'])
+    summary_dict.update(results.stats_out())
+    return summary_dict
 
-    results.assignment_df.to_csv(out_file_stripped+'.csv', index=False)
-    summary_df.to_csv(out_file_stripped+'_summary.csv', index=False)
+def run_isochrone_greedy(origin_df, destination_df, distance_lookup_df, iso_radius, max_locations, *, 
+        out_file=None, min_percent=0, radius=None, capacity=None,
+        sparse=False, k_nearest=None, swaps=True):
+    """Run the lazy greedy maximal coverage heuristic once for every 
+    number of locations up to max_locations and return a dict of number 
+    of locations: equitable_facility_location.model.Results object 
+    (as run_isochrone with minimize='uncovered' and solver='greedy')
+
+    Required arguments:
+    (as run_isochrone)
+    max_locations -- largest number of locations to open
+
+    Keyword arguments:
+    out_file -- path to csv for results: out_file_{k}.csv (and _summary) 
+    for each number of locations k and out_file_greedy.csv with one 
+    summary row per k (default: None)
+    swaps -- improve each greedy solution by interchange (default: True)
+    (other arguments as in run_isochrone)
+    """
+    
+    orig_df = data.validate_origin_df(origin_df)
+    dest_df = data.validate_destination_df(destination_df, capacity)
+    dist_lookup_df = _get_distance_lookup(distance_lookup_df, orig_df, dest_df, 
+                                          radius=radius if sparse else None,
+                                          k_nearest=k_nearest if sparse else None)
+    if any(df is None for df in [orig_df, dest_df, dist_lookup_df]):
+        print('Data has errors. See logs.')
+        return 1 # 1 means data error (0 means success)
+    
+    dist_df = data.build_dist_df(orig_df, dest_df, dist_lookup_df, 
+                                 sparse=sparse, radius=radius, k_nearest=k_nearest)
+    if dist_df is None:
+        print('Error: distance data has errors (see logs)')
+        return 1
+    try:
+        results = model.optimize_isochrone_greedy(orig_df, dest_df, dist_df, iso_radius, 
+                                max_locations, min_percent=min_percent, radius=radius, swaps=swaps)
+    except ValueError as e:
+        print(f'Error: {e}')
+        return 1
+
+    # add parameters that don't get passed to the model module
+    for k_results in results.values():
+        k_results.parameters_dict['capacity'] = capacity
+        k_results.parameters_dict['sparse'] = sparse
+        k_results.parameters_dict['k_nearest'] = k_nearest
+        k_results.parameters_dict['out_file'] = out_file
+    if out_file is not None:
+        _print_greedy_to_files(results, out_file)
+
+    return results
+
+def _print_greedy_to_files(results, out_file):
+    out_file_stripped = _remove_csv(out_file)
+    summary_rows = []
+    for k, k_results in results.items():
+        _print_to_files_isochrone(k_results, f'{out_file_stripped}_{k}.csv')
+        summary_rows.append(_get_isochrone_summary_dict(k_results))
+    pd.DataFrame(summary_rows).to_csv(out_file_stripped+'_greedy.csv', index=False)
 
     return 0
 
 
 if __name__=='__main__':
-   cli()
+   main()
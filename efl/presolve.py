@@ -0,0 +1,224 @@
+# presolve reductions of the facility location models
+
+import numpy as np
+import pandas as pd
+import logging
+from efl.instance import _get_codes
+
+def reduce_destinations(dest_df, dist_df, *, min_destinations=0, max_dense_size=10**7):
+    """Remove destinations that never need to open: a destination that is
+    free to close (open is not 'yes' or 'percent') is removed if another
+    kept destination without a capacity is at least as near to every
+    origin (a duplicate, e.g. co-located sites, or a dominated site).
+    Opening the kept destination instead is never worse for the EDE or for
+    coverage, so the optimum does not change. Kept destinations keep their
+    ids, so solutions need no translation. Duplicates are found from the
+    distance profile of each destination; dominance needs a dense origin x
+    destination matrix and is only checked if it has at most max_dense_size
+    entries.
+
+    Returns (dest_df, dist_df, dict of removed id: kept id)
+
+    Keyword arguments:
+    min_destinations -- keep at least this many destinations, e.g.
+    num_locations (default: 0)
+    max_dense_size -- (default: 10**7)
+    """
+    dest_ids = dest_df['id'].to_numpy()
+    num_dests = len(dest_ids)
+    columns = set(dest_df.columns.values)
+    free = np.ones(num_dests, dtype=bool)
+    if 'open' in columns:
+        free = ~dest_df['open'].isin(['yes','percent']).to_numpy()
+    uncapacitated = np.ones(num_dests, dtype=bool)
+    if 'capacity' in columns:
+        uncapacitated = dest_df['capacity'].isna().to_numpy()
+
+    orig_code = pd.factorize(dist_df['origin'])[0]
+    dest_code = _get_codes(dist_df['destination'], dest_ids).astype(np.int64)
+    distance = dist_df['distance'].to_numpy(dtype=float)
+
+    kept_by = np.full(num_dests, -1) # destination that replaces a removed one
+    order = _remove_duplicates(kept_by, free, uncapacitated, orig_code, dest_code, distance, num_dests)
+    num_duplicates = len(order)
+    num_origs = orig_code.max()+1 if len(orig_code)>0 else 0
+    if num_origs*num_dests<=max_dense_size:
+        order += _remove_dominated(kept_by, free, uncapacitated, orig_code, dest_code, distance,
+                                   num_origs, num_dests)
+    else:
+        logging.info(f'presolve: dominance not checked ({num_origs} x {num_dests} distance matrix)')
+
+    # keep enough destinations (most recently removed first)
+    while num_dests-len(order)<min_destinations:
+        kept_by[order.pop()] = -1
+    num_duplicates = min(num_duplicates, len(order))
+    removed = kept_by>=0
+    if not removed.any():
+        return dest_df, dist_df, {}
+    logging.info(f'presolve: removed {num_duplicates} duplicate and '
+                 f'{len(order)-num_duplicates} dominated destinations of {num_dests}')
+
+    kept_ids = {}
+    for j in np.flatnonzero(removed):
+        k = kept_by[j]
+        while kept_by[k]>=0: # removed by a destination that was removed later
+            k = kept_by[k]
+        kept_ids[dest_ids[j]] = dest_ids[k]
+    dest_df = dest_df[~removed]
+    dist_df = dist_df[~removed[dest_code]]
+    return dest_df, dist_df, kept_ids
+
+def _remove_duplicates(kept_by, free, uncapacitated, orig_code, dest_code, distance, num_dests):
+    # destinations with identical (origin, distance) profiles: keep the first
+    # uncapacitated one (preferring 'yes'/'percent', which always stay)
+    order = np.lexsort((orig_code, dest_code))
+    indptr = np.zeros(num_dests+1, dtype=np.int64)
+    np.cumsum(np.bincount(dest_code, minlength=num_dests), out=indptr[1:])
+    sorted_orig = orig_code[order]
+    sorted_distance = distance[order]
+    groups = {}
+    for j in range(num_dests):
+        rows = slice(indptr[j], indptr[j+1])
+        key = sorted_orig[rows].tobytes() + sorted_distance[rows].tobytes()
+        groups.setdefault(key, []).append(j)
+
+    removed = []
+    for members in groups.values():
+        if len(members)<2:
+            continue
+        keepers = [j for j in members if uncapacitated[j] and not free[j]]
+        keepers += [j for j in members if uncapacitated[j] and free[j]]
+        if len(keepers)==0:
+            continue
+        for j in members:
+            if free[j] and j!=keepers[0]:
+                kept_by[j] = keepers[0]
+                removed.append(j)
+    return removed
+
+def _remove_dominated(kept_by, free, uncapacitated, orig_code, dest_code, distance,
+                      num_origs, num_dests):
+    # destinations with a kept, uncapacitated destination at least as near to
+    # every origin; candidates are filtered one origin at a time, nearest
+    # origins first, which usually leaves none after a few origins
+    matrix = np.full((num_origs, num_dests), np.inf)
+    matrix[orig_code, dest_code] = distance
+    by_dest = np.lexsort((distance, dest_code))
+    indptr = np.zeros(num_dests+1, dtype=np.int64)
+    np.cumsum(np.bincount(dest_code, minlength=num_dests), out=indptr[1:])
+    removed = []
+    for j in np.flatnonzero(free & (kept_by<0)):
+        candidates = np.flatnonzero(uncapacitated & (kept_by<0))
+        candidates = candidates[candidates!=j]
+        for i in orig_code[by_dest[indptr[j]:indptr[j+1]]]:
+            candidates = candidates[matrix[i, candidates]<=matrix[i, j]]
+            if len(candidates)==0:
+                break
+        if len(candidates)>0:
+            kept_by[j] = candidates[0]
+            removed.append(j)
+    return removed
+
+def aggregate_origins(orig_df, dist_df, *, tolerance=0):
+    """Merge origins with the same distance profile (the same destinations
+    at the same distances) into one origin with their total population,
+    e.g. census blocks that are equally far from every destination. The
+    first origin of each group represents it and keeps its id.
+    With tolerance>0 distances in the same multiple of tolerance count as
+    equal and the merged origin's distances are the population-weighted
+    means of its group's, so no distance moves by more than the returned
+    error (< tolerance). The Kolm-Pollak EDE (for a given kappa) of any
+    assignment then moves by at most error, and the optimum of the merged
+    model is within 2*error of the optimum of the original one, but a
+    bound on the EDE (target_ede) is only exact with tolerance=0.
+    Origins must not share a capacitated destination, since merged origins
+    are assigned together. Call expand_origins for the assignment of the
+    original origins.
+
+    Returns (orig_df, dist_df, origin_map, error), where origin_map is a 
+    series of representative ids indexed by the original origin ids
+
+    Keyword arguments:
+    tolerance -- distances that count as equal (default: 0, exactly equal)
+    """
+    orig_ids = orig_df['id'].to_numpy()
+    num_origs = len(orig_ids)
+    orig_code = _get_codes(dist_df['origin'], orig_ids).astype(np.int64)
+    dest_code = pd.factorize(dist_df['destination'])[0]
+    distance = dist_df['distance'].to_numpy(dtype=float)
+    if tolerance>0:
+        key = np.floor(distance/tolerance).astype(np.int64)
+    else:
+        key = (distance+0.0).view(np.int64) # +0.0 turns -0.0 into 0.0
+
+    rep = _get_representatives(orig_code, dest_code, key, num_origs)
+    is_rep = rep==np.arange(num_origs)
+    origin_map = pd.Series(orig_ids[rep], index=orig_df['id'].to_numpy())
+    if is_rep.all():
+        return orig_df, dist_df, origin_map, 0
+
+    population = orig_df['population'].groupby(rep).sum() # indexed by representative
+    pair_rep = rep[orig_code]
+    keep = is_rep[orig_code]
+    new_dist_df = dist_df[keep]
+    if 'population' in set(dist_df.columns.values):
+        new_dist_df = new_dist_df.assign(population=population.loc[pair_rep[keep]].to_numpy())
+    error = 0
+    if tolerance>0:
+        # population-weighted mean distance of each group to each destination
+        # (plain mean if the group has no population)
+        pair_pop = orig_df['population'].to_numpy(dtype=float)[orig_code]
+        sums = pd.DataFrame({'rep':pair_rep, 'dest':dest_code, 'pop':pair_pop, 
+                             'pop_distance':pair_pop*distance, 'count':1, 'distance':distance}
+                            ).groupby(['rep','dest'])[['pop','pop_distance','count','distance']].transform('sum')
+        weighted = sums['pop'].to_numpy()>0
+        mean = np.where(weighted, sums['pop_distance'].to_numpy()/np.where(weighted, sums['pop'].to_numpy(), 1),
+                        sums['distance'].to_numpy()/sums['count'].to_numpy())
+        error = float(np.abs(mean-distance).max())
+        new_dist_df = new_dist_df.assign(distance=mean[keep])
+    new_orig_df = orig_df[is_rep].assign(population=population.loc[np.flatnonzero(is_rep)].to_numpy())
+    logging.info(f'presolve: aggregated {num_origs} origins into {is_rep.sum()} '
+                 f'(distance error at most {error:g})')
+    return new_orig_df, new_dist_df, origin_map, error
+
+def _get_representatives(orig_code, dest_code, key, num_origs):
+    # first origin with the same (destination, key) profile as each origin:
+    # origins are grouped by their number of pairs and a hash of their
+    # profile, then compared pair by pair with their group's first origin
+    # (hash collisions keep their own origin)
+    order = np.lexsort((dest_code, orig_code))
+    orig = orig_code[order]
+    dest = dest_code[order]
+    key = key[order]
+    counts = np.bincount(orig, minlength=num_origs)
+    indptr = np.zeros(num_origs+1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    pair_hash = pd.util.hash_pandas_object(pd.DataFrame({'dest':dest, 'key':key}), index=False).to_numpy()
+    profile_hash = np.zeros(num_origs, dtype=np.uint64)
+    has_pairs = counts>0
+    profile_hash[has_pairs] = np.add.reduceat(pair_hash, indptr[:-1][has_pairs]) # sums wrap (uint64)
+
+    group = pd.DataFrame({'count':counts, 'hash':profile_hash}).groupby(['count','hash'], sort=False).ngroup().to_numpy()
+    _, first = np.unique(group, return_index=True)
+    rep = first[group]
+    rep[~has_pairs] = np.flatnonzero(~has_pairs)
+
+    position = np.arange(len(orig)) - indptr[orig]
+    rep_pair = indptr[rep[orig]] + position
+    mismatch = (dest!=dest[rep_pair]) | (key!=key[rep_pair])
+    if mismatch.any():
+        bad = np.unique(orig[mismatch])
+        rep[bad] = bad
+    return rep
+
+def expand_origins(assignment_df, origin_map, orig_df, dist_df):
+    """return the assignment of the original origins (in orig_df order):
+    each origin goes to its representative's destination (see 
+    aggregate_origins), at its own distance"""
+    destination = assignment_df.set_index('origin')['destination']
+    expanded_df = pd.DataFrame({'origin':orig_df['id'].to_numpy(),
+                                'destination':destination.loc[origin_map.loc[orig_df['id']].to_numpy()].to_numpy(),
+                                'population':orig_df['population'].to_numpy()})
+    expanded_df = expanded_df.merge(dist_df[['origin','destination','distance']], 
+                                    on=['origin','destination'], how='left')
+    return expanded_df[['origin','destination','distance','population']]
@@ -0,0 +1,170 @@
+# opt-in profiling of the phases of a run
+
+import cProfile
+import tracemalloc
+import time
+import logging
+import sys
+import pandas as pd
+
+_active = None # the Profiler that begin/end report to (None: profiling off)
+
+class Profiler:
+    """Profile the phases of a run (validation, build_dist_df, model_data,
+    build_model, solve, extract), which the optimize and model modules
+    mark with begin(phase) and end(phase). Each phase is run under
+    cProfile and tracemalloc and its peak RSS is recorded (the peak is
+    reset at the start of each phase where the OS allows it, i.e. on
+    Linux; elsewhere it is the peak since the process started). The solve
+    phase also records the peak RSS of solver subprocesses. Phases that
+    begin while another phase is running are part of that phase.
+    On exit, writes prefix_<phase>.prof (cProfile stats, e.g. for pstats
+    or snakeviz) and prefix.txt (seconds, memory and the top allocations
+    of each phase). One profiler can be active at a time.
+
+    Keyword arguments:
+    prefix -- path prefix of the files (default: None, no files)
+    top -- number of allocations (by line) to report per phase (default: 10)
+    trace -- run cProfile and tracemalloc; False records only seconds and 
+    peak RSS, without their overhead, e.g. for benchmarks (default: True)
+    """
+    def __init__(self, prefix=None, *, top=10, trace=True):
+        self.prefix = prefix
+        self.top = top
+        self.trace = trace
+        self.phases = {} # phase: seconds, peak_rss, peak_child_rss, peak_traced (bytes)
+        self.allocations = {} # phase: top tracemalloc.StatisticDiff of the phase
+        self._profiles = {}
+        self._current = None
+
+    def __enter__(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError('another profiler is active')
+        self._stop_tracing = self.trace and not tracemalloc.is_tracing()
+        if self._stop_tracing:
+            tracemalloc.start()
+        _active = self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        if self._current is not None: # phase ended by an exception
+            self.end(self._current)
+        _active = None
+        if self._stop_tracing:
+            tracemalloc.stop()
+        if self.prefix is not None:
+            self.write(self.prefix)
+        return False
+
+    def begin(self, phase):
+        if self._current is not None:
+            return
+        self._current = phase
+        self._peak_reset = _reset_peak_rss()
+        if self.trace:
+            tracemalloc.reset_peak()
+            self._snapshot = tracemalloc.take_snapshot()
+        self._start_time = time.time()
+        if self.trace:
+            self._profiles.setdefault(phase, cProfile.Profile()).enable()
+
+    def end(self, phase):
+        if self._current!=phase:
+            return
+        if self.trace:
+            self._profiles[phase].disable()
+        seconds = time.time() - self._start_time
+        self._current = None
+
+        # a phase that runs more than once (e.g. solve in a sweep) adds up
+        # its seconds and keeps its highest peaks
+        stats = self.phases.setdefault(phase, {'seconds':0, 'peak_rss':None,
+                                               'peak_child_rss':None, 
+                                               'peak_traced':0 if self.trace else None})
+        stats['seconds'] += seconds
+        stats['peak_rss'] = _max(stats['peak_rss'], _get_peak_rss())
+        stats['peak_child_rss'] = _max(stats['peak_child_rss'], _get_peak_rss(children=True))
+        stats['peak_rss_reset'] = self._peak_reset
+        if not self.trace:
+            return
+        _, peak_traced = tracemalloc.get_traced_memory()
+        if peak_traced>=stats['peak_traced']:
+            stats['peak_traced'] = peak_traced
+            snapshot = tracemalloc.take_snapshot()
+            self.allocations[phase] = snapshot.compare_to(self._snapshot, 'lineno')[:self.top]
+
+    def get_phases_df(self):
+        """return dataframe of the phases: phase, seconds, peak_rss,
+        peak_child_rss, peak_traced (bytes), peak_rss_reset"""
+        return pd.DataFrame([dict(phase=phase, **stats) for phase, stats in self.phases.items()],
+                            columns=['phase','seconds','peak_rss','peak_child_rss',
+                                     'peak_traced','peak_rss_reset'])
+
+    def write(self, prefix):
+        # prefix_<phase>.prof per phase and the prefix.txt report
+        for phase, profile in self._profiles.items():
+            profile.dump_stats(f'{prefix}_{phase}.prof')
+        with open(prefix+'.txt', 'w') as f:
+            f.write(self.report())
+        logging.info(f'profile written to {prefix}.txt')
+
+    def report(self):
+        lines = [f'{"phase":<16}{"seconds":>10}{"peak_rss":>12}{"child_rss":>12}{"traced":>12}']
+        for phase, stats in self.phases.items():
+            peak_rss = _mb(stats['peak_rss']) + ('' if stats['peak_rss_reset'] else '*')
+            lines.append(f'{phase:<16}{stats["seconds"]:>10.3f}{peak_rss:>12}'
+                         f'{_mb(stats["peak_child_rss"]):>12}{_mb(stats["peak_traced"]):>12}')
+        lines.append('(MB; *: peak since the process started, not reset per phase on this OS; '
+                     'child_rss: largest solver subprocess so far; traced: python allocations)')
+        for phase, allocations in self.allocations.items():
+            lines.append('')
+            lines.append(f'{phase}: top {len(allocations)} allocations (net size change by line)')
+            for diff in allocations:
+                frame = diff.traceback[0]
+                lines.append(f'  {diff.size_diff/2**20:>10.2f} MB {diff.count_diff:>9} blocks  '
+                             f'{frame.filename}:{frame.lineno}')
+        return '\n'.join(lines) + '\n'
+
+def begin(phase):
+    # mark the start of a phase (no-op unless a Profiler is active)
+    if _active is not None:
+        _active.begin(phase)
+
+def end(phase):
+    if _active is not None:
+        _active.end(phase)
+
+def _reset_peak_rss():
+    # reset the process's peak RSS (VmHWM); False if the OS doesn't allow it
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def _get_peak_rss(children=False):
+    # peak RSS in bytes (None if unknown)
+    if not children:
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1])*1024
+        except OSError:
+            pass
+    try:
+        import resource
+    except ImportError: # windows
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    max_rss = resource.getrusage(who).ru_maxrss
+    return max_rss if sys.platform=='darwin' else max_rss*1024 # bytes on macOS, KB elsewhere
+
+def _max(a, b):
+    return b if a is None else a if b is None else max(a, b)
+
+def _mb(size):
+    return '' if size is None else f'{size/2**20:.1f}'
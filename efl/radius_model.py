@@ -0,0 +1,157 @@
+# radius (Elloumi) formulation of the facility location model
+
+import pyomo.environ as pyo
+from pyomo.common.gc_manager import PauseGC
+from dataclasses import dataclass
+import numpy as np
+import logging
+from efl.matrix_model import _linear, _sum
+
+@dataclass
+class Levels:
+    # distinct distances ("levels") of each origin, nearest first
+    pair_order: np.ndarray # pairs sorted by origin, then distance
+    indptr: np.ndarray # level l has the pairs pair_order[indptr[l]:indptr[l+1]]
+    orig: np.ndarray # origin of each level
+    is_first: np.ndarray # nearest level of its origin
+    is_last: np.ndarray # farthest level of its origin (no u variable)
+    u_index: np.ndarray # u variable of each level (-1 if last)
+
+    @property
+    def num_levels(self):
+        return len(self.orig)
+
+def get_levels(instance):
+    # group the pairs of each origin by distance
+    order = np.lexsort((instance.distance, instance.pair_orig))
+    orig = instance.pair_orig[order]
+    distance = instance.distance[order]
+    new_level = np.ones(len(order), dtype=bool)
+    new_level[1:] = (orig[1:]!=orig[:-1]) | (distance[1:]!=distance[:-1])
+    starts = np.flatnonzero(new_level)
+    level_orig = orig[starts]
+    is_first = np.ones(len(starts), dtype=bool)
+    is_first[1:] = level_orig[1:]!=level_orig[:-1]
+    is_last = np.ones(len(starts), dtype=bool)
+    is_last[:-1] = level_orig[1:]!=level_orig[:-1]
+    u_index = np.full(len(starts), -1, dtype=np.int64)
+    u_index[~is_last] = np.arange((~is_last).sum())
+    return Levels(order, np.append(starts, len(order)), level_orig, is_first, is_last, u_index)
+
+def get_kp_expr(model, levels, coef):
+    """return (linear expression in u, constant): the sum of the kp
+    coefficients of the assignment is constant + expression, with the
+    coefficient of each level's u the increase to the next level"""
+    level_coef = np.asarray(coef, dtype=float)[levels.pair_order[levels.indptr[:-1]]]
+    step = np.diff(level_coef)[~levels.is_last[:-1]]
+    if (step<0).any():
+        raise ValueError('the radius formulation needs coefficients that increase with distance (aversion<=0)')
+    constant = level_coef[levels.is_first].sum()
+    return _linear(step, model.u.values()), constant
+
+def build_model(instance, coef, *,
+                minimize, num_locations, target,
+                open_destinations, percent_destinations, min_percent_open):
+    """Build the radius formulation of the facility location model:
+    for each origin the pairs are grouped by distinct distance (level) and
+    u[l] (continuous, one per level but the farthest) is 1 if no destination
+    at level l or nearer is open. The sum of the kp coefficients is the
+    origin's nearest coefficient plus the increase to the next level for
+    each u that is 1, so pairs at equal distances share a row and there
+    are no assignment variables or assign_to_open rows.
+    Capacities are not supported.
+
+    Keyword arguments as for matrix_model.build_model
+    """
+    if (np.diff(instance.orig_indptr)==0).any():
+        raise ValueError('infeasible: some origins have no (origin, destination) pairs')
+
+    levels = get_levels(instance)
+    logging.info(f'radius formulation: {levels.num_levels} levels for {instance.num_pairs} pairs')
+    with PauseGC():
+        model = _build_model(instance, levels, coef,
+                             minimize=minimize, num_locations=num_locations, target=target,
+                             open_destinations=open_destinations,
+                             percent_destinations=percent_destinations,
+                             min_percent_open=min_percent_open)
+    logging.info('model complete')
+
+    return model
+
+def _build_model(instance, levels, coef, *,
+                 minimize, num_locations, target,
+                 open_destinations, percent_destinations, min_percent_open):
+    model = pyo.ConcreteModel()
+    logging.info('adding variables')
+    model.x = pyo.Var(range(instance.num_dests), domain=pyo.Binary)
+    model.u = pyo.Var(range((~levels.is_last).sum()), domain=pyo.NonNegativeReals)
+    x_vars = list(model.x.values())
+    u_vars = list(model.u.values())
+    kp_expr, constant = get_kp_expr(model, levels, coef)
+
+    if minimize=='ede':
+        # minimize the Kolm-Pollak EDE
+        logging.info('adding objective')
+        model.obj = pyo.Objective(expr=kp_expr + constant, sense=pyo.minimize)
+
+        # set the number of locations to open
+        logging.info('adding num locations constraint')
+        model.num_locations = pyo.Constraint(expr=_sum(x_vars)==num_locations)
+
+    else: # minimize=='locations'
+        # minimize the number of locations to open
+        logging.info('building objective')
+        model.obj = pyo.Objective(expr=_sum(x_vars), sense=pyo.minimize)
+
+        # meet target level of access
+        logging.info('adding target access constraint')
+        model.target_access = pyo.Constraint(expr=kp_expr<=target-constant)
+
+    # u[l] is 1 unless a destination at level l or nearer is open
+    # (and a destination at the farthest level or nearer must be open)
+    logging.info('adding level covered constraint')
+    pair_dest = instance.pair_dest[levels.pair_order].tolist()
+    indptr = levels.indptr.tolist()
+    u_index = levels.u_index.tolist()
+    is_first = levels.is_first.tolist()
+    def level_covered_rule(model, l):
+        terms = [x_vars[pair_dest[k]] for k in range(indptr[l], indptr[l+1])]
+        coefs = [1]*len(terms)
+        if u_index[l]>=0:
+            terms.append(u_vars[u_index[l]])
+            coefs.append(1)
+        if is_first[l]:
+            return _linear(coefs, terms)>=1
+        terms.append(u_vars[u_index[l-1]])
+        coefs.append(-1)
+        return _linear(coefs, terms)>=0
+    model.level_covered = pyo.Constraint(range(levels.num_levels), rule=level_covered_rule)
+
+    # set open destinations to open
+    if len(open_destinations)>0:
+        logging.info('adding set open constraint')
+        open_code = instance.get_dest_codes(open_destinations).tolist()
+        def set_open_rule(model, r):
+            return x_vars[open_code[r]]==1
+        model.set_open = pyo.Constraint(range(len(open_code)), rule=set_open_rule)
+
+    # open minimum number of percent_open destinations
+    if len(percent_destinations)>0:
+        logging.info('adding min percent open constraint')
+        percent_code = instance.get_dest_codes(percent_destinations)
+        model.min_percent_open = pyo.Constraint(
+            expr=_sum(x_vars[j] for j in percent_code)>=min_percent_open)
+
+    return model
+
+def set_initial_values(model, instance, open_mask):
+    # u values of the open destinations in open_mask (x is set by the caller)
+    levels = get_levels(instance)
+    is_open = open_mask[instance.pair_dest[levels.pair_order]]
+    level_open = np.logical_or.reduceat(is_open, levels.indptr[:-1])
+    # covered: a destination at this level or nearer is open (running
+    # "or" within each origin; origins are offset so they don't mix)
+    offset = 2*(np.cumsum(levels.is_first) - 1)
+    covered = np.maximum.accumulate(level_open + offset) > offset
+    for l in np.flatnonzero(~levels.is_last):
+        model.u[levels.u_index[l]].set_value(float(not covered[l]))
@@ -0,0 +1,34 @@
+# test_benchmark.py
+
+import numpy as np
+import pandas as pd
+import efl.benchmark as benchmark
+
+def test_generate_instance():
+    orig_df, dest_df, dist_df = benchmark.generate_instance(300, 40, seed=1, open_share=0.1, 
+                                                            percent_share=0.2, capacity_factor=2)
+    assert dist_df.shape[0]==300*40
+    assert set(dest_df['open'].dropna())=={'yes', 'percent'}
+    assert dest_df['capacity'].sum()>orig_df['population'].sum()
+    again = benchmark.generate_instance(300, 40, seed=1, open_share=0.1, percent_share=0.2, capacity_factor=2)
+    pd.testing.assert_frame_equal(dist_df, again[2])
+
+def test_generate_nearest():
+    _, _, all_df = benchmark.generate_instance(500, 60, seed=2)
+    _, _, nearest_df = benchmark.generate_instance(500, 60, seed=2, num_nearest=5, max_chunk_size=1000)
+    expected = all_df.groupby('origin')['distance'].nsmallest(5).groupby('origin').max()
+    found = nearest_df.groupby('origin')['distance'].max()
+    assert nearest_df.groupby('origin').size().eq(5).all()
+    assert np.allclose(found.loc[expected.index], expected)
+
+def test_run_benchmark(tmp_path):
+    out_file = str(tmp_path/'benchmark.csv')
+    benchmark.run_benchmark(out_file, sizes=[(200, 20)], num_nearest=10, percent_share=0.2, 
+                            min_percent=0.5, solver='heuristic', isochrone_solver='greedy')
+    benchmark_df = pd.read_csv(out_file)
+    assert list(benchmark_df['status'])==['ok', 'ok']
+    assert benchmark_df['peak_rss'].gt(0).all() and benchmark_df['time_solve'].notna().all()
+    assert benchmark_df['num_locations_out'].eq(benchmark_df['num_locations']).all()
+    compare_df = benchmark.compare_benchmarks(out_file, out_file)
+    assert compare_df['wall_time_ratio'].eq(1).all()
+    assert compare_df['ede_out_change'].fillna(0).eq(0).all()
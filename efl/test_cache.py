@@ -0,0 +1,64 @@
+# test_cache.py
+
+import os
+import efl.cache as cache
+import efl.model as model
+import efl.optimize as optimize
+import pandas as pd
+
+test_data_path = os.path.dirname(os.path.abspath(__file__))+'/../data/test_data/'
+test_df_path = test_data_path+'dataframes/'
+
+orig_df = pd.read_csv(test_df_path+'orig_df.csv')
+dest_df = pd.read_csv(test_df_path+'dest_df.csv')
+dist_lookup_df = pd.read_csv(test_data_path+'distances_cartesian.csv')
+
+def _results(i):
+    assignment_df = pd.DataFrame({'origin':[i], 'destination':['d'], 'distance':[1.0], 'population':[1]})
+    return model.Results(assignment_df, {'aversion':-1}, 0, i)
+
+def test_cache_hit(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path))
+    first = optimize.run(orig_df, dest_df, dist_lookup_df, num_locations=6, cache=result_cache)
+    second = optimize.run(orig_df, dest_df, dist_lookup_df, num_locations=6, cache=result_cache)
+    assert second.ede_out()==171.4566587957021
+    assert second.solver_wall_time==first.solver_wall_time
+
+def test_cache_key(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path))
+    key = result_cache.get_key([orig_df], {'num_locations':6})
+    assert key==result_cache.get_key([orig_df.copy()], {'num_locations':6})
+    assert key!=result_cache.get_key([orig_df], {'num_locations':5})
+    assert key!=result_cache.get_key([orig_df.assign(population=orig_df['population']+1)], {'num_locations':6})
+
+def test_cache_unused_parameter():
+    options = dict(minimize='ede', num_locations=6, target_ede=None)
+    assert (optimize._get_cache_parameters('run', options, None)
+            ==optimize._get_cache_parameters('run', dict(options, target_ede=100), None))
+
+def test_cache_lru_eviction(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path), max_bytes=None)
+    for i in range(3):
+        result_cache.put(str(i), _results(i))
+        os.utime(result_cache._get_path(str(i)), (i, i))
+    result_cache.get('0') # most recently used
+    result_cache.max_bytes = 2*os.path.getsize(result_cache._get_path('0'))+1
+    result_cache.put('3', _results(3))
+    assert result_cache.get('1') is None
+    assert result_cache.get('0') is not None
+
+def test_cache_invalidate(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path))
+    result_cache.put('key', _results(0))
+    result_cache.invalidate('key')
+    assert result_cache.get('key') is None
+
+def test_cache_cli_and_run_share_key(tmp_path):
+    from click.testing import CliRunner
+    files = [test_data_path+name for name in ['origins_basic.csv', 'destinations_basic.csv', 'distances_cartesian.csv']]
+    cache_dir = str(tmp_path/'cache')
+    result = CliRunner().invoke(optimize.main, ['run', *files, str(tmp_path/'out.csv'), 
+                                                '--num_locations', '6', '--cache_dir', cache_dir])
+    assert result.exit_code==0
+    optimize.run(*[pd.read_csv(file) for file in files], num_locations=6, cache=cache_dir)
+    assert len(os.listdir(cache_dir))==1
@@ -89,4 +89,107 @@ def test_invalid_values():
 def test_negative_zero_populations():
     csv_path = edge_case_path+'origins_nonpos_populations.csv'
     df = data.validate_origin_df(pd.read_csv(csv_path))
-    assert df.shape==(25, 2)
\ No newline at end of file
+    assert df.shape==(25, 2)
+
+
+# sparse build only keeps pairs within radius
+def test_build_dist_df_sparse_radius():
+    orig_df = data.validate_origin_df(pd.read_csv(test_data_path+'origins_basic.csv'))
+    dest_df = data.validate_destination_df(pd.read_csv(test_data_path+'destinations_basic.csv'))
+    dist_lookup = data.validate_distance_df(pd.read_csv(test_data_path+'distances_cartesian.csv'))
+    dist_df = data.build_dist_df(orig_df, dest_df, dist_lookup, sparse=True, radius=500)
+    assert dist_df.shape==(dist_lookup.query('distance <= 500').shape[0], 4)
+
+# sparse build keeps the k nearest destinations of each origin
+def test_build_dist_df_sparse_k_nearest():
+    orig_df = data.validate_origin_df(pd.read_csv(test_data_path+'origins_basic.csv'))
+    dest_df = data.validate_destination_df(pd.read_csv(test_data_path+'destinations_basic.csv'))
+    dist_lookup = data.validate_distance_df(pd.read_csv(test_data_path+'distances_cartesian.csv'))
+    dist_df = data.build_dist_df(orig_df, dest_df, dist_lookup, sparse=True, k_nearest=3)
+    assert dist_df.groupby('origin').size().max()==3
+
+# sparse build allows missing pairs and reports them per origin
+def test_get_coverage_gaps():
+    orig_df = data.validate_origin_df(pd.read_csv(test_data_path+'origins_basic.csv'))
+    dest_df = data.validate_destination_df(pd.read_csv(test_data_path+'destinations_basic.csv'))
+    dist_lookup = data.validate_distance_df(pd.read_csv(test_data_path+'distances_cartesian.csv'))
+    dist_lookup = dist_lookup.query('not (origin=="orig1" and destination=="dest1")')
+    dist_df = data.build_dist_df(orig_df, dest_df, dist_lookup, sparse=True)
+    gaps_df = data.get_coverage_gaps(orig_df, dest_df, dist_df)
+    assert dist_df.shape==(299, 4)
+    assert gaps_df.query('missing>0')['origin'].tolist()==['orig1']
+
+# fast distance file formats
+@pytest.mark.parametrize('extension', ['parquet', 'feather', 'npz'])
+def test_convert_distance_file(tmp_path, extension):
+    csv_path = test_data_path+'distances_cartesian.csv'
+    out_path = str(tmp_path/f'distances.{extension}')
+    assert data.convert_distance_file(csv_path, out_path)==0
+    dist_lookup_df = data.validate_distance_df(data.read_distance_file(out_path))
+    merged_df = pd.read_csv(csv_path).merge(dist_lookup_df, on=['origin','destination'])
+    assert merged_df.shape[0]==300
+    assert (merged_df['distance_x']==merged_df['distance_y']).all()
+
+@pytest.mark.parametrize('extension', ['csv', 'parquet', 'feather', 'npz'])
+def test_read_distance_file_filtered(tmp_path, extension):
+    csv_path = test_data_path+'distances_cartesian.csv'
+    path = csv_path
+    if extension!='csv':
+        path = str(tmp_path/f'distances.{extension}')
+        data.convert_distance_file(csv_path, path)
+    dist_lookup_df = data.read_distance_file(path, origins=['orig1','orig2','orig3'], 
+                                             destinations=['dest1','dest2'], radius=500)
+    assert list(dist_lookup_df.columns)==['origin','destination','distance']
+    assert dist_lookup_df.shape[0]==4
+
+# chunked distance csv
+def test_read_distance_file_chunks():
+    csv_path = test_data_path+'distances_cartesian.csv'
+    chunked_df = data.read_distance_file(csv_path, origins=['orig1','orig2','orig3'], chunksize=7)
+    full_df = pd.read_csv(csv_path).query('origin in ["orig1","orig2","orig3"]').reset_index(drop=True)
+    assert chunked_df.equals(full_df)
+
+def test_read_distance_file_chunk_errors(tmp_path):
+    dist_lookup_df = pd.read_csv(test_data_path+'distances_cartesian.csv')
+    dist_lookup_df.loc[299, 'distance'] = None # last chunk, filtered out below
+    path = tmp_path/'distances.csv'
+    dist_lookup_df.to_csv(path, index=False)
+    assert data.read_distance_file(path, origins=['orig1'], chunksize=50) is None
+
+def test_unique_across_chunks():
+    file_info = data.FileInfo('test', required_cols=[data.Column('id', unique=True)])
+    checks = data._DataChecks(file_info)
+    checks.update(pd.DataFrame({'id':[1, 2]}))
+    checks.update(pd.DataFrame({'id':[3, 1]}))
+    assert checks.report()==(True, [])
+
+def test_offending_rows_reported(caplog):
+    df = pd.DataFrame({'id':['a','b','a','c','a'], 'population':[1, 'x', 3, None, 5]})
+    assert data.validate_origin_df(df) is None
+    assert "duplicate entries in column 'id', first rows (0-based): [2, 4]" in caplog.text
+    assert "non-numeric data in column 'population', first rows (0-based): [1]" in caplog.text
+    assert "missing data in column 'population', first rows (0-based): [3]" in caplog.text
+
+def test_offending_rows_across_chunks(tmp_path, caplog):
+    dist_lookup_df = pd.read_csv(test_data_path+'distances_cartesian.csv')
+    dist_lookup_df.loc[[10, 120, 299], 'distance'] = None
+    path = tmp_path/'distances.csv'
+    dist_lookup_df.to_csv(path, index=False)
+    assert data.read_distance_file(path, chunksize=50) is None
+    assert "missing data in column 'distance', first rows (0-based): [10, 120, 299]" in caplog.text
+
+def test_trusted_distance_file(tmp_path, caplog):
+    caplog.set_level('INFO')
+    path = tmp_path/'distances.csv'
+    pd.read_csv(test_data_path+'distances_cartesian.csv').to_csv(path, index=False)
+    trusted_dir = tmp_path/'trusted'
+    checked_df = data.read_distance_file(path, trusted_dir=trusted_dir)
+    trusted_df = data.read_distance_file(path, origins=['orig1'], trusted_dir=trusted_dir)
+    assert 'trusted input' in caplog.text
+    pd.testing.assert_frame_equal(trusted_df, checked_df.query('origin=="orig1"').reset_index(drop=True))
+
+    # a changed file is checked again
+    changed_df = pd.read_csv(path).astype({'distance':object})
+    changed_df.loc[0, 'distance'] = 'far'
+    changed_df.to_csv(path, index=False)
+    assert data.read_distance_file(path, trusted_dir=trusted_dir) is None
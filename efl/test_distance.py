@@ -0,0 +1,70 @@
+# test_distance.py
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import efl.distance as distance
+import efl.optimize as optimize
+
+test_data_path = os.path.dirname(os.path.abspath(__file__))+'/../data/test_data/'
+xy_path = test_data_path+'extra_files/'
+
+orig_df = pd.read_csv(xy_path+'test_origins_xy.csv')
+dest_df = pd.read_csv(xy_path+'test_destinations_xy.csv')
+
+@pytest.mark.parametrize('metric, lookup_file', [('euclidean', 'distances_cartesian.csv'), 
+                                                 ('manhattan', 'distances_taxi.csv')])
+def test_matches_lookup(metric, lookup_file):
+    lookup_df = pd.read_csv(test_data_path+lookup_file)
+    dist_df = distance.get_distance_df(orig_df, dest_df, metric)
+    assert dist_df.shape[0]==orig_df.shape[0]*dest_df.shape[0]
+    merged_df = dist_df.merge(lookup_df, on=['origin','destination'])
+    assert np.allclose(merged_df['distance_x'].round(1), merged_df['distance_y'])
+
+@pytest.mark.parametrize('metric', ['euclidean', 'manhattan'])
+@pytest.mark.parametrize('radius, k_nearest', [(400, None), (None, 3), (400, 3)])
+def test_tree_matches_brute_force(metric, radius, k_nearest):
+    pytest.importorskip('scipy')
+    tree_df = distance.get_distance_df(orig_df, dest_df, metric, radius=radius, k_nearest=k_nearest, tree=True)
+    brute_df = distance.get_distance_df(orig_df, dest_df, metric, radius=radius, k_nearest=k_nearest, 
+                                        tree=False, max_chunk_size=25)
+    pd.testing.assert_frame_equal(tree_df, brute_df)
+    all_df = distance.get_distance_df(orig_df, dest_df, metric)
+    if radius is not None:
+        assert tree_df['distance'].max()<=radius
+    if k_nearest is not None:
+        assert tree_df.groupby('origin').size().max()==k_nearest
+        kth = all_df.groupby('origin')['distance'].nsmallest(k_nearest).groupby('origin').max()
+        found = tree_df.groupby('origin')['distance'].max()
+        assert (found<=kth.loc[found.index]).all()
+
+def test_haversine():
+    cities_df = pd.DataFrame({'id':['london', 'paris'], 'lon':[-0.1276, 2.3522], 'lat':[51.5072, 48.8566]})
+    dist_df = distance.get_distance_df(cities_df.iloc[:1], cities_df.iloc[1:], 'haversine')
+    assert dist_df['distance'].iloc[0]==pytest.approx(343.6, abs=0.5)
+
+def test_haversine_tree():
+    pytest.importorskip('scipy')
+    rng = np.random.default_rng(0)
+    points_df = pd.DataFrame({'id':range(300), 'lon':rng.uniform(-180, 180, 300), 
+                              'lat':rng.uniform(-80, 80, 300)})
+    tree_df = distance.get_distance_df(points_df, points_df.iloc[:50], 'haversine', 
+                                       radius=2000, k_nearest=4, tree=True)
+    brute_df = distance.get_distance_df(points_df, points_df.iloc[:50], 'haversine', 
+                                        radius=2000, k_nearest=4, tree=False)
+    assert tree_df.shape[0]>0
+    pd.testing.assert_frame_equal(tree_df, brute_df)
+
+def test_missing_coordinates():
+    with pytest.raises(ValueError):
+        distance.get_distance_df(orig_df.drop(columns=['y']), dest_df)
+    with pytest.raises(ValueError):
+        distance.get_distance_df(orig_df, dest_df, 'cosine')
+
+def test_run_from_coordinates():
+    lookup = optimize.run(orig_df, dest_df, test_data_path+'distances_cartesian.csv', num_locations=6)
+    result = optimize.run(orig_df, dest_df, 'euclidean', num_locations=6)
+    assert result.ede_out()==pytest.approx(lookup.ede_out(), abs=0.1)
+    sparse = optimize.run(orig_df, dest_df, 'euclidean', num_locations=6, sparse=True, k_nearest=5)
+    assert sparse.model_stats['num_pairs_in']==orig_df.shape[0]*5
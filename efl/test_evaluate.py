@@ -0,0 +1,75 @@
+# test_evaluate.py
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import efl.evaluate as evaluate
+import efl.utils as utils
+from efl.instance import Instance
+
+test_data_path = os.path.dirname(os.path.abspath(__file__))+'/../data/test_data/'
+test_df_path = test_data_path+'dataframes/'
+
+orig_df = pd.read_csv(test_df_path+'orig_df.csv')
+dest_df = pd.read_csv(test_df_path+'dest_df.csv')
+dist_df = pd.read_csv(test_df_path+'dist_df.csv')
+instance = Instance(orig_df, dest_df, dist_df)
+
+def _get_assignment_df(open_ids):
+    # nearest open destination of each origin, built with pandas
+    return (dist_df[dist_df['destination'].isin(open_ids)]
+            .sort_values('distance').groupby('origin').first().reset_index())
+
+def test_evaluate_open_sets():
+    open_sets = pd.DataFrame([{'dest1':True, 'dest5':True, 'dest9':True}, 
+                              {'dest2':True, 'dest3':True, 'dest4':True, 'dest10':True}], 
+                             index=['a','b']).fillna(False).astype(bool)
+    results_df = evaluate.evaluate_open_sets(instance, open_sets, aversion=[-1, -2, 0], iso_radius=300)
+    for name, row in open_sets.iterrows():
+        assignment_df = _get_assignment_df(list(row[row].index))
+        assert results_df.loc[name, 'num_open']==row.sum()
+        assert results_df.loc[name, 'ede_-1']==pytest.approx(utils.get_kp(assignment_df, -1))
+        assert results_df.loc[name, 'ede_-2']==pytest.approx(utils.get_kp(assignment_df, -2))
+        assert results_df.loc[name, 'ede_0']==pytest.approx(utils.get_mean_distance(assignment_df))
+        assert results_df.loc[name, 'mean_distance']==pytest.approx(utils.get_mean_distance(assignment_df))
+        assert results_df.loc[name, 'percent_covered']==pytest.approx(utils.get_percent_covered(assignment_df, 300))
+
+def test_evaluate_open_sets_chunks():
+    open_sets = np.random.default_rng(0).random((7, instance.num_dests))<0.5
+    open_sets[:,0] = True
+    results_df = evaluate.evaluate_open_sets(instance, open_sets)
+    chunked_df = evaluate.evaluate_open_sets(instance, open_sets, max_chunk_size=2*instance.num_origs)
+    pd.testing.assert_frame_equal(results_df, chunked_df)
+    assert list(results_df.columns)==['num_open','mean_distance','ede']
+
+def test_evaluate_no_open_destination():
+    results_df = evaluate.evaluate_open_sets(instance, np.zeros((1, instance.num_dests), dtype=bool))
+    assert np.isnan(results_df.loc[0, 'ede'])
+
+def test_incremental_evaluator():
+    evaluator = evaluate.IncrementalEvaluator(instance, ['dest1','dest3','dest4'], iso_radius=300)
+    scaling_factor = evaluator.scaling_factor
+    rng = np.random.default_rng(0)
+    for dest_id in rng.choice(instance.dest_ids, 40):
+        evaluator.toggle(dest_id)
+        if evaluator.num_open==0:
+            continue
+        fresh = evaluate.IncrementalEvaluator(instance, evaluator.open_ids(), iso_radius=300,
+                                              scaling_factor=scaling_factor)
+        assert evaluator.ede()==pytest.approx(fresh.ede())
+        assert evaluator.mean_distance()==pytest.approx(fresh.mean_distance())
+        assert evaluator.percent_covered()==pytest.approx(fresh.percent_covered())
+        assignment_df = _get_assignment_df(evaluator.open_ids())
+        assert evaluator.mean_distance()==pytest.approx(utils.get_mean_distance(assignment_df))
+        assert evaluator.percent_covered()==pytest.approx(utils.get_percent_covered(assignment_df, 300))
+
+def test_incremental_evaluator_from_assignment():
+    assignment_df = _get_assignment_df(['dest2','dest5','dest8'])
+    evaluator = evaluate.IncrementalEvaluator.from_assignment_df(instance, assignment_df)
+    assert evaluator.ede()==pytest.approx(utils.get_kp(assignment_df, -1))
+    evaluator.close('dest5')
+    evaluator.open('dest5')
+    assert evaluator.ede()==pytest.approx(utils.get_kp(assignment_df, -1))
+    with pytest.raises(ValueError):
+        evaluator.open('nowhere')
@@ -0,0 +1,51 @@
+# test_heuristic.py
+
+import os
+import efl.heuristic as heuristic
+from efl.instance import Instance
+import pandas as pd
+
+test_data_path = os.path.dirname(os.path.abspath(__file__))+'/../data/test_data/'
+test_df_path = test_data_path+'dataframes/'
+
+orig_df = pd.read_csv(test_df_path+'orig_df.csv')
+dest_df = pd.read_csv(test_df_path+'dest_df.csv')
+dist_df = pd.read_csv(test_df_path+'dist_df.csv')
+kappa = -0.00022764156562774166
+instance = Instance(orig_df, dest_df, dist_df)
+
+def _solve(**kwargs):
+    coef = instance.get_kp_coefficients(kappa)
+    options = dict(minimize='ede', num_locations=6, target=None, 
+                   open_destinations=['dest1','dest3','dest4'], 
+                   percent_destinations=[], min_percent_open=0)
+    options.update(kwargs)
+    return heuristic.solve(instance, coef, **options)
+
+def test_heuristic_num_locations():
+    open_ids, assignment_df = _solve()
+    assert len(open_ids)==6
+    assert assignment_df.shape[0]==orig_df.shape[0]
+
+def test_heuristic_keeps_open_destinations():
+    open_ids, assignment_df = _solve(num_locations=4)
+    assert {'dest1','dest3','dest4'} <= set(open_ids)
+
+def test_heuristic_min_percent():
+    open_ids, assignment_df = _solve(open_destinations=[], percent_destinations=['dest9','dest10'], 
+                                     min_percent_open=2, num_locations=3)
+    assert {'dest9','dest10'} <= set(open_ids)
+
+def test_assign_best_open():
+    pairs = heuristic.assign(instance, instance.get_pair_distance(), ['dest1','dest2'])
+    assert dist_df.iloc[pairs].groupby('origin')['destination'].count().max()==1
+
+def test_solve_coverage_every_k():
+    cover_df = dist_df.query('distance<=250')
+    cover_instance = Instance(orig_df[orig_df['id'].isin(set(cover_df['origin']))], dest_df, cover_df)
+    solutions = heuristic.solve_coverage(cover_instance, max_locations=6, 
+                                         open_destinations=['dest1','dest3','dest4'],
+                                         percent_destinations=[], min_percent_open=0)
+    assert list(solutions)==[3, 4, 5, 6]
+    for k, open_ids in solutions.items():
+        assert len(open_ids)==k and {'dest1','dest3','dest4'} <= set(open_ids)
@@ -0,0 +1,50 @@
+# test_instance.py
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import efl.model as model
+from efl.instance import Instance
+
+test_data_path = os.path.dirname(os.path.abspath(__file__))+'/../data/test_data/'
+test_df_path = test_data_path+'dataframes/'
+
+orig_df = pd.read_csv(test_df_path+'orig_df.csv')
+dest_df = pd.read_csv(test_df_path+'dest_df.csv')
+dist_df = pd.read_csv(test_df_path+'dist_df.csv')
+
+def test_instance_csr():
+    instance = Instance(orig_df, dest_df, dist_df)
+    assert instance.pair_orig.dtype==np.int32 and instance.pair_dest.dtype==np.int32
+    assert instance.num_pairs==dist_df.shape[0]
+    for i in [0, instance.num_origs-1]:
+        assert set(dist_df['origin'].iloc[instance.orig_pairs(i)])=={instance.orig_ids[i]}
+    for j in [0, instance.num_dests-1]:
+        assert set(dist_df['destination'].iloc[instance.dest_pairs(j)])=={instance.dest_ids[j]}
+
+def test_instance_kp_coefficients():
+    instance = Instance(orig_df, dest_df, dist_df)
+    kappa = -0.00022764156562774166
+    assert np.array_equal(instance.get_kp_coefficients(kappa),
+                          model._get_kp_coefficient_array(dist_df, kappa))
+
+def test_instance_distance_precision():
+    assert Instance(orig_df, dest_df, dist_df.assign(distance=1.0)).distance.dtype==np.float32
+    assert Instance(orig_df, dest_df, dist_df.assign(distance=0.1)).distance.dtype==np.float64
+
+def test_instance_assignment_df():
+    instance = Instance(orig_df, dest_df, dist_df)
+    assignment_df = instance.get_assignment_df([5, 2])
+    expected_df = dist_df.iloc[[2, 5]][['origin','destination','distance','population']]
+    pd.testing.assert_frame_equal(assignment_df, expected_df.reset_index(drop=True),
+                                  check_dtype=False)
+
+def test_instance_unknown_id():
+    with pytest.raises(ValueError):
+        Instance(orig_df, dest_df.iloc[1:], dist_df)
+
+@pytest.mark.filterwarnings('error')
+def test_instance_dest_codes():
+    instance = Instance(orig_df, dest_df, dist_df)
+    assert list(instance.get_dest_codes(['dest3', 'dest1', 'unknown']))==[2, 0, -1]
@@ -0,0 +1,47 @@
+# test_lagrangian.py
+
+import os
+import efl.model as model
+import efl.utils as utils
+import pytest
+import pandas as pd
+
+test_data_path = os.path.dirname(os.path.abspath(__file__))+'/../data/test_data/'
+test_df_path = test_data_path+'dataframes/'
+
+orig_df = pd.read_csv(test_df_path+'orig_df.csv')
+dest_df = pd.read_csv(test_df_path+'dest_df.csv')
+dist_df = pd.read_csv(test_df_path+'dist_df.csv')
+
+def _model_ede(bounds):
+    # ede of the upper bound solution with the model's scaling factor
+    results = bounds.results
+    kappa = results.parameters_dict['aversion']*results.parameters_dict['scaling_factor']
+    coef = model._get_kp_coefficient_array(results.assignment_df, kappa)
+    return model._get_ede_from_objective(coef.sum(), orig_df['population'].sum(), kappa)
+
+def test_lagrangian_bounds_min_ede():
+    bounds = model.lagrangian_bounds(orig_df, dest_df, dist_df, 6)
+    assert bounds.lower_bound <= bounds.upper_bound
+    assert bounds.results.ede_out()==171.4566587957021
+    assert abs(_model_ede(bounds)-bounds.upper_bound)<1e-6
+
+def test_lagrangian_lower_bound_without_improve():
+    bounds = model.lagrangian_bounds(orig_df, dest_df, dist_df, 6, improve=False)
+    optimal = model.lagrangian_bounds(orig_df, dest_df, dist_df, 6)
+    assert bounds.lower_bound <= optimal.upper_bound + 1e-6
+    assert bounds.results.assignment_df.shape[0]==orig_df.shape[0]
+
+def test_lagrangian_bounds_zero_aversion():
+    bounds = model.lagrangian_bounds(orig_df, dest_df, dist_df, 6, aversion=0)
+    assert bounds.lower_bound <= utils.get_mean_distance(bounds.results.assignment_df) + 1e-6
+    assert abs(bounds.upper_bound-utils.get_mean_distance(bounds.results.assignment_df))<1e-6
+
+def test_lagrangian_bounds_no_iterations():
+    bounds = model.lagrangian_bounds(orig_df, dest_df, dist_df, 6, max_iterations=0)
+    optimal = model.lagrangian_bounds(orig_df, dest_df, dist_df, 6)
+    assert bounds.iterations==0
+    assert -float('inf') < bounds.lower_bound <= optimal.lower_bound + 1e-6
+    assert bounds.upper_bound >= optimal.upper_bound - 1e-6
+    with pytest.raises(ValueError):
+        model.lagrangian_bounds(orig_df, dest_df, dist_df, 6, max_iterations=0, improve=False)
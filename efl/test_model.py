@@ -58,4 +58,144 @@ def test_return_alpha():
 
 def test_get_kp_coefficients():
     obj_coef_df = model._get_kp_coefficients(dist_df, kappa)
-    assert obj_coef_df['orig24', 'dest6']==8.359123688807468
\ No newline at end of file
+    assert obj_coef_df['orig24', 'dest6']==8.359123688807468
+
+
+@pytest.mark.parametrize('backend', ['rules', 'matrix'])
+def test_continuous_assignment(backend):
+    binary = model.optimize(orig_df, dest_df, dist_df, 'ede', 6, None, 
+                            backend=backend, continuous_assignment=False)
+    continuous = model.optimize(orig_df, dest_df, dist_df, 'ede', 6, None, backend=backend)
+    assert continuous.assignment_df.shape[0]==orig_df.shape[0]
+    assert continuous.ede_out()==pytest.approx(binary.ede_out())
+
+def test_continuous_assignment_min_locations():
+    result = model.optimize(orig_df, dest_df, dist_df, 'locations', None, 190)
+    assert result.assignment_df.shape[0]==orig_df.shape[0]
+    assert result.ede_out()<=190
+
+def test_continuous_assignment_capacity():
+    with pytest.raises(ValueError):
+        model.optimize(orig_df, dest_df.assign(capacity=100), dist_df, 'ede', 6, None, 
+                       continuous_assignment=True)
+
+def test_truncate_candidates():
+    truncated_df = model._truncate_candidates(dist_df, dest_df, 6, [])
+    # each origin keeps its 5 (= 10 - 6 + 1) nearest destinations
+    assert (truncated_df.groupby('origin').size()==5).all()
+    truncated_df = model._truncate_candidates(dist_df, dest_df, 6, open_destinations)
+    assert truncated_df.shape[0]<=orig_df.shape[0]*5
+
+def test_presolve_keeps_optimum():
+    presolved = model.optimize(orig_df, dest_df, dist_df, 'ede', 6, None)
+    full = model.optimize(orig_df, dest_df, dist_df, 'ede', 6, None, presolve=False)
+    assert presolved.ede_out()==pytest.approx(full.ede_out())
+
+def test_isochrone_uncoverable_origins():
+    results = model.optimize_isochrone(orig_df, dest_df, dist_df, 150, 'uncovered', 6)
+    covered_origins = set(dist_df.query('distance<=150')['origin'])
+    assert results.parameters_dict['uncoverable_origins']==orig_df.shape[0]-len(covered_origins)
+    assert results.percent_covered_out(150)==pytest.approx(0.408)
+    with pytest.raises(ValueError):
+        model.optimize_isochrone(orig_df, dest_df, dist_df, 150, 'locations', None, percent_coverage=0.8)
+
+def test_isochrone_assignment_df():
+    quoted_df = dist_df.replace({'destination':{'dest1':"dest'1"}})
+    assignment_df = model._get_isochrone_assignment_df(["dest'1", 'dest2'], quoted_df, orig_df)
+    expected_df = quoted_df[quoted_df['destination'].isin(["dest'1", 'dest2'])].groupby('origin')['distance'].min()
+    assert list(assignment_df['origin'])==list(orig_df['id'])
+    assert list(assignment_df['distance'])==list(expected_df.loc[orig_df['id']])
+
+def test_sweep_warm_start(monkeypatch):
+    # scip is given each solve's start as a partial solution of the previous x
+    from pyomo.contrib.solver.solvers.scip.scip_direct import ScipDirect
+    starts = []
+    mipstart = ScipDirect._mipstart
+    def record_mipstart(solver):
+        starts.append(sum(v.value for v in solver._pyomo_var_to_solver_var_map if v.name.startswith('x[')))
+        mipstart(solver)
+    monkeypatch.setattr(ScipDirect, '_mipstart', record_mipstart)
+    points = [{'aversion':-1, 'num_locations':5}, {'aversion':-1, 'num_locations':6}]
+    results = model.optimize_sweep(orig_df, dest_df, dist_df, 'ede', points)
+    assert starts==[results[0].num_locations_out()]
+
+def test_warm_start_dropped(caplog):
+    class NoWarmStartSolver:
+        def warm_start_capable(self):
+            return False
+    assert model._get_warmstart_kwargs(NoWarmStartSolver(), 'glpk', True)=={}
+    assert 'does not support warm starts' in caplog.text
+
+@pytest.mark.parametrize('formulation', ['pairs', 'radius'])
+def test_initial_open_warm_start(monkeypatch, formulation):
+    from pyomo.contrib.solver.solvers.scip.scip_direct import ScipDirect
+    starts = []
+    mipstart = ScipDirect._mipstart
+    def record_mipstart(solver):
+        starts.append({v.index() for v in solver._pyomo_var_to_solver_var_map 
+                       if v.parent_component().name=='x' and v.value>0.5})
+        mipstart(solver)
+    monkeypatch.setattr(ScipDirect, '_mipstart', record_mipstart)
+    initial_open = ['dest1', 'dest2', 'dest3', 'dest4', 'dest5', 'dest7']
+    result = model.optimize(orig_df, dest_df, dist_df, 'ede', 6, None, 
+                            initial_open=initial_open, formulation=formulation)
+    assert len(starts)==1
+    assert len(starts[0])==len(initial_open)
+    assert result.num_locations_out()==6
+
+def test_sweep_presolve_keeps_destinations():
+    # presolve removes the duplicates only while every point can still open
+    duplicates = {'dest2':'dest11', 'dest8':'dest12'}
+    dup_dest_df = pd.concat([dest_df, pd.DataFrame({'id':list(duplicates.values())})], ignore_index=True)
+    dup_dist_df = dist_df[dist_df['destination'].isin(set(duplicates))]
+    dup_dist_df = pd.concat([dist_df, dup_dist_df.assign(destination=dup_dist_df['destination'].map(duplicates))])
+    points = [{'aversion':-1, 'num_locations':5}, {'aversion':-1, 'num_locations':12}]
+    results = model.optimize_sweep(orig_df, dup_dest_df, dup_dist_df, 'ede', points)
+    assert results[0].ede_out()==pytest.approx(model.optimize(orig_df, dest_df, dist_df, 'ede', 5, None).ede_out())
+    assert results[1].num_locations_out()<=12
+
+@pytest.mark.parametrize('num_locations', [0, 11])
+def test_isochrone_greedy_num_locations(num_locations):
+    with pytest.raises(ValueError):
+        model.optimize_isochrone(orig_df, dest_df, dist_df, 150, 'uncovered', num_locations, solver='greedy')
+
+def test_isochrone_greedy_destinations_within_radius():
+    # 10 destinations are supplied but only 7 have distances
+    within_df = dist_df.query("destination not in ['dest2', 'dest9', 'dest10']")
+    with pytest.raises(ValueError, match='fewer than num_locations=8'):
+        model.optimize_isochrone(orig_df, dest_df, within_df, 150, 'uncovered', 8, solver='greedy')
+
+def _walk_model_stats(model):
+    # count every variable, row and linear term of a built model
+    import pyomo.environ as pyo
+    from pyomo.core.expr.visitor import identify_variables
+    variables = list(model.component_data_objects(pyo.Var, active=True))
+    rows = list(model.component_data_objects(pyo.Constraint, active=True))
+    return {'num_binaries':sum(v.is_binary() for v in variables), 'num_integers':0,
+            'num_continuous':sum(not v.is_integer() for v in variables), 'num_rows':len(rows),
+            'num_nonzeros':sum(len(list(identify_variables(c.body))) for c in rows)}
+
+@pytest.mark.parametrize('minimize, formulation, backend, capacity', [
+    ('ede', 'pairs', 'rules', None), ('locations', 'pairs', 'matrix', None),
+    ('ede', 'pairs', 'matrix', 100), ('locations', 'pairs', 'rules', 100),
+    ('ede', 'radius', 'rules', None), ('locations', 'radius', 'rules', None)])
+def test_model_stats(minimize, formulation, backend, capacity):
+    capacity_df = dest_df if capacity is None else dest_df.assign(capacity=capacity)
+    def build(backend):
+        return model._build_model(orig_df, capacity_df, dist_df, minimize, 6, 190, aversion=-1,
+                                  scaling_factor=None, min_percent=0.5, radius=None, backend=backend,
+                                  formulation=formulation)
+    built, md = build(backend)
+    stats = model._get_model_stats(built, model._count_nonzeros(built, md, minimize))
+    # the matrix backend builds no pyomo model: count the rules model's rows
+    assert stats==_walk_model_stats(build('rules')[0] if backend=='matrix' else built)
+
+@pytest.mark.parametrize('minimize, points', [
+    ('ede', [{'aversion':-1, 'num_locations':5}, {'aversion':-0.5, 'num_locations':7}]),
+    ('locations', [{'aversion':-1, 'target_ede':250}, {'aversion':-0.5, 'target_ede':200}])])
+def test_sweep_matrix_backend(minimize, points):
+    results = model.optimize_sweep(orig_df, dest_df, dist_df, minimize, points, backend='matrix')
+    expected = model.optimize_sweep(orig_df, dest_df, dist_df, minimize, points)
+    for result, other in zip(results, expected):
+        assert result.num_locations_out()==other.num_locations_out()
+        assert result.ede_out()==pytest.approx(other.ede_out())
@@ -89,3 +89,101 @@ def test_out_file():
     result = optimize.run(orig_df, dest_df, dist_lookup_df, out_file=out_path, minimize='locations', target_ede=250, capacity=90)
     assert result.num_locations_out()==5
 
+
+def test_min_ede_matrix_backend():
+    result = optimize.run(orig_df, dest_df, dist_lookup_df, num_locations=6, backend='matrix')
+    assert result.ede_out()==171.4566587957021
+
+def test_min_locations_capacity_matrix_backend():
+    dest_df = pd.read_csv(test_data_path+'destinations_no_yes_no_percent.csv')
+    result = optimize.run(orig_df, dest_df, dist_lookup_df, minimize='locations', target_ede=250, capacity=90, backend='matrix')
+    assert result.num_locations_out()==5
+
+def test_sweep_num_locations():
+    results = optimize.sweep(orig_df, dest_df, dist_lookup_df, num_locations=[5, 6])
+    assert results[1].ede_out()==171.4566587957021
+
+def test_sweep_aversion():
+    results = optimize.sweep(orig_df, dest_df, dist_lookup_df, num_locations=6, aversion=[-1, -2])
+    assert results[1].ede_out()==172.3649176581287
+
+def test_sweep_target_ede():
+    results = optimize.sweep(orig_df, dest_df, dist_lookup_df, minimize='locations', target_ede=[250, 190])
+    assert results[1].num_locations_out()==6
+
+def test_min_ede_heuristic():
+    result = optimize.run(orig_df, dest_df, dist_lookup_df, num_locations=6, solver='heuristic')
+    assert result.ede_out()==171.4566587957021
+
+def test_min_ede_heuristic_warm_start():
+    heuristic_result = optimize.run(orig_df, dest_df, dist_lookup_df, num_locations=6, solver='heuristic')
+    result = optimize.run(orig_df, dest_df, dist_lookup_df, num_locations=6, 
+                          initial_open=heuristic_result.assignment_df['destination'].unique())
+    assert result.ede_out()==171.4566587957021
+
+def test_min_ede_lagrangian():
+    result = optimize.run(orig_df, dest_df, dist_lookup_df, num_locations=6, solver='lagrangian')
+    assert result.ede_out()==171.4566587957021
+    assert 0 <= result.solver_mip_gap < 1e-4
+
+def test_batch():
+    scenarios = pd.DataFrame({'to_open':[5, 6, 20], 'aversion':[-1, -1, None]})
+    results = optimize.batch(orig_df, dest_df, dist_lookup_df, scenarios, workers=2)
+    assert results[1].ede_out()==171.4566587957021
+    assert results[2] is None # more locations than destinations
+
+def test_batch_summary_file(tmp_path):
+    out_path = str(tmp_path/'out_from_batch.csv')
+    scenarios = [{'name':'ede', 'num_locations':6}, 
+                 {'name':'locations', 'minimize':'locations', 'target_ede':250}]
+    optimize.batch(orig_df, dest_df, dist_lookup_df, scenarios, out_file=out_path, workers=1)
+    summary_df = pd.read_csv(tmp_path/'out_from_batch_batch.csv')
+    assert list(summary_df['status'])==['ok', 'ok']
+    assert summary_df.query('name=="ede"')['ede_out'].iloc[0]==171.4566587957021
+
+def test_min_ede_parquet_distances(tmp_path):
+    path = str(tmp_path/'distances.parquet')
+    optimize.data.convert_distance_file(test_data_path+'distances_cartesian.csv', path)
+    result = optimize.run(orig_df, dest_df, path, num_locations=6)
+    assert result.ede_out()==171.4566587957021
+
+@pytest.mark.parametrize('aversion', [-1, 0])
+def test_min_ede_radius_formulation(aversion):
+    pairs = optimize.run(orig_df, dest_df, dist_lookup_df, num_locations=6, aversion=aversion)
+    result = optimize.run(orig_df, dest_df, dist_lookup_df, num_locations=6, aversion=aversion, 
+                          formulation='radius')
+    assert result.ede_out()==pytest.approx(pairs.ede_out())
+
+def test_min_locations_radius_formulation():
+    result = optimize.run(orig_df, dest_df, dist_lookup_df, minimize='locations', target_ede=190, 
+                          formulation='radius')
+    assert result.num_locations_out()==6
+
+def test_sweep_radius_formulation():
+    results = optimize.sweep(orig_df, dest_df, dist_lookup_df, num_locations=[5, 6], 
+                             aversion=[-1, -2], formulation='radius')
+    assert results[1].ede_out()==pytest.approx(171.4566587957021)
+    assert results[3].ede_out()==pytest.approx(172.3649176581287)
+
+def test_run_isochrone_greedy(tmp_path):
+    out_file = str(tmp_path/'out_greedy.csv')
+    results = optimize.run_isochrone_greedy(orig_df, dest_df, dist_lookup_df, 250, 6, out_file=out_file)
+    assert list(results)==[3, 4, 5, 6]
+    covered = [results[k].percent_covered_out(250) for k in results]
+    assert covered==sorted(covered)
+    assert os.path.exists(str(tmp_path/'out_greedy_6_summary.csv'))
+    assert pd.read_csv(str(tmp_path/'out_greedy_greedy.csv')).shape[0]==4
+    mip = optimize.run_isochrone(orig_df, dest_df, dist_lookup_df, 250, num_locations=4)
+    greedy = optimize.run_isochrone(orig_df, dest_df, dist_lookup_df, 250, num_locations=4, solver='greedy')
+    assert greedy.percent_covered_out(250)<=mip.percent_covered_out(250)
+
+def test_timings_and_model_stats(tmp_path):
+    out_file = str(tmp_path/'out.csv')
+    result = optimize.run(orig_df, dest_df, dist_lookup_df, num_locations=6, out_file=out_file)
+    assert list(result.timings)[:2]==['validation', 'build_dist_df']
+    assert {'model_data', 'build_model', 'solve', 'extract'} <= set(result.timings)
+    assert result.model_stats['num_binaries']==dest_df.shape[0]
+    assert result.model_stats['num_nonzeros']>0
+    summary = pd.read_csv(str(tmp_path/'out_summary.csv')).set_index('parameter')['value']
+    assert float(summary['time_solve'])>=0
+    assert int(summary['num_rows'])==result.model_stats['num_rows']
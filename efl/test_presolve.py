@@ -0,0 +1,93 @@
+# test_presolve.py
+
+import os
+import pandas as pd
+import pytest
+import efl.model as model
+import efl.presolve as presolve
+
+test_data_path = os.path.dirname(os.path.abspath(__file__))+'/../data/test_data/'
+test_df_path = test_data_path+'dataframes/'
+
+orig_df = pd.read_csv(test_df_path+'orig_df.csv')
+dest_df = pd.read_csv(test_df_path+'dest_df.csv')
+dist_df = pd.read_csv(test_df_path+'dist_df.csv')
+
+def _add_destination(dest_df, dist_df, dest_id, like, *, shift=0, **attributes):
+    # copy of destination like (distances + shift)
+    new_dest_df = pd.concat([dest_df, pd.DataFrame([dict(id=dest_id, **attributes)])],
+                            ignore_index=True)
+    copy_df = dist_df.query(f'destination=="{like}"').assign(destination=dest_id)
+    copy_df['distance'] = copy_df['distance'] + shift
+    return new_dest_df, pd.concat([dist_df, copy_df], ignore_index=True)
+
+def test_remove_duplicate_and_dominated():
+    new_dest_df, new_dist_df = _add_destination(dest_df, dist_df, 'copy2', 'dest2')
+    new_dest_df, new_dist_df = _add_destination(new_dest_df, new_dist_df, 'far8', 'dest8', shift=1)
+    reduced_dest_df, reduced_dist_df, kept_ids = presolve.reduce_destinations(new_dest_df, new_dist_df)
+    assert kept_ids=={'copy2':'dest2', 'far8':'dest8'}
+    assert set(reduced_dist_df['destination'])==set(dest_df['id'])
+
+def test_keep_open_and_capacitated():
+    new_dest_df, new_dist_df = _add_destination(dest_df, dist_df, 'copy1', 'dest1', open='yes')
+    new_dest_df, new_dist_df = _add_destination(new_dest_df, new_dist_df, 'copy9', 'dest9')
+    new_dest_df.loc[new_dest_df.id=='dest9', 'capacity'] = 100
+    new_dest_df.loc[new_dest_df.id=='copy9', 'capacity'] = 100
+    _, _, kept_ids = presolve.reduce_destinations(new_dest_df, new_dist_df)
+    assert kept_ids=={}
+
+def test_min_destinations():
+    new_dest_df, new_dist_df = _add_destination(dest_df, dist_df, 'copy2', 'dest2')
+    _, _, kept_ids = presolve.reduce_destinations(new_dest_df, new_dist_df, min_destinations=11)
+    assert kept_ids=={}
+
+def test_presolve_keeps_original_ids():
+    new_dest_df, new_dist_df = _add_destination(dest_df, dist_df, 'copy2', 'dest2')
+    results = model.optimize(orig_df, new_dest_df, new_dist_df, 'ede', 6, None)
+    full = model.optimize(orig_df, new_dest_df, new_dist_df, 'ede', 6, None, presolve=False)
+    assert results.ede_out()==pytest.approx(full.ede_out())
+    assert set(results.assignment_df['destination']) <= set(new_dest_df['id'])
+
+def _add_origin(orig_df, dist_df, orig_id, like, population, *, shift=0):
+    # copy of origin like (distances + shift)
+    new_orig_df = pd.concat([orig_df, pd.DataFrame([dict(id=orig_id, population=population)])],
+                            ignore_index=True)
+    copy_df = dist_df.query(f'origin=="{like}"').assign(origin=orig_id, population=population)
+    copy_df['distance'] = copy_df['distance'] + shift
+    return new_orig_df, pd.concat([dist_df, copy_df], ignore_index=True)
+
+def test_aggregate_origins():
+    new_orig_df, new_dist_df = _add_origin(orig_df, dist_df, 'copy1', 'orig1', 5)
+    new_orig_df, new_dist_df = _add_origin(new_orig_df, new_dist_df, 'near2', 'orig2', 7, shift=0.01)
+    agg_orig_df, agg_dist_df, origin_map, error = presolve.aggregate_origins(new_orig_df, new_dist_df)
+    assert error==0
+    assert origin_map['copy1']=='orig1' and origin_map['near2']=='near2'
+    assert agg_orig_df.set_index('id').loc['orig1', 'population']==11+5
+    assert set(agg_dist_df.query('origin=="orig1"')['population'])=={11+5}
+    assert agg_dist_df.shape[0]==new_dist_df.shape[0]-dist_df.query('origin=="orig1"').shape[0]
+
+def test_aggregate_origins_tolerance():
+    new_orig_df, new_dist_df = _add_origin(orig_df, dist_df, 'near2', 'orig2', 17, shift=0.5)
+    _, agg_dist_df, origin_map, error = presolve.aggregate_origins(new_orig_df, new_dist_df, tolerance=10)
+    assert origin_map['near2']=='orig2'
+    assert 0<error<10
+    mean_df = new_dist_df.query('origin in ["orig2","near2"]').groupby('destination')['distance'].mean()
+    agg_df = agg_dist_df.query('origin=="orig2"').set_index('destination')['distance']
+    pd.testing.assert_series_equal(agg_df.sort_index(), mean_df.sort_index(), check_names=False)
+
+def test_aggregate_keeps_optimum():
+    new_orig_df, new_dist_df = _add_origin(orig_df, dist_df, 'copy1', 'orig1', 5)
+    results = model.optimize(new_orig_df, dest_df, new_dist_df, 'ede', 6, None)
+    full = model.optimize(new_orig_df, dest_df, new_dist_df, 'ede', 6, None, aggregate=False)
+    assert results.ede_out()==pytest.approx(full.ede_out())
+    assignment_df = results.assignment_df.set_index('origin')
+    assert assignment_df.shape[0]==new_orig_df.shape[0]
+    assert assignment_df.loc['copy1', 'destination']==assignment_df.loc['orig1', 'destination']
+    assert assignment_df.loc['copy1', 'population']==5
+
+def test_aggregate_tolerance_requires_min_ede():
+    with pytest.raises(ValueError):
+        model.optimize(orig_df, dest_df, dist_df, 'locations', None, 190, aggregate_tolerance=10)
+    result = model.optimize(orig_df, dest_df, dist_df, 'locations', None, 190, aggregate_tolerance=10,
+                            aggregate=False)
+    assert result.ede_out()<=190
@@ -0,0 +1,52 @@
+# test_profiling.py
+
+import os
+import pandas as pd
+import pytest
+import efl.optimize as optimize
+import efl.profiling as profiling
+
+test_data_path = os.path.dirname(os.path.abspath(__file__))+'/../data/test_data/'
+test_df_path = test_data_path+'dataframes/'
+
+orig_df = pd.read_csv(test_df_path+'orig_df.csv')
+dest_df = pd.read_csv(test_df_path+'dest_df.csv')
+dist_lookup_df = pd.read_csv(test_data_path+'distances_cartesian.csv')
+
+def test_phases():
+    with profiling.Profiler(top=3) as profiler:
+        for _ in range(2):
+            profiling.begin('outer')
+            profiling.begin('inner') # part of outer
+            data = [list(range(1000)) for _ in range(100)]
+            profiling.end('inner')
+            profiling.end('outer')
+        profiling.begin('unfinished')
+    profiling.begin('off') # no active profiler
+    assert list(profiler.phases)==['outer', 'unfinished']
+    assert profiler.phases['outer']['peak_traced']>0
+    assert len(profiler.allocations['outer'])==3
+    assert list(profiler.get_phases_df()['phase'])==['outer', 'unfinished']
+
+def test_one_profiler():
+    with profiling.Profiler():
+        with pytest.raises(RuntimeError):
+            with profiling.Profiler():
+                pass
+
+def test_run_profile(tmp_path):
+    out_file = str(tmp_path/'out.csv')
+    optimize.run(orig_df, dest_df, dist_lookup_df, num_locations=6, out_file=out_file, profile=True)
+    report = open(str(tmp_path/'out_profile.txt')).read()
+    for phase in ['validation', 'build_dist_df', 'model_data', 'build_model', 'solve', 'extract']:
+        assert os.path.exists(str(tmp_path/f'out_profile_{phase}.prof'))
+        assert f'{phase}: top' in report
+
+def test_run_isochrone_profile_prefix(tmp_path):
+    prefix = str(tmp_path/'iso')
+    optimize.run_isochrone(orig_df, dest_df, dist_lookup_df, 250, num_locations=4, profile=prefix)
+    assert os.path.exists(prefix+'.txt') and os.path.exists(prefix+'_solve.prof')
+
+def test_profile_needs_path():
+    with pytest.raises(ValueError):
+        optimize.run(orig_df, dest_df, dist_lookup_df, num_locations=6, profile=True)
@@ -8,9 +8,13 @@ setup(
     install_requires=[
         'Click',
     ],
+    extras_require={
+        'arrow': ['pyarrow'], # parquet and feather/arrow ipc distance files
+        'kdtree': ['scipy'], # k-d tree neighbor search of distances from coordinates
+    },
     entry_points={
         'console_scripts': [
-            'efl = efl.optimize:cli'
+            'efl = efl.optimize:main'
         ]
     }
 )
\ No newline at end of file